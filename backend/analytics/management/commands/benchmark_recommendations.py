@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from analytics.replay import replay, STRATEGIES
+
+
+class Command(BaseCommand):
+    help = 'Replay historical interactions with a time split and score each recommendation strategy'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--split', help='Recommend as of this date (YYYY-MM-DD)')
+        parser.add_argument('--test-days', type=int, default=14,
+                            help='Without --split, hold out this many most recent days')
+        parser.add_argument('-k', type=int, default=10, help='Recommendations per renter')
+        parser.add_argument('--strategy', action='append', choices=sorted(STRATEGIES),
+                            help='Strategy to score (repeatable; default: all)')
+        parser.add_argument('--max-users', type=int, default=None,
+                            help='Score a random sample of this many renters')
+
+    def handle(self, *args, **options):
+        if options['split']:
+            try:
+                split = timezone.make_aware(datetime.fromisoformat(options['split']))
+            except ValueError:
+                raise CommandError('--split must be a date in YYYY-MM-DD format')
+        else:
+            split = timezone.now() - timedelta(days=options['test_days'])
+
+        k = options['k']
+        results = replay(split, k=k, strategies=options['strategy'], max_users=options['max_users'])
+
+        self.stdout.write(f'Split at {split:%Y-%m-%d %H:%M}, k={k}')
+        self.stdout.write(
+            f'{"strategy":<16}{"users":>7}{"P@k":>8}{"R@k":>8}{"cover":>8}'
+            f'{"p50 ms":>9}{"p95 ms":>9}{"queries":>9}{"max q":>7}'
+        )
+        for name, m in results.items():
+            self.stdout.write(
+                f'{name:<16}{m["scored_users"]:>7}{m["precision"]:>8.3f}{m["recall"]:>8.3f}'
+                f'{m["coverage"]:>8.3f}{m["p50_ms"]:>9.1f}{m["p95_ms"]:>9.1f}'
+                f'{m["mean_queries"]:>9.1f}{m["max_queries"]:>7}'
+            )
+        self.stdout.write(self.style.SUCCESS(f'✓ Replayed {len(results)} strategies'))
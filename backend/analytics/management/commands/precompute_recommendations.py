@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from analytics.precompute import (
+    precompute_recommendations, DEFAULT_ACTIVE_DAYS, DEFAULT_LIMIT, DEFAULT_CHUNK_SIZE,
+)
+
+
+class Command(BaseCommand):
+    help = 'Precompute and store personalized recommendations for all active renters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=DEFAULT_ACTIVE_DAYS,
+                            help='Renters active within this many days are included')
+        parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT,
+                            help='Recommendations stored per renter')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes (default: one per CPU; 1 runs in-process)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Renters handed to a worker at a time')
+
+    def handle(self, *args, **options):
+        generation, users, rows = precompute_recommendations(
+            days=options['days'],
+            limit=options['limit'],
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Generation {generation}: stored {rows} recommendations for {users} renters'
+        ))
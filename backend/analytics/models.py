@@ -1,4 +1,8 @@
 from django.db import models
+from django.contrib.auth import get_user_model
+from properties.models import Property
+
+User = get_user_model()
 
 
 class RentTrend(models.Model):
@@ -47,3 +51,22 @@ class PopularSearch(models.Model):
     
     def __str__(self):
         return f"{self.search_term or 'Filter'} - {self.search_count} searches"
+
+
+class UserRecommendation(models.Model):
+    """Precomputed top-N recommendation for a renter, written in batches"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stored_recommendations')
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    generation = models.PositiveIntegerField()  # batch run that produced the row
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['user', 'rank']
+        indexes = [
+            models.Index(fields=['user', 'rank'], name='userrec_user_rank_idx'),
+            models.Index(fields=['generation'], name='userrec_generation_idx'),
+        ]
+    
+    def __str__(self):
+        return f"#{self.rank} for {self.user_id}: property {self.property_id}"
@@ -0,0 +1,121 @@
+"""
+Offline precompute of personalized recommendations.
+
+``precompute_recommendations`` runs ``get_recommendations`` for every
+renter active in the last N days, spread over a process pool in chunks of
+user ids, and stores the ranked results in UserRecommendation under a new
+generation number. Each chunk replaces its users' rows atomically, and rows
+of renters who dropped out of the active set are removed at the end.
+
+The recommendation endpoints read a renter's stored list with one query,
+topped up from the popular list when listings went away since the batch, and
+only compute live for renters the batch has not covered yet.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import UserRecommendation
+
+User = get_user_model()
+
+DEFAULT_ACTIVE_DAYS = 30
+DEFAULT_LIMIT = 12
+DEFAULT_CHUNK_SIZE = 200
+
+
+def active_renter_ids(days=DEFAULT_ACTIVE_DAYS):
+    """Renters who signed in, viewed, favorited or booked in the last ``days`` days"""
+    since = timezone.now() - timedelta(days=days)
+    return list(
+        User.objects.filter(role='renter')
+        .filter(
+            Q(last_login__gte=since)
+            | Q(propertyview__viewed_at__gte=since)
+            | Q(favorites__created_at__gte=since)
+            | Q(bookings__created_at__gte=since)
+        )
+        .order_by('id').values_list('id', flat=True).distinct()
+    )
+
+
+def _init_worker():
+    import django
+    django.setup()
+    # Never share the parent's database sockets
+    connections.close_all()
+
+
+def compute_chunk(user_ids, limit=DEFAULT_LIMIT):
+    """[(user_id, [property ids in rank order])] for one chunk of users"""
+    from .recommendation import get_recommendations
+
+    users = User.objects.in_bulk(user_ids)
+    return [
+        (user_id, [prop.id for prop in get_recommendations(users[user_id], limit)])
+        for user_id in user_ids if user_id in users
+    ]
+
+
+def store_chunk(results, generation):
+    """Replace the stored recommendations of the users in ``results``"""
+    rows = [
+        UserRecommendation(user_id=user_id, property_id=property_id, rank=rank, generation=generation)
+        for user_id, property_ids in results
+        for rank, property_id in enumerate(property_ids)
+    ]
+    with transaction.atomic():
+        UserRecommendation.objects.filter(user_id__in=[user_id for user_id, _ in results]).delete()
+        UserRecommendation.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def precompute_recommendations(days=DEFAULT_ACTIVE_DAYS, limit=DEFAULT_LIMIT,
+                               workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Run one batch generation; returns (generation, users, rows)"""
+    generation = (UserRecommendation.objects.aggregate(last=Max('generation'))['last'] or 0) + 1
+    user_ids = active_renter_ids(days)
+    chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+
+    rows = 0
+    if workers == 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            rows += store_chunk(compute_chunk(chunk, limit), generation)
+    else:
+        # Forked workers must not inherit open connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            for results in pool.map(compute_chunk, chunks, [limit] * len(chunks)):
+                rows += store_chunk(results, generation)
+
+    # Renters no longer active keep nothing from older generations
+    UserRecommendation.objects.filter(generation__lt=generation).exclude(user_id__in=user_ids).delete()
+    return generation, len(user_ids), rows
+
+
+def stored_recommendations(user, limit=DEFAULT_LIMIT):
+    """
+    The user's precomputed recommendations that are still listed, best
+    first; None when the batch has not covered the user. Listings that have
+    gone since the batch ran are replaced by popular ones, so the list still
+    holds ``limit`` entries when the catalogue does.
+    """
+    from .recommendation import candidate_ids, fetch_in_order
+
+    rows = list(
+        UserRecommendation.objects.filter(
+            user=user,
+            property__verification_status='verified',
+            property__status='available',
+        ).select_related('property').order_by('rank')[:limit]
+    )
+    properties = [row.property for row in rows]
+    if properties and len(properties) < limit:
+        present = {prop.id for prop in properties}
+        popular = [pk for pk in candidate_ids('popular', limit + len(present)) if pk not in present]
+        properties += fetch_in_order(popular[:limit - len(properties)])
+    return properties or None
@@ -1,13 +1,88 @@
 """
 Recommendation engine for property suggestions
+
+The most-booked, highest-rated, average-price and popular lists do not
+depend on the user, so each is computed once as a pool of ids, shared
+through the cache until it expires or the ``listing`` version moves, and
+sliced per request. Personalized ids are merged over those lists in memory
+and all cards are fetched with one query.
 """
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Q, Count, Avg, Sum
-from properties.models import Property, PropertyView, Favorite
-from users.models import UserPreference
+from properties.cache import get_version
+from properties.models import Property, Favorite
+from properties.profiles import price_range
+from properties.segments import segment_index
+from properties.similar import similar_index
+from users.models import UserPreference, RenterProfile
 from bookings.models import Booking
 from django.utils import timezone
 from datetime import timedelta
 
+# Ids kept per shared list; larger requests bypass the cache
+CANDIDATE_POOL_SIZE = 50
+CANDIDATE_CACHE_KEY = 'analytics:candidates:{}:v{}'
+
+# Popular matches re-ranked by profile affinity per personalized slot
+CANDIDATES_PER_SLOT = 10
+
+
+def _available():
+    return Property.objects.filter(verification_status='verified', status='available')
+
+
+def _most_booked_queryset():
+    return _available().annotate(booking_count=Count('bookings')).order_by('-booking_count', '-rating')
+
+
+def _highest_rated_queryset():
+    return _available().filter(rating__gt=0).order_by('-rating', '-favorite_count', '-view_count')
+
+
+def _average_price_queryset():
+    avg_price = _available().filter(rent_price__gt=0).aggregate(avg_price=Avg('rent_price'))['avg_price']
+    if not avg_price:
+        return _popular_queryset()
+    avg_price = float(avg_price)
+    return _available().filter(
+        rent_price__gte=avg_price * 0.7,  # 30% below average
+        rent_price__lte=avg_price * 1.3,  # 30% above average
+    ).order_by('-rating', '-view_count', '-favorite_count')
+
+
+def _popular_queryset():
+    return _available().order_by('-rating', '-view_count', '-favorite_count')
+
+
+CANDIDATE_LISTS = {
+    'most_booked': _most_booked_queryset,
+    'highest_rated': _highest_rated_queryset,
+    'average_price': _average_price_queryset,
+    'popular': _popular_queryset,
+}
+
+
+def candidate_ids(name, limit):
+    """Ids of the top ``limit`` entries of a shared candidate list, best first"""
+    if limit > CANDIDATE_POOL_SIZE:
+        return list(CANDIDATE_LISTS[name]().values_list('id', flat=True)[:limit])
+    key = CANDIDATE_CACHE_KEY.format(name, get_version())
+    ids = cache.get(key)
+    if ids is None:
+        ids = list(CANDIDATE_LISTS[name]().values_list('id', flat=True)[:CANDIDATE_POOL_SIZE])
+        cache.set(key, ids, getattr(settings, 'RECOMMENDATION_CACHE_TIMEOUT', 300))
+    return ids[:limit]
+
+
+def fetch_in_order(ids, queryset=None):
+    """The listed properties that are still available, in ``ids`` order, in one query"""
+    if not ids:
+        return []
+    queryset = _available() if queryset is None else queryset
+    properties = queryset.in_bulk(ids)
+    return [properties[pk] for pk in ids if pk in properties]
+
 
 def get_recommendations(user, limit=12):
     """
@@ -17,51 +92,22 @@ def get_recommendations(user, limit=12):
     3. Most Searched by That User or Renter
     4. Average Price Property
     """
-    
-    # Get all verified available properties as base
-    base_queryset = Property.objects.filter(
-        verification_status='verified',
-        status='available'
-    )
-    
-    recommendations = []
-    
-    # 1. Most Booked Rooms / Properties
-    most_booked = get_most_booked_properties(limit=3)
-    recommendations.extend(most_booked)
-    
-    # 2. Highest Rating Star Rooms / Properties
-    highest_rated = get_highest_rated_properties(limit=3)
-    recommendations.extend(highest_rated)
-    
-    # 3. Most Searched by That User or Renter (Personalized)
-    user_search_based = get_user_search_based_properties(user, limit=3)
-    recommendations.extend(user_search_based)
-    
-    # 4. Average Price Properties (Best Value)
-    average_price = get_average_price_properties(limit=3)
-    recommendations.extend(average_price)
+    candidate_lists = [
+        candidate_ids('most_booked', 3),      # 1. Most Booked Rooms / Properties
+        candidate_ids('highest_rated', 3),    # 2. Highest Rating Star Rooms / Properties
+        user_search_based_ids(user, 3),       # 3. Most Searched by That User or Renter
+        candidate_ids('average_price', 3),    # 4. Average Price Properties (Best Value)
+        candidate_ids('popular', limit),      # Fill with popular ones if still short
+    ]
     
     # Remove duplicates and limit to requested number
-    unique_recommendations = []
-    seen_ids = set()
+    ordered_ids = []
+    for ids in candidate_lists:
+        for pk in ids:
+            if pk not in ordered_ids and len(ordered_ids) < limit:
+                ordered_ids.append(pk)
     
-    for prop in recommendations:
-        if prop.id not in seen_ids:
-            unique_recommendations.append(prop)
-            seen_ids.add(prop.id)
-            if len(unique_recommendations) >= limit:
-                break
-    
-    # If we still need more properties, fill with popular ones
-    if len(unique_recommendations) < limit:
-        popular = get_popular_properties(limit - len(unique_recommendations))
-        for prop in popular:
-            if prop.id not in seen_ids:
-                unique_recommendations.append(prop)
-                seen_ids.add(prop.id)
-    
-    return unique_recommendations[:limit]
+    return fetch_in_order(ordered_ids)
 
 
 def get_most_booked_properties(limit=3):
@@ -70,15 +116,9 @@ def get_most_booked_properties(limit=3):
     Rooms or properties that have been booked the highest number of times.
     Used for: Showing popular and trusted options, Helping new users decide quickly
     """
-    # Get properties with booking counts
-    properties_with_bookings = Property.objects.filter(
-        verification_status='verified',
-        status='available'
-    ).annotate(
-        booking_count=Count('bookings')
-    ).order_by('-booking_count', '-rating')
-    
-    return list(properties_with_bookings[:limit])
+    ids = candidate_ids('most_booked', limit)
+    # Counting bookings for a handful of rows keeps booking_count on the results
+    return fetch_in_order(ids, _available().annotate(booking_count=Count('bookings')))
 
 
 def get_highest_rated_properties(limit=3):
@@ -87,11 +127,7 @@ def get_highest_rated_properties(limit=3):
     Rooms or properties with the highest average user review rating.
     Used for: Highlighting quality and satisfaction, Users who value comfort and service
     """
-    return list(Property.objects.filter(
-        verification_status='verified',
-        status='available',
-        rating__gt=0  # Only include properties with ratings
-    ).order_by('-rating', '-favorite_count', '-view_count')[:limit])
+    return fetch_in_order(candidate_ids('highest_rated', limit))
 
 
 def get_user_search_based_properties(user, limit=3):
@@ -100,63 +136,56 @@ def get_user_search_based_properties(user, limit=3):
     Properties similar to what the user searches for most often.
     Used for: Personalized recommendations, Returning users
     """
+    return fetch_in_order(user_search_based_ids(user, limit))
+
+
+def user_search_based_ids(user, limit=3):
+    """
+    Ids behind get_user_search_based_properties, best first. Preferences come
+    from the renter's learned profile: candidates in their favoured cities or
+    types and rent band are ranked by city, type and facility affinity.
+    """
     if not user or not user.is_authenticated:
-        return get_popular_properties(limit)
-    
-    # Get user's viewed properties to understand preferences
-    viewed_properties = PropertyView.objects.filter(
-        user=user
-    ).select_related('property').order_by('-viewed_at')[:20]
+        return candidate_ids('popular', limit)
     
-    if not viewed_properties:
-        return get_popular_properties(limit)
+    profile = RenterProfile.objects.filter(user=user).first()
+    if profile is None or not (profile.city_weights or profile.type_weights):
+        # No history yet: start from the listing segments their preferences point at
+        preferences = UserPreference.objects.filter(user=user).first()
+        return segment_index.cold_start_ids(limit, preferences=preferences) or candidate_ids('popular', limit)
     
-    # Analyze user's viewing patterns
-    viewed_property_list = [vp.property for vp in viewed_properties]
-    
-    # Get common characteristics from user's viewing history
-    common_cities = list(set([p.city for p in viewed_property_list if p.city]))
-    common_property_types = list(set([p.property_type for p in viewed_property_list if p.property_type]))
-    
-    # Calculate average price range from user's views
-    prices = [p.rent_price for p in viewed_property_list if p.rent_price]
-    if prices:
-        avg_price = sum(prices) / len(prices)
-        min_price = avg_price * 0.7  # 30% below average
-        max_price = avg_price * 1.3  # 30% above average
-    else:
-        min_price = None
-        max_price = None
+    top_cities = sorted(profile.city_weights, key=profile.city_weights.get, reverse=True)[:3]
+    top_types = sorted(profile.type_weights, key=profile.type_weights.get, reverse=True)[:3]
     
     # Build recommendation query based on user patterns
-    queryset = Property.objects.filter(
-        verification_status='verified',
-        status='available'
-    ).exclude(
-        id__in=[p.id for p in viewed_property_list]  # Exclude already viewed
-    )
-    
-    # Apply user preference filters
-    filters = Q()
-    if common_cities:
-        city_filter = Q(city__in=common_cities)
-        filters |= city_filter
-    
-    if common_property_types:
-        type_filter = Q(property_type__in=common_property_types)
-        filters |= type_filter
-    
-    if filters:
-        queryset = queryset.filter(filters)
-    
-    # Apply price range if available
-    if min_price is not None and max_price is not None:
-        queryset = queryset.filter(rent_price__gte=min_price, rent_price__lte=max_price)
-    
-    # Order by relevance to user preferences
-    queryset = queryset.order_by('-view_count', '-rating', '-favorite_count')
-    
-    return list(queryset[:limit])
+    queryset = _available().exclude(
+        id__in=profile.recent_property_ids  # Exclude recently seen
+    ).filter(Q(city__in=top_cities) | Q(property_type__in=top_types))
+    
+    band = price_range(profile)
+    if band is not None:
+        queryset = queryset.filter(rent_price__gte=band[0], rent_price__lte=band[1])
+    
+    candidates = queryset.order_by('-view_count', '-rating', '-favorite_count').values(
+        'id', 'city', 'property_type', 'facilities'
+    )[:limit * CANDIDATES_PER_SLOT]
+    
+    # Order by relevance to user preferences, popularity breaking ties
+    city_total = sum(profile.city_weights.values()) or 1
+    type_total = sum(profile.type_weights.values()) or 1
+    facility_top = max(profile.facility_weights.values(), default=0) or 1
+    
+    def affinity(row):
+        facilities = row['facilities'] or []
+        facility_score = sum(profile.facility_weights.get(f, 0) for f in facilities) / facility_top
+        return (
+            profile.city_weights.get(row['city'], 0) / city_total
+            + profile.type_weights.get(row['property_type'], 0) / type_total
+            + 0.25 * facility_score / max(len(facilities), 1)
+        )
+    
+    ranked = sorted(candidates, key=affinity, reverse=True)
+    return [row['id'] for row in ranked[:limit]]
 
 
 def get_average_price_properties(limit=3):
@@ -165,49 +194,14 @@ def get_average_price_properties(limit=3):
     Properties priced around the average market price.
     Used for: Showing good value options, Users who don't want very cheap or very expensive rooms
     """
-    # Calculate average price for available verified properties
-    avg_price_data = Property.objects.filter(
-        verification_status='verified',
-        status='available',
-        rent_price__gt=0
-    ).aggregate(
-        avg_price=Avg('rent_price')
-    )
-    
-    if not avg_price_data['avg_price']:
-        return get_popular_properties(limit)
-    
-    avg_price = float(avg_price_data['avg_price'])
-    min_price = avg_price * 0.7  # 30% below average
-    max_price = avg_price * 1.3  # 30% above average
-    
-    # Get properties around the average price range
-    return list(Property.objects.filter(
-        verification_status='verified',
-        status='available',
-        rent_price__gte=min_price,
-        rent_price__lte=max_price
-    ).order_by('-rating', '-view_count', '-favorite_count')[:limit])
+    return fetch_in_order(candidate_ids('average_price', limit))
 
 
 def get_popular_properties(limit=12):
     """Get popular properties based on views, favorites, and ratings"""
-    return Property.objects.filter(
-        verification_status='verified',
-        status='available'
-    ).order_by('-rating', '-view_count', '-favorite_count')[:limit]
+    return fetch_in_order(candidate_ids('popular', limit))
 
 
 def get_similar_properties(property_obj, limit=6):
     """Get properties similar to a given property"""
-    return Property.objects.filter(
-        verification_status='verified',
-        status='available',
-        property_type=property_obj.property_type,
-        city=property_obj.city
-    ).exclude(
-        id=property_obj.id
-    ).filter(
-        rent_price__gte=property_obj.rent_price * 0.8,
-        rent_price__lte=property_obj.rent_price * 1.2
-    ).order_by('-rating', '-view_count')[:limit]
+    return similar_index.similar(property_obj.id, limit)
@@ -0,0 +1,234 @@
+"""
+Offline replay benchmark for the recommendation engines.
+
+Interactions (views, favorites, bookings) are split at a point in time.
+The live database is only read: listings created before the split, all
+users and their preferences, and the interactions and reviews dated before
+it are copied into a scratch database created with Django's test database
+machinery (``replay_<NAME>``, or a temporary file on SQLite), which needs
+the privilege to create a database. Every derived input is rebuilt
+there from those rows alone - view and favorite counters, ratings,
+popularity, renter profiles, item neighbours, the factor model and the
+listing segments (in a temporary model directory) - and the ORM and cache
+are routed to the copy while the strategies run, so no strategy sees
+anything that happened after the split and nothing live is written.
+
+Every renter with held-out interactions is then asked for ``k``
+recommendations and the strategy is scored on:
+
+* precision@k / recall@k against the properties that renter went on to
+  interact with (ones already seen before the split do not count)
+* catalogue coverage - share of available listings recommended to anyone
+* p50 / p95 latency and mean / max database queries per call
+"""
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Avg, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from bookings.models import Booking
+from properties.counters import reconcile_counters
+from properties.factorization import train_factors
+from properties.interactions import interaction_sources
+from properties.item_similarity import build_property_neighbors
+from properties.models import Property, PropertyView, Favorite
+from properties.popularity import rebuild_popularity
+from properties.profiles import rebuild_profiles
+from properties.recommendations import PropertyRecommender
+from properties.segments import build_segments
+from reviews.models import Review
+from users.models import UserPreference
+from .recommendation import get_recommendations, get_popular_properties
+
+User = get_user_model()
+
+REPLAY_ALIAS = 'replay'
+
+
+def _four_criteria(user, k):
+    return get_recommendations(user, k)
+
+
+def _property_recommender(user, k):
+    return PropertyRecommender(user).get_recommendations(limit=k)
+
+
+def _popular(user, k):
+    return get_popular_properties(k)
+
+
+STRATEGIES = {
+    'four_criteria': _four_criteria,
+    'recommender': _property_recommender,
+    'popular': _popular,
+}
+
+
+class ReplayRouter:
+    """Sends every query to the scratch database while a replay runs"""
+
+    def db_for_read(self, model, **hints):
+        return REPLAY_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return REPLAY_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+def interacted_pairs(since=None, until=None):
+    """{user_id: set of property ids} interacted with in [since, until)"""
+    pairs = defaultdict(set)
+    for queryset in interaction_sources(since, until).values():
+        for user_id, property_id in queryset.iterator():
+            pairs[user_id].add(property_id)
+    return pairs
+
+
+@contextmanager
+def scratch_database():
+    """An empty, migrated database with the default database's engine, as REPLAY_ALIAS"""
+    default = connections.settings[DEFAULT_DB_ALIAS]
+    if default['ENGINE'].endswith('sqlite3'):
+        name = os.path.join(tempfile.gettempdir(), f'replay-{os.getpid()}.sqlite3')
+    else:
+        name = f"replay_{default['NAME']}"
+    settings_dict = {**default, 'TEST': {**default.get('TEST', {}), 'NAME': name}}
+    settings.DATABASES[REPLAY_ALIAS] = connections.settings[REPLAY_ALIAS] = settings_dict
+    creation = connections[REPLAY_ALIAS].creation
+    try:
+        creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        yield REPLAY_ALIAS
+    finally:
+        creation.destroy_test_db(default['NAME'], verbosity=0)
+        del connections[REPLAY_ALIAS]
+        settings.DATABASES.pop(REPLAY_ALIAS, None)
+        connections.settings.pop(REPLAY_ALIAS, None)
+
+
+def _copy(queryset, alias, **overrides):
+    """Insert ``queryset``'s rows into ``alias`` as they are, timestamps included, without signals"""
+    model = queryset.model
+    fields = model._meta.concrete_fields
+    rows = []
+    for obj in queryset.order_by('pk').iterator():
+        for name, value in overrides.items():
+            setattr(obj, name, value)
+        rows.append(obj)
+    batch_size = max(connections[alias].ops.bulk_batch_size(fields, rows), 1)
+    for start in range(0, len(rows), batch_size):
+        model._base_manager._insert(rows[start:start + batch_size], fields=fields, using=alias, raw=True)
+    return len(rows)
+
+
+def copy_state_before(split, alias):
+    """Copy what the site knew at ``split`` from the live database into ``alias``"""
+    properties = Property.objects.filter(created_at__lt=split)
+    with transaction.atomic(using=alias):
+        _copy(User.objects.all(), alias, verified_by_id=None)
+        _copy(UserPreference.objects.all(), alias)
+        _copy(properties, alias, verified_by_id=None)
+        _copy(PropertyView.objects.filter(viewed_at__lt=split, property__in=properties), alias)
+        _copy(Favorite.objects.filter(created_at__lt=split, property__in=properties), alias)
+        bookings = Booking.objects.filter(created_at__lt=split, property__in=properties)
+        _copy(bookings, alias)
+        reviews = Review.objects.filter(created_at__lt=split, property__in=properties)
+        _copy(reviews.filter(Q(booking__isnull=True) | Q(booking__in=bookings)), alias)
+        _copy(reviews.exclude(booking__isnull=True).exclude(booking__in=bookings), alias, booking_id=None)
+
+
+def rebuild_derived_state(alias):
+    """Recompute, inside ``alias``, everything derived from interactions and reviews"""
+    with transaction.atomic(using=alias):
+        reconcile_counters(include_views=True)
+        average = (
+            Review.objects.filter(property=OuterRef('pk')).order_by().values('property')
+            .annotate(avg=Avg('overall_rating')).values('avg')
+        )
+        Property.objects.update(rating=Coalesce(Subquery(average), Value(0.0)))
+        rebuild_popularity()
+        rebuild_profiles()
+        build_property_neighbors()
+    train_factors()
+    build_segments()
+
+
+@contextmanager
+def state_at(split):
+    """Run the enclosed block against a copy of the site as it was at ``split``"""
+    model_dir = tempfile.mkdtemp(prefix='replay-models-')
+    isolated = override_settings(
+        DATABASE_ROUTERS=[f'{__name__}.ReplayRouter'],
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'replay'}},
+        RECOMMENDER_MODEL_DIR=model_dir,
+    )
+    try:
+        with scratch_database() as alias:
+            copy_state_before(split, alias)
+            with isolated:
+                rebuild_derived_state(alias)
+                yield alias
+    finally:
+        shutil.rmtree(model_dir, ignore_errors=True)
+
+
+def score(strategy, users, held_out, known, k, using=DEFAULT_DB_ALIAS):
+    """Metrics of one strategy over ``users``, counting queries sent to ``using``"""
+    latencies, query_counts, precisions, recalls = [], [], [], []
+    recommended = set()
+    for user in users:
+        with CaptureQueriesContext(connections[using]) as ctx:
+            started = time.perf_counter()
+            ids = [prop.id for prop in strategy(user, k)][:k]
+            latencies.append((time.perf_counter() - started) * 1000)
+        query_counts.append(len(ctx.captured_queries))
+
+        recommended.update(ids)
+        truth = held_out[user.id] - known.get(user.id, set())
+        if truth:
+            hits = len(truth.intersection(ids))
+            precisions.append(hits / k)
+            recalls.append(hits / len(truth))
+
+    available = Property.objects.filter(verification_status='verified', status='available').count()
+    return {
+        'users': len(users),
+        'scored_users': len(precisions),
+        'precision': float(np.mean(precisions)) if precisions else 0.0,
+        'recall': float(np.mean(recalls)) if recalls else 0.0,
+        'coverage': len(recommended) / available if available else 0.0,
+        'p50_ms': float(np.percentile(latencies, 50)) if latencies else 0.0,
+        'p95_ms': float(np.percentile(latencies, 95)) if latencies else 0.0,
+        'mean_queries': float(np.mean(query_counts)) if query_counts else 0.0,
+        'max_queries': max(query_counts, default=0),
+    }
+
+
+def replay(split, k=10, strategies=None, max_users=None, seed=0):
+    """{strategy name: metrics} for recommendations made as of ``split``"""
+    strategies = strategies or list(STRATEGIES)
+    held_out = interacted_pairs(since=split)
+    known = interacted_pairs(until=split)
+
+    user_ids = sorted(held_out)
+    if max_users and len(user_ids) > max_users:
+        user_ids = sorted(random.Random(seed).sample(user_ids, max_users))
+
+    results = {}
+    with state_at(split) as alias:
+        users = list(User.objects.filter(pk__in=user_ids, role='renter'))
+        for name in strategies:
+            results[name] = score(STRATEGIES[name], users, held_out, known, k, using=alias)
+    return results
@@ -0,0 +1,80 @@
+from rest_framework import serializers
+from django.db.models import Prefetch, prefetch_related_objects
+from properties.models import Property, PropertyImage
+
+
+def with_card_relations(properties):
+    """Evaluate ``properties`` with every card's images loaded in one query"""
+    properties = list(properties)
+    prefetch_related_objects(
+        properties, Prefetch('images', queryset=PropertyImage.objects.all(), to_attr='list_images')
+    )
+    return properties
+
+
+class RecommendationCardSerializer(serializers.ModelSerializer):
+    """
+    Property card shared by the recommendation endpoints. Expects images
+    prefetched by with_card_relations(); booking_count is included when the
+    queryset annotated it.
+    """
+    rent_price = serializers.FloatField()
+    rating = serializers.FloatField()
+    area_sqm = serializers.FloatField(allow_null=True)
+    booking_count = serializers.SerializerMethodField()
+    primary_image = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Property
+        fields = [
+            'id', 'title', 'address', 'city', 'district', 'area', 'rent_price', 'rating',
+            'booking_count', 'favorite_count', 'view_count', 'property_type', 'bedrooms',
+            'bathrooms', 'area_sqm', 'primary_image',
+        ]
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if data.get('booking_count') is None:
+            data.pop('booking_count', None)
+        if 'primary_image' in data:
+            data['image'] = data['primary_image']  # Keep for backward compatibility
+        return data
+
+    def get_booking_count(self, obj):
+        return getattr(obj, 'booking_count', None)
+
+    def get_primary_image(self, obj):
+        primary = next((img for img in obj.list_images if img.is_primary), None)
+        if primary is None or not primary.image:
+            return None
+        return self.media_url(primary.image.url)
+
+    def media_url(self, url):
+        """Absolute URL of a media path, from a base resolved once per response"""
+        if url.startswith(('http://', 'https://')):
+            return url
+        if '_media_base' not in self.context:
+            request = self.context.get('request')
+            self.context['_media_base'] = request.build_absolute_uri('/').rstrip('/') if request else ''
+        return f"{self.context['_media_base']}{url}"
+
+
+class RecommendationDetailCardSerializer(RecommendationCardSerializer):
+    """Card with description, status and the first few images, for the combined feed"""
+    images = serializers.SerializerMethodField()
+
+    class Meta(RecommendationCardSerializer.Meta):
+        fields = RecommendationCardSerializer.Meta.fields + [
+            'description', 'is_furnished', 'pets_allowed', 'status', 'verification_status',
+            'created_at', 'images',
+        ]
+
+    def get_images(self, obj):
+        return [
+            {
+                'id': img.id,
+                'image': img.image.url if img.image else None,
+                'caption': img.caption,
+                'is_primary': img.is_primary
+            } for img in obj.list_images[:3]
+        ]
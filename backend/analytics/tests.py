@@ -0,0 +1,209 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from bookings.models import Booking
+from properties.models import Property, PropertyImage, Favorite
+from properties.testing import PropertyAPITestCase, create_property
+from users.models import RenterProfile
+
+from .models import UserRecommendation
+from .precompute import active_renter_ids, stored_recommendations
+from .recommendation import get_recommendations, get_most_booked_properties
+from .replay import STRATEGIES, replay
+
+User = get_user_model()
+
+
+class PrecomputedRecommendationTests(PropertyAPITestCase):
+    """Batch recommendation precompute and the stored read path"""
+
+    def setUp(self):
+        super().setUp()
+        self.idle = User.objects.create_user(username='idle', password='pass', role='renter')
+        self.props = self.create_properties(4)
+        Favorite.objects.create(user=self.renter, property=self.props[0])
+
+    def test_active_renters_only(self):
+        self.assertEqual(active_renter_ids(days=30), [self.renter.id])
+
+    def test_command_stores_ranked_generation(self):
+        call_command('precompute_recommendations', '--workers', '1', stdout=StringIO())
+        rows = list(UserRecommendation.objects.filter(user=self.renter))
+        self.assertTrue(rows)
+        self.assertEqual([row.rank for row in rows], list(range(len(rows))))
+        self.assertEqual({row.generation for row in rows}, {1})
+        self.assertFalse(UserRecommendation.objects.filter(user=self.idle).exists())
+
+        call_command('precompute_recommendations', '--workers', '1', stdout=StringIO())
+        self.assertEqual(
+            set(UserRecommendation.objects.values_list('generation', flat=True)), {2}
+        )
+
+    def test_stored_read_skips_unlisted_and_falls_back(self):
+        UserRecommendation.objects.bulk_create([
+            UserRecommendation(user=self.renter, property=self.props[2], rank=0, generation=1),
+            UserRecommendation(user=self.renter, property=self.props[1], rank=1, generation=1),
+        ])
+        self.props[2].status = 'rented'
+        self.props[2].save()
+        with CaptureQueriesContext(connection) as ctx:
+            stored = stored_recommendations(self.renter, limit=1)
+        self.assertEqual([prop.id for prop in stored], [self.props[1].id])
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertIsNone(stored_recommendations(self.idle))
+
+        # The rented listing's slot is filled from the popular list
+        stored = stored_recommendations(self.renter, limit=3)
+        self.assertEqual(stored[0].id, self.props[1].id)
+        self.assertEqual(len(stored), 3)
+        self.assertNotIn(self.props[2].id, [prop.id for prop in stored])
+        self.assertEqual(len({prop.id for prop in stored}), 3)
+
+    def test_endpoint_serves_stored_list(self):
+        UserRecommendation.objects.create(user=self.renter, property=self.props[3], rank=0, generation=1)
+        self.client.force_authenticate(self.renter)
+        response = self.client.get('/api/analytics/recommended/', {'limit': 1})
+        self.assertEqual([item['id'] for item in response.data['recommendations']], [self.props[3].id])
+        response = self.client.get('/api/properties/recommended/')
+        self.assertEqual(response.data[0]['id'], self.props[3].id)
+        self.assertEqual(len(response.data), len(self.props))
+
+
+class SharedCandidateListTests(PropertyAPITestCase):
+    """Global recommendation lists are computed once and shared through the cache"""
+
+    def setUp(self):
+        super().setUp()
+        self.props = [
+            create_property(self.owner, title=f'Property {i}', rating=Decimal(i), rent_price=Decimal(400 + i * 20))
+            for i in range(6)
+        ]
+
+    def test_global_lists_served_from_cache(self):
+        first = get_recommendations(self.renter, limit=6)
+        with CaptureQueriesContext(connection) as ctx:
+            second = get_recommendations(self.renter, limit=6)
+        self.assertEqual([p.id for p in first], [p.id for p in second])
+        self.assertEqual(len(second), 6)
+        # profile + preferences + one fetch of the merged ids
+        self.assertLessEqual(len(ctx.captured_queries), 3)
+
+    def test_listing_change_refreshes_lists(self):
+        self.assertEqual(get_most_booked_properties(1)[0].id, self.props[5].id)
+        self.props[0].rating = Decimal('5')
+        self.props[0].save()
+        self.assertEqual(get_most_booked_properties(1)[0].id, self.props[0].id)
+        self.assertEqual(get_most_booked_properties(1)[0].booking_count, 0)
+
+
+class RecommendationReplayTests(PropertyAPITestCase):
+    """Offline time-split replay of the recommendation strategies"""
+
+    def setUp(self):
+        super().setUp()
+        self.props = self.create_properties(4)
+        self.split = timezone.now()
+        Favorite.objects.create(user=self.renter, property=self.props[0])
+        Favorite.objects.filter(property=self.props[0]).update(created_at=self.split - timedelta(days=3))
+        Favorite.objects.create(user=self.renter, property=self.props[1])
+
+    def test_scores_against_held_out_interactions(self):
+        profiles = list(RenterProfile.objects.values_list('user_id', 'recent_property_ids'))
+        results = replay(self.split, k=4)
+        self.assertEqual(set(results), {'four_criteria', 'recommender', 'popular'})
+        popular = results['popular']
+        self.assertEqual(popular['scored_users'], 1)
+        # the held-out favorite is one of the four listings
+        self.assertAlmostEqual(popular['recall'], 1.0)
+        self.assertAlmostEqual(popular['precision'], 0.25)
+        self.assertAlmostEqual(popular['coverage'], 1.0)
+        self.assertGreaterEqual(popular['max_queries'], 1)
+
+        # the live database is only read
+        self.assertEqual(Favorite.objects.filter(user=self.renter).count(), 2)
+        self.assertEqual(list(RenterProfile.objects.values_list('user_id', 'recent_property_ids')), profiles)
+
+    def test_strategies_only_see_state_before_split(self):
+        seen = {}
+
+        def probe(user, k):
+            seen['favorites'] = dict(Property.objects.values_list('id', 'favorite_count'))
+            seen['profile'] = RenterProfile.objects.get(user=user).recent_property_ids
+            return []
+
+        Property.objects.filter(pk=self.props[1].pk).update(favorite_count=1, popularity=99)
+        late = create_property(self.owner, title='Listed after the split')
+        with mock.patch.dict(STRATEGIES, {'probe': probe}):
+            replay(self.split, k=2, strategies=['probe'])
+        self.assertEqual(seen['favorites'], {prop.id: int(prop == self.props[0]) for prop in self.props})
+        self.assertNotIn(late.id, seen['favorites'])
+        self.assertEqual(seen['profile'], [self.props[0].id])
+
+    def test_command_prints_table(self):
+        out = StringIO()
+        call_command('benchmark_recommendations', '--split', self.split.date().isoformat(),
+                     '--strategy', 'popular', '-k', '3', stdout=out)
+        self.assertIn('popular', out.getvalue())
+        self.assertIn('P@k', out.getvalue())
+
+
+class RecommendationCardTests(PropertyAPITestCase):
+    """Analytics recommendation endpoints serialize cards in a fixed number of queries"""
+
+    ENDPOINTS = [
+        '/api/analytics/most-booked/',
+        '/api/analytics/highest-rated/',
+        '/api/analytics/user-search-based/',
+        '/api/analytics/average-price/',
+    ]
+
+    def add_properties(self, count):
+        for i in range(count):
+            prop = create_property(self.owner, title=f'Card {i}', rating=Decimal('4.5'), area_sqm=Decimal('45.50'))
+            PropertyImage.objects.create(property=prop, image=f'properties/{i}_a.jpg', order=0)
+            PropertyImage.objects.create(property=prop, image=f'properties/{i}_b.jpg', order=1, is_primary=True)
+            Booking.objects.create(property=prop, renter=self.renter, booking_type='visit', start_date=date.today())
+
+    def count_card_queries(self, url):
+        cache.clear()
+        return self.count_queries(url, {'limit': 10})
+
+    def test_constant_queries(self):
+        self.client.force_authenticate(self.renter)
+        self.add_properties(2)
+        small = {url: self.count_card_queries(url)[0] for url in self.ENDPOINTS + ['/api/analytics/recommended/']}
+        self.add_properties(8)
+        for url, queries in small.items():
+            large, _ = self.count_card_queries(url)
+            self.assertEqual(queries, large, f'{url} issues per-row queries ({queries} -> {large})')
+
+    def test_card_fields(self):
+        self.add_properties(1)
+        _, response = self.count_card_queries(self.ENDPOINTS[0])
+        card = response.data['properties'][0]
+        self.assertEqual(card['booking_count'], 1)
+        self.assertTrue(card['primary_image'].startswith('http://testserver/'))
+        self.assertIn('_b.jpg', card['primary_image'])
+        self.assertEqual(card['image'], card['primary_image'])
+        # A JSON number, as the hand-built cards returned before the shared serializer
+        self.assertEqual(card['area_sqm'], 45.5)
+
+        _, response = self.count_card_queries(self.ENDPOINTS[1])
+        self.assertNotIn('booking_count', response.data['properties'][0])
+
+    def test_no_primary_image(self):
+        prop = create_property(self.owner, title='No primary', rating=Decimal('4.0'))
+        PropertyImage.objects.create(property=prop, image='properties/plain.jpg', order=0)
+        _, response = self.count_card_queries(self.ENDPOINTS[1])
+        card = response.data['properties'][0]
+        self.assertIsNone(card['primary_image'])
+        self.assertIsNone(card['image'])
@@ -1,4 +1,3 @@
-from django.conf import settings
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
@@ -9,9 +8,15 @@ from datetime import timedelta, datetime
 from dateutil.relativedelta import relativedelta
 from django.utils import timezone as django_timezone
 from decimal import Decimal
-from properties.models import Property, PropertyView
+from properties.models import Property
+from properties.hyperloglog import unique_viewers
+from properties.rollups import views_trend as property_views_trend
 from bookings.models import Booking
 from .models import RentTrend
+from .precompute import stored_recommendations
+from .serializers import (
+    RecommendationCardSerializer, RecommendationDetailCardSerializer, with_card_relations,
+)
 from .recommendation import (
     get_recommendations, 
     get_most_booked_properties, 
@@ -191,6 +196,11 @@ def owner_analytics(request):
             'revenue': float(sum(b.total_amount for b in year_bookings.filter(status='completed')))
         })
     
+    # Distinct viewers, merged from the daily HyperLogLog sketches
+    property_ids = [prop.id for prop in properties]
+    unique_viewers_7d = unique_viewers(property_ids, days=7)
+    unique_viewers_30d = unique_viewers(property_ids, days=30)
+    
     # Property performance with detailed metrics
     property_performance = []
     for prop in properties:
@@ -199,6 +209,7 @@ def owner_analytics(request):
             'id': prop.id,
             'title': prop.title,
             'views': prop.view_count,
+            'unique_viewers_30d': unique_viewers_30d.get(prop.id, 0),
             'favorites': prop.favorite_count,
             'rating': float(prop.rating),
             'bookings': prop_bookings.count(),
@@ -211,18 +222,8 @@ def owner_analytics(request):
     # Sort by views
     property_performance.sort(key=lambda x: x['views'], reverse=True)
     
-    # Views trend (last 30 days)
-    views_trend = []
-    for i in range(30):
-        date = django_timezone.now().date() - timedelta(days=29-i)
-        daily_views = PropertyView.objects.filter(
-            property__owner=request.user,
-            viewed_at__date=date
-        ).count()
-        views_trend.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'views': daily_views
-        })
+    # Views trend (last 30 days), from the daily rollups and views since
+    views_trend = property_views_trend(property_ids, days=30)
     
     # Market comparison - pricing by property type
     owner_city = properties.first().city if properties.exists() else None
@@ -301,6 +302,8 @@ def owner_analytics(request):
             'total_properties': total_properties,
             'verified_properties': verified_properties,
             'total_views': total_views,
+            'unique_viewers_7d': unique_viewers_7d['total'],
+            'unique_viewers_30d': unique_viewers_30d['total'],
             'total_favorites': total_favorites,
             'total_bookings': total_bookings,
             'confirmed_bookings': confirmed_bookings,
@@ -878,6 +881,13 @@ def renter_analytics(request):
 
 # NEW RECOMMENDATION ENDPOINTS BASED ON 4 CRITERIA
 
+def serialize_cards(properties, request):
+    """Recommendation cards with a fixed number of queries however many properties"""
+    return RecommendationCardSerializer(
+        with_card_relations(properties), many=True, context={'request': request}
+    ).data
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def recommended_properties(request):
@@ -892,41 +902,12 @@ def recommended_properties(request):
         user = request.user
         limit = int(request.query_params.get('limit', 12))
         
-        recommendations = get_recommendations(user, limit)
+        # Precomputed by the nightly batch; renters it has not covered yet get a live run
+        recommendations = stored_recommendations(user, limit) or get_recommendations(user, limit)
         
-        # Serialize property data
-        serialized_recommendations = []
-        for prop in recommendations:
-            serialized_recommendations.append({
-                'id': prop.id,
-                'title': prop.title,
-                'description': prop.description,
-                'property_type': prop.property_type,
-                'address': prop.address,
-                'city': prop.city,
-                'district': prop.district,
-                'area': prop.area,
-                'rent_price': float(prop.rent_price),
-                'bedrooms': prop.bedrooms,
-                'bathrooms': prop.bathrooms,
-                'area_sqm': float(prop.area_sqm) if prop.area_sqm else None,
-                'is_furnished': prop.is_furnished,
-                'pets_allowed': prop.pets_allowed,
-                'status': prop.status,
-                'verification_status': prop.verification_status,
-                'view_count': prop.view_count,
-                'favorite_count': prop.favorite_count,
-                'rating': float(prop.rating),
-                'created_at': prop.created_at.isoformat(),
-                'images': [
-                    {
-                        'id': img.id,
-                        'image': img.image.url if img.image else None,
-                        'caption': img.caption,
-                        'is_primary': img.is_primary
-                    } for img in prop.images.all()[:3]
-                ]
-            })
+        serialized_recommendations = RecommendationDetailCardSerializer(
+            with_card_relations(recommendations), many=True, context={'request': request}
+        ).data
         
         return Response({
             'recommendations': serialized_recommendations,
@@ -955,35 +936,7 @@ def most_booked_properties(request):
     try:
         limit = int(request.query_params.get('limit', 3))
         properties = get_most_booked_properties(limit)
-        
-        serialized_properties = []
-        for prop in properties:
-            booking_count = Booking.objects.filter(property=prop).count()
-            
-            # Get primary image with full URL
-            primary_image = None
-            primary_img_obj = prop.images.filter(is_primary=True).first()
-            if primary_img_obj and primary_img_obj.image:
-                primary_image = request.build_absolute_uri(primary_img_obj.image.url)
-            
-            serialized_properties.append({
-                'id': prop.id,
-                'title': prop.title,
-                'address': prop.address,
-                'city': prop.city,
-                'district': prop.district,
-                'area': prop.area,
-                'rent_price': float(prop.rent_price),
-                'rating': float(prop.rating),
-                'booking_count': booking_count,
-                'view_count': prop.view_count,
-                'property_type': prop.property_type,
-                'bedrooms': prop.bedrooms,
-                'bathrooms': prop.bathrooms,
-                'area_sqm': prop.area_sqm,
-                'primary_image': primary_image,
-                'image': primary_image  # Keep for backward compatibility
-            })
+        serialized_properties = serialize_cards(properties, request)
         
         return Response({
             'properties': serialized_properties,
@@ -1007,33 +960,7 @@ def highest_rated_properties(request):
     try:
         limit = int(request.query_params.get('limit', 3))
         properties = get_highest_rated_properties(limit)
-        
-        serialized_properties = []
-        for prop in properties:
-            # Get primary image with full URL
-            primary_image = None
-            primary_img_obj = prop.images.filter(is_primary=True).first()
-            if primary_img_obj and primary_img_obj.image:
-                primary_image = request.build_absolute_uri(primary_img_obj.image.url)
-            
-            serialized_properties.append({
-                'id': prop.id,
-                'title': prop.title,
-                'address': prop.address,
-                'city': prop.city,
-                'district': prop.district,
-                'area': prop.area,
-                'rent_price': float(prop.rent_price),
-                'rating': float(prop.rating),
-                'favorite_count': prop.favorite_count,
-                'view_count': prop.view_count,
-                'property_type': prop.property_type,
-                'bedrooms': prop.bedrooms,
-                'bathrooms': prop.bathrooms,
-                'area_sqm': prop.area_sqm,
-                'primary_image': primary_image,
-                'image': primary_image  # Keep for backward compatibility
-            })
+        serialized_properties = serialize_cards(properties, request)
         
         return Response({
             'properties': serialized_properties,
@@ -1058,37 +985,7 @@ def user_search_based_properties(request):
         user = request.user if request.user.is_authenticated else None
         limit = int(request.query_params.get('limit', 3))
         properties = get_user_search_based_properties(user, limit)
-        
-        serialized_properties = []
-        for prop in properties:
-            # Get primary image with full URL
-            primary_image = None
-            primary_img_obj = prop.images.filter(is_primary=True).first()
-            if primary_img_obj and primary_img_obj.image:
-                # Build absolute URI manually
-                if hasattr(settings, 'RAILWAY_PUBLIC_DOMAIN') and settings.RAILWAY_PUBLIC_DOMAIN:
-                    base_url = f"https://{settings.RAILWAY_PUBLIC_DOMAIN}"
-                else:
-                    base_url = "https://web-production-6f713.up.railway.app"
-                primary_image = f"{base_url}{primary_img_obj.image.url}"
-            
-            serialized_properties.append({
-                'id': prop.id,
-                'title': prop.title,
-                'address': prop.address,
-                'city': prop.city,
-                'district': prop.district,
-                'area': prop.area,
-                'rent_price': float(prop.rent_price),
-                'rating': float(prop.rating),
-                'view_count': prop.view_count,
-                'property_type': prop.property_type,
-                'bedrooms': prop.bedrooms,
-                'bathrooms': prop.bathrooms,
-                'area_sqm': prop.area_sqm,
-                'primary_image': primary_image,
-                'image': primary_image  # Keep for backward compatibility
-            })
+        serialized_properties = serialize_cards(properties, request)
         
         return Response({
             'properties': serialized_properties,
@@ -1124,31 +1021,7 @@ def average_price_properties(request):
             max_price=Max('rent_price')
         )
         
-        serialized_properties = []
-        for prop in properties:
-            # Get primary image with full URL
-            primary_image = None
-            primary_img_obj = prop.images.filter(is_primary=True).first()
-            if primary_img_obj and primary_img_obj.image:
-                primary_image = request.build_absolute_uri(primary_img_obj.image.url)
-            
-            serialized_properties.append({
-                'id': prop.id,
-                'title': prop.title,
-                'address': prop.address,
-                'city': prop.city,
-                'district': prop.district,
-                'area': prop.area,
-                'rent_price': float(prop.rent_price),
-                'rating': float(prop.rating),
-                'view_count': prop.view_count,
-                'property_type': prop.property_type,
-                'bedrooms': prop.bedrooms,
-                'bathrooms': prop.bathrooms,
-                'area_sqm': prop.area_sqm,
-                'primary_image': primary_image,
-                'image': primary_image  # Keep for backward compatibility
-            })
+        serialized_properties = serialize_cards(properties, request)
         
         return Response({
             'properties': serialized_properties,
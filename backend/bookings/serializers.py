@@ -1,10 +1,10 @@
 from rest_framework import serializers
 from .models import Booking, Message
-from properties.serializers import PropertyListSerializer
+from properties.serializers import PropertyListSerializer, SparseFieldsetsMixin
 from users.serializers import UserSerializer
 
 
-class BookingSerializer(serializers.ModelSerializer):
+class BookingSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     property_details = PropertyListSerializer(source='property', read_only=True)
     renter_details = UserSerializer(source='renter', read_only=True)
     
@@ -34,7 +34,7 @@ class BookingSerializer(serializers.ModelSerializer):
         monthly_rent = data.get('monthly_rent')
         property_rent_price = data.get('property_details', {}).get('rent_price')
         
-        if not monthly_rent and property_rent_price:
+        if 'monthly_rent' in data and not monthly_rent and property_rent_price:
             data['monthly_rent'] = property_rent_price
             print(f"Updated monthly_rent to: {data['monthly_rent']}")
         else:
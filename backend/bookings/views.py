@@ -2,7 +2,9 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.utils import timezone
-from django.db.models import Q
+from django.db.models import Q, Prefetch
+from properties.models import PropertyImage
+from properties.serializers import is_field_requested
 from .models import Booking, Message
 from .serializers import BookingSerializer, MessageSerializer
 import pytz
@@ -67,6 +69,17 @@ class BookingViewSet(viewsets.ModelViewSet):
             print(f"After checked_out_at filter ({checked_out_at_isnull}): {queryset.count()}")
         
         print(f"Final queryset count: {queryset.count()}")
+        
+        # Load the relations the serializer will touch for the whole page at once,
+        # skipping any pruned by ?fields= / ?omit=
+        if is_field_requested(self.request, 'property_details'):
+            queryset = queryset.select_related('property__owner')
+            if is_field_requested(self.request, 'property_details.primary_image'):
+                queryset = queryset.prefetch_related(Prefetch(
+                    'property__images', queryset=PropertyImage.objects.all(), to_attr='list_images'
+                ))
+        if is_field_requested(self.request, 'renter_details'):
+            queryset = queryset.select_related('renter')
         return queryset
     
     @action(detail=False, methods=['post'])
@@ -7,6 +7,7 @@ from datetime import timedelta
 from decouple import config
 import dj_database_url
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -157,6 +158,24 @@ MEDIA_ROOT = BASE_DIR / 'media'
 if not DEBUG and RAILWAY_DOMAIN:
     MEDIA_URL = f'https://{RAILWAY_DOMAIN}/media/'
 
+# Railway terminates TLS at its proxy; trust the scheme it forwards so
+# request.build_absolute_uri() produces https:// URLs
+if os.getenv('RAILWAY_ENVIRONMENT') or RAILWAY_DOMAIN:
+    SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+
+# Cache shared by every worker on the host (gunicorn runs several processes);
+# cache version bumps and cached API responses must be visible to all of them
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('CACHE_LOCATION', default=os.path.join(tempfile.gettempdir(), 'housing_analyzer_cache')),
+        'OPTIONS': {'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=10000, cast=int)},
+    }
+}
+
+# Test-only setting overrides live in the runner
+TEST_RUNNER = 'housing_analyzer.test_runner.TestRunner'
+
 # Default primary key
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -0,0 +1,24 @@
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Runs the suite with settings that keep it off state shared with the
+    host: a per-process cache instead of the on-disk one, so runs never
+    see each other's entries, and no background view flusher, as tests
+    flush buffered property views themselves.
+    """
+    overrides = {
+        'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+        'PROPERTY_VIEW_FLUSH_THREAD': False,
+    }
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._overrides = override_settings(**self.overrides)
+        self._overrides.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._overrides.disable()
+        super().teardown_test_environment(**kwargs)
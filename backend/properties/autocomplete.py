@@ -0,0 +1,109 @@
+"""
+In-memory autocomplete for location names (city, district, area).
+
+Each process keeps a sorted array of normalized name keys and answers
+prefix lookups with bisect, so typing in the location box rarely touches the
+database. The index is rebuilt lazily, with three grouped queries, when the
+``locations`` cache version (bumped by Property signals) moves. Writes that
+bypass the signals, such as queryset updates, are caught by comparing the
+count and latest ``updated_at`` of verified listings, at most every
+``REFRESH_SECONDS``.
+"""
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+from django.db.models import Count, Max
+
+from .cache import get_version
+from .models import Property
+
+LOCATION_FIELDS = ['city', 'district', 'area']
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+REFRESH_SECONDS = 300
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse whitespace"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.lower().split())
+
+
+class LocationIndex:
+    """Sorted (key, entry index) array over every word start of every name"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._fingerprint = None
+        self._checked_at = 0.0
+        self._index = ([], [])  # (sorted keys, entries), swapped atomically
+
+    @staticmethod
+    def _listing_fingerprint():
+        verified = Property.objects.filter(verification_status='verified')
+        return tuple(verified.aggregate(count=Count('id'), updated=Max('updated_at')).values())
+
+    def _build(self):
+        entries = []
+        for field in LOCATION_FIELDS:
+            group = ['city'] if field == 'city' else ['city', field]
+            rows = (
+                Property.objects.filter(verification_status='verified')
+                .exclude(**{field: ''})
+                .values(*group)
+                .annotate(count=Count('id'))
+                .order_by()
+            )
+            for row in rows:
+                entries.append({
+                    'name': row[field].strip(),
+                    'type': field,
+                    'city': row['city'] if field != 'city' else None,
+                    'count': row['count'],
+                })
+
+        # "Phnom Penh" is reachable from "phn..." and from "pen..."
+        keys = []
+        for position, entry in enumerate(entries):
+            words = normalize(entry['name']).split(' ')
+            for start in range(len(words)):
+                keys.append((' '.join(words[start:]), position))
+        keys.sort()
+        return keys, entries
+
+    def _ensure_current(self):
+        version = get_version('locations')
+        stale = time.monotonic() - self._checked_at >= REFRESH_SECONDS
+        if version == self._version and not stale:
+            return
+        with self._lock:
+            fingerprint = self._listing_fingerprint()
+            if version != self._version or fingerprint != self._fingerprint:
+                self._index = self._build()
+                self._version = version
+                self._fingerprint = fingerprint
+            self._checked_at = time.monotonic()
+
+    def lookup(self, query, limit=DEFAULT_LIMIT):
+        """Entries whose name has a word starting with ``query``, most listings first"""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        self._ensure_current()
+
+        keys, entries = self._index
+        matches = set()
+        position = bisect_left(keys, (prefix,))
+        while position < len(keys) and keys[position][0].startswith(prefix):
+            matches.add(keys[position][1])
+            position += 1
+
+        ranked = sorted(matches, key=lambda i: (-entries[i]['count'], entries[i]['name']))
+        return [entries[i] for i in ranked[:limit]]
+
+
+location_index = LocationIndex()
@@ -0,0 +1,137 @@
+"""
+Versioned cache keys for property data.
+
+Anything cached from Property rows embeds the current version of its
+namespace in its key. Property signals bump the version, which orphans every
+older entry at once instead of deleting keys one by one; orphans simply
+expire. Namespaces:
+
+* ``listing``   - any Property change (facets, cached listings)
+* ``locations`` - changes to city/district/area or verification (autocomplete)
+* ``similarity`` - changes to listing features or visibility (similar listings)
+
+Anonymous API responses are cached under ``listing`` keys as well; lookups
+are counted so the hit ratio can be checked with ``response_cache_stats()``.
+
+Versions and responses only work across workers when the cache is shared
+between processes; settings use FileBasedCache for that. Every write to it
+is a file write plus a cull scan, so lookups are not counted in the cache
+directly: each process tallies them in memory and adds the batch to the
+shared counters every ``STATS_FLUSH_EVERY`` lookups or
+``STATS_FLUSH_SECONDS``. FileBasedCache's ``incr`` is a read and a write,
+so concurrent batches can still drop counts: the stats are an approximate
+ratio, not an exact tally.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+
+VERSION_KEY = 'properties:{}_version'
+STATS_KEY = 'properties:response_cache_{}'
+STATS_FLUSH_EVERY = 100
+STATS_FLUSH_SECONDS = 30
+
+_stats_lock = threading.Lock()
+_pending_stats = Counter()
+_stats_flushed_at = time.monotonic()
+
+
+def _fresh_version():
+    # Seeded from the clock so a version lost to eviction never resurrects
+    # entries written under an earlier one
+    return int(time.time() * 1000)
+
+
+def get_version(namespace='listing'):
+    key = VERSION_KEY.format(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _fresh_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(namespace='listing'):
+    key = VERSION_KEY.format(namespace)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _fresh_version(), timeout=None)
+
+
+def make_params_key(prefix, query_params):
+    """Cache key for a query string, independent of parameter order"""
+    items = sorted(
+        (key, value)
+        for key in query_params
+        for value in query_params.getlist(key)
+        if value != ''
+    )
+    digest = hashlib.md5(repr(items).encode()).hexdigest()
+    return f'{prefix}:v{get_version()}:{digest}'
+
+
+def _add(key, amount):
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key, amount)
+
+
+def _flush_stats():
+    global _stats_flushed_at
+    with _stats_lock:
+        pending = dict(_pending_stats)
+        _pending_stats.clear()
+        _stats_flushed_at = time.monotonic()
+    for outcome, amount in pending.items():
+        _add(STATS_KEY.format(outcome), amount)
+
+
+def _count(outcome):
+    with _stats_lock:
+        _pending_stats[outcome] += 1
+        due = (
+            sum(_pending_stats.values()) >= STATS_FLUSH_EVERY
+            or time.monotonic() - _stats_flushed_at >= STATS_FLUSH_SECONDS
+        )
+    if due:
+        _flush_stats()
+
+
+def get_cached_response(key):
+    """Cached response data for ``key`` or None, counting the hit or miss"""
+    data = cache.get(key)
+    _count('misses' if data is None else 'hits')
+    return data
+
+
+def set_cached_response(key, data, timeout):
+    cache.set(key, data, timeout)
+
+
+def response_cache_stats():
+    """
+    Approximate hit/miss counts across all workers sharing the cache. This
+    process's pending counts are included; other workers' are up to one
+    batch behind.
+    """
+    _flush_stats()
+    hits = cache.get(STATS_KEY.format('hits')) or 0
+    misses = cache.get(STATS_KEY.format('misses')) or 0
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+    }
+
+
+def reset_response_cache_stats():
+    with _stats_lock:
+        _pending_stats.clear()
+    cache.delete_many([STATS_KEY.format('hits'), STATS_KEY.format('misses')])
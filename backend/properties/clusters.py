@@ -0,0 +1,179 @@
+"""
+Server-side map marker clustering.
+
+Every mappable property (verified, available, with coordinates) contributes
+to one PropertyMapCell per zoom level. A cell is a 1/CELLS_PER_TILE slice of
+a Web Mercator tile, so a viewport at any zoom maps to a small rectangle of
+cells that is read with one indexed query.
+
+Cells are updated incrementally from the Property signals: a save that
+changes coordinates, rent, status or verification moves the property's
+contribution from its old cells to its new ones with F() arithmetic.
+``rebuild_map_cells`` recomputes everything from scratch.
+"""
+import math
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Q
+
+from .models import Property, PropertyMapCell
+
+MIN_ZOOM = 0
+MAX_ZOOM = 16
+# 4x4 cells per 256px tile, i.e. one cluster per ~64px square
+CELL_BITS = 2
+SAMPLE_SIZE = 5
+MAX_LATITUDE = 85.05112878
+
+# Fields whose change can move a property between cells or alter aggregates
+CLUSTER_FIELDS = ['latitude', 'longitude', 'rent_price', 'status', 'verification_status']
+
+
+def cell_for(latitude, longitude, zoom):
+    """(x, y) of the grid cell containing a coordinate at ``zoom``"""
+    scale = 1 << (zoom + CELL_BITS)
+    latitude = max(min(float(latitude), MAX_LATITUDE), -MAX_LATITUDE)
+    x = int((float(longitude) + 180.0) / 360.0 * scale)
+    lat_rad = math.radians(latitude)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * scale)
+    return min(max(x, 0), scale - 1), min(max(y, 0), scale - 1)
+
+
+def cluster_state(values):
+    """
+    Reduce a property's field values to what the cluster tables depend on,
+    or None when it should not appear on the map.
+    """
+    if (values.get('verification_status') != 'verified' or values.get('status') != 'available'
+            or values.get('latitude') is None or values.get('longitude') is None):
+        return None
+    return (
+        float(values['latitude']),
+        float(values['longitude']),
+        Decimal(values['rent_price'] or 0),
+    )
+
+
+def state_of(instance):
+    return cluster_state({field: getattr(instance, field) for field in CLUSTER_FIELDS})
+
+
+def stored_state(property_id):
+    """Cluster state of a property as currently saved in the database"""
+    values = Property.objects.filter(pk=property_id).values(*CLUSTER_FIELDS).first()
+    return cluster_state(values) if values else None
+
+
+def _cell_keys(state):
+    latitude, longitude, _ = state
+    return [(zoom, *cell_for(latitude, longitude, zoom)) for zoom in range(MIN_ZOOM, MAX_ZOOM + 1)]
+
+
+def _keys_q(keys):
+    q = Q()
+    for zoom, x, y in keys:
+        q |= Q(zoom=zoom, cell_x=x, cell_y=y)
+    return q
+
+
+def _apply(property_id, state, sign):
+    latitude, longitude, rent = state
+    keys = _cell_keys(state)
+
+    if sign > 0:
+        PropertyMapCell.objects.bulk_create(
+            [PropertyMapCell(zoom=zoom, cell_x=x, cell_y=y) for zoom, x, y in keys],
+            ignore_conflicts=True,
+        )
+    PropertyMapCell.objects.filter(_keys_q(keys)).update(
+        count=F('count') + sign,
+        rent_sum=F('rent_sum') + sign * rent,
+        latitude_sum=F('latitude_sum') + sign * latitude,
+        longitude_sum=F('longitude_sum') + sign * longitude,
+    )
+
+    # Representative ids are best effort; they need no atomic bookkeeping
+    changed = []
+    for cell in PropertyMapCell.objects.filter(_keys_q(keys)):
+        if sign > 0 and property_id not in cell.sample_ids and len(cell.sample_ids) < SAMPLE_SIZE:
+            cell.sample_ids = cell.sample_ids + [property_id]
+            changed.append(cell)
+        elif sign < 0 and property_id in cell.sample_ids:
+            cell.sample_ids = [pid for pid in cell.sample_ids if pid != property_id]
+            changed.append(cell)
+    if changed:
+        PropertyMapCell.objects.bulk_update(changed, ['sample_ids'])
+
+    if sign < 0:
+        PropertyMapCell.objects.filter(_keys_q(keys), count__lte=0).delete()
+
+
+def move_property(property_id, old_state, new_state):
+    """Move a property's contribution from ``old_state`` cells to ``new_state`` cells"""
+    if old_state == new_state:
+        return
+    with transaction.atomic():
+        if old_state is not None:
+            _apply(property_id, old_state, -1)
+        if new_state is not None:
+            _apply(property_id, new_state, +1)
+
+
+def rebuild_map_cells():
+    """Recompute every cell from the Property table. Returns the number of cells."""
+    cells = {}
+    samples = defaultdict(list)
+    rows = Property.objects.filter(
+        verification_status='verified', status='available',
+        latitude__isnull=False, longitude__isnull=False,
+    ).order_by('-view_count', 'id').values('id', *CLUSTER_FIELDS)
+
+    for values in rows.iterator():
+        state = cluster_state(values)
+        latitude, longitude, rent = state
+        for key in _cell_keys(state):
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = PropertyMapCell(zoom=key[0], cell_x=key[1], cell_y=key[2])
+            cell.count += 1
+            cell.rent_sum += rent
+            cell.latitude_sum += latitude
+            cell.longitude_sum += longitude
+            if len(samples[key]) < SAMPLE_SIZE:
+                samples[key].append(values['id'])
+
+    for key, cell in cells.items():
+        cell.sample_ids = samples[key]
+
+    with transaction.atomic():
+        PropertyMapCell.objects.all().delete()
+        PropertyMapCell.objects.bulk_create(cells.values(), batch_size=1000)
+    return len(cells)
+
+
+def get_clusters(min_lng, min_lat, max_lng, max_lat, zoom):
+    """Clusters for a viewport, read from the precomputed cells in one query"""
+    zoom = max(MIN_ZOOM, min(int(zoom), MAX_ZOOM))
+    x1, y1 = cell_for(max_lat, min_lng, zoom)  # north-west corner
+    x2, y2 = cell_for(min_lat, max_lng, zoom)  # south-east corner
+
+    x_range = Q(cell_x__gte=x1, cell_x__lte=x2)
+    if x1 > x2:
+        # Viewport crosses the antimeridian
+        x_range = Q(cell_x__gte=x1) | Q(cell_x__lte=x2)
+
+    cells = PropertyMapCell.objects.filter(
+        x_range, zoom=zoom, cell_y__gte=y1, cell_y__lte=y2, count__gt=0
+    )
+    return [
+        {
+            'latitude': cell.latitude_sum / cell.count,
+            'longitude': cell.longitude_sum / cell.count,
+            'count': cell.count,
+            'avg_rent': float(cell.rent_sum) / cell.count,
+            'property_ids': cell.sample_ids,
+        }
+        for cell in cells
+    ]
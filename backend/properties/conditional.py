@@ -0,0 +1,102 @@
+"""
+Conditional GET validators for property list and detail responses.
+
+Validators are computed from a few cheap reads (the already fetched detail
+row, or one aggregate over the filtered list queryset) so a matching
+``If-None-Match`` / ``If-Modified-Since`` is answered with 304 before any
+serialization happens.
+
+List responses carry only an ETag. ``Max(updated_at)`` cannot see rows that
+leave the filtered set (deletes, unverification) or favorite changes, so a
+Last-Modified derived from it could answer ``If-Modified-Since`` with a
+stale 304; the ETag folds in the row count and favorite total instead.
+
+``view_count`` is a hot counter bumped on every detail view and is left out
+of the validators on purpose; a revalidated page may show a slightly stale
+count until the listing itself changes.
+"""
+import hashlib
+
+from django.db.models import Count, Max, Sum
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def _etag(*parts):
+    digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+    return f'"{digest}"'
+
+
+def _request_parts(request):
+    """Parts of the request that change the rendered body for the same rows"""
+    user = request.user
+    return (
+        request.accepted_renderer.format if hasattr(request, 'accepted_renderer') else None,
+        sorted(request.query_params.lists()),
+        user.pk if user.is_authenticated else None,
+    )
+
+
+def property_validators(request, instance, is_favorited=False):
+    """
+    (etag, last_modified) for a detail response. Images and documents must
+    be prefetched; ``is_favorited`` is the requesting user's favorite flag,
+    looked up once by the view and shared with the serializer.
+    """
+    images = [
+        (image.pk, image.image.name, image.caption, image.is_primary, image.order)
+        for image in instance.images.all()
+    ]
+    documents = sorted((document.pk, document.document.name) for document in instance.documents.all())
+    etag = _etag(
+        instance.pk, instance.updated_at, instance.favorite_count, instance.rating,
+        instance.owner.updated_at, images, documents, is_favorited, _request_parts(request),
+    )
+    last_modified = max(
+        [instance.updated_at, instance.owner.updated_at]
+        + [image.created_at for image in instance.images.all()]
+    )
+    return etag, last_modified
+
+
+def listing_validators(request, queryset, favorite_ids=()):
+    """
+    ETag for a list response, from one aggregate query. ``favorite_ids``
+    are the requesting user's favorites, which decide ``is_favorited`` on
+    every card.
+    """
+    aggregates = {
+        'count': Count('id'),
+        'last': Max('updated_at'),
+        'owners_last': Max('owner__updated_at'),
+        'favorites': Sum('favorite_count'),
+    }
+    # Only pay for the hot counter when it decides the page order
+    if 'view_count' in request.query_params.get('ordering', ''):
+        aggregates['views'] = Sum('view_count')
+    state = queryset.order_by().aggregate(**aggregates)
+
+    return _etag(
+        sorted(state.items()), sorted(favorite_ids), _request_parts(request),
+    )
+
+
+def not_modified(request, etag, last_modified=None):
+    """A 304 response if the client's cached copy is current, else None"""
+    response = get_conditional_response(
+        request._request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    """Attach validators; ``no-cache`` makes browsers revalidate instead of guessing freshness"""
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
@@ -0,0 +1,66 @@
+"""
+Reconciliation of denormalized Property counters.
+
+``favorite_count`` and ``view_count`` are maintained with F() increments and
+can still drift (manual deletes, failed buffer flushes, imports).
+``reconcile_counters`` recomputes them in one query with correlated
+subqueries and writes back only the rows that differ, each with an UPDATE
+conditioned on the value it read, so an increment that lands in between is
+never overwritten; such a row is left for the next run.
+"""
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .cache import bump_version
+from .models import Property, Favorite, PropertyViewDaily
+from .rollups import rollup_views
+
+
+def _subquery_total(queryset, aggregate):
+    return Coalesce(
+        Subquery(
+            queryset.filter(property=OuterRef('pk')).order_by()
+            .values('property').annotate(total=aggregate).values('total'),
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+def reconcile_counters(include_views=False):
+    """
+    Fix drifted counters; returns {field: number of rows corrected}.
+
+    View counts are only reconciled on request: they are recomputed from the
+    daily rollups (refreshed first), and view_count also holds views counted
+    before PropertyView rows were recorded, such as imported or seeded
+    listings, which no rollup covers.
+    """
+    fields = ['favorite_count']
+    annotations = {'actual_favorite_count': _subquery_total(Favorite.objects, Count('id'))}
+    if include_views:
+        rollup_views()
+        fields.append('view_count')
+        annotations['actual_view_count'] = _subquery_total(
+            PropertyViewDaily.objects, Sum('views')
+        )
+
+    rows = Property.objects.order_by().annotate(**annotations).values('pk', *fields, *annotations)
+    corrected = {field: 0 for field in fields}
+    for row in rows.iterator():
+        changes = {
+            field: row[f'actual_{field}'] for field in fields
+            if row[field] != row[f'actual_{field}']
+        }
+        if not changes:
+            continue
+        # Skipped when a concurrent F() increment moved the counter since the read
+        updated = Property.objects.filter(pk=row['pk'], **{field: row[field] for field in changes}).update(**changes)
+        if updated:
+            for field in changes:
+                corrected[field] += 1
+
+    if any(corrected.values()):
+        # Queryset updates send no signals
+        bump_version('listing')
+    return corrected
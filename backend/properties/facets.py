@@ -0,0 +1,67 @@
+"""
+Facet counts for the property search page.
+
+compute_facets() turns an already filtered Property queryset into counts per
+city, property type, bedroom count, furnished/pets flag and price bucket using
+four queries regardless of how many values each facet has.
+"""
+from django.db.models import Count, Q
+
+# (label, min inclusive, max exclusive); None means unbounded
+PRICE_BUCKETS = [
+    ('under_200', None, 200),
+    ('200_400', 200, 400),
+    ('400_700', 400, 700),
+    ('700_1000', 700, 1000),
+    ('1000_plus', 1000, None),
+]
+
+
+def _price_q(low, high):
+    q = Q()
+    if low is not None:
+        q &= Q(rent_price__gte=low)
+    if high is not None:
+        q &= Q(rent_price__lt=high)
+    return q
+
+
+def _grouped_counts(queryset, field):
+    rows = queryset.values(field).annotate(count=Count('id')).order_by('-count', field)
+    return [{'value': row[field], 'count': row['count']} for row in rows]
+
+
+def compute_facets(queryset):
+    """Return facet counts for ``queryset``"""
+    # Ordering and prefetches only add cost to aggregate queries
+    queryset = queryset.order_by().prefetch_related(None).select_related(None)
+
+    # Flags, price buckets and the total share a single aggregate query
+    aggregates = {
+        'total': Count('id'),
+        'furnished_true': Count('id', filter=Q(is_furnished=True)),
+        'pets_true': Count('id', filter=Q(pets_allowed=True)),
+    }
+    for label, low, high in PRICE_BUCKETS:
+        aggregates[f'price_{label}'] = Count('id', filter=_price_q(low, high))
+    totals = queryset.aggregate(**aggregates)
+    total = totals['total']
+
+    return {
+        'total': total,
+        'city': _grouped_counts(queryset, 'city'),
+        'property_type': _grouped_counts(queryset, 'property_type'),
+        'bedrooms': _grouped_counts(queryset, 'bedrooms'),
+        'is_furnished': {
+            'true': totals['furnished_true'],
+            'false': total - totals['furnished_true'],
+        },
+        'pets_allowed': {
+            'true': totals['pets_true'],
+            'false': total - totals['pets_true'],
+        },
+        'price': [
+            {'bucket': label, 'min': low, 'max': high, 'count': totals[f'price_{label}']}
+            for label, low, high in PRICE_BUCKETS
+        ],
+    }
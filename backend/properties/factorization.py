@@ -0,0 +1,152 @@
+"""
+Matrix-factorization collaborative filtering.
+
+``train_factors`` runs nightly: it factorizes the implicit user x property
+interaction matrix with scikit-learn ``TruncatedSVD`` and writes the user
+factors (U * Sigma), item factors (V) and the ids labelling their rows as
+``.npy`` files in a fresh directory under ``RECOMMENDER_MODEL_DIR``, then
+points the ``CURRENT`` file at it.
+
+Every worker memory-maps the current model read-only, so the arrays live
+once in the OS page cache however many processes serve requests, and
+remaps when ``CURRENT`` names another directory - the file is the version,
+so a model trained by any process on the host is picked up. Scoring a
+renter is one dot product of their factor row against all item factors,
+restricted to the listings that are currently available.
+"""
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .cache import get_version
+from .interactions import interaction_matrix
+from .models import Property
+
+DEFAULT_COMPONENTS = 32
+KEEP_MODELS = 2
+ARRAYS = ('user_factors', 'item_factors', 'user_ids', 'property_ids')
+
+
+def model_dir():
+    return Path(getattr(settings, 'RECOMMENDER_MODEL_DIR', settings.BASE_DIR / 'recommender_models'))
+
+
+def _current_pointer():
+    return model_dir() / 'CURRENT'
+
+
+def _current_name():
+    try:
+        return _current_pointer().read_text().strip()
+    except FileNotFoundError:
+        return None
+
+
+def train_factors(n_components=DEFAULT_COMPONENTS, since=None):
+    """Fit and publish a new model; returns (users, properties, components) or None"""
+    from sklearn.decomposition import TruncatedSVD
+
+    matrix, user_ids, property_ids = interaction_matrix(since=since)
+    # TruncatedSVD needs fewer components than either dimension
+    n_components = min(n_components, min(matrix.shape) - 1)
+    if n_components < 1:
+        return None
+
+    svd = TruncatedSVD(n_components=n_components, random_state=0)
+    arrays = {
+        'user_factors': svd.fit_transform(matrix).astype(np.float32),
+        'item_factors': svd.components_.T.astype(np.float32),
+        'user_ids': user_ids,
+        'property_ids': property_ids,
+    }
+
+    root = model_dir()
+    target = root / f'model-{time.time_ns()}'
+    target.mkdir(parents=True)
+    for name, array in arrays.items():
+        np.save(target / f'{name}.npy', array)
+
+    # Publish atomically: readers see either the old model or the new one
+    pointer = _current_pointer()
+    staged = pointer.with_suffix('.tmp')
+    staged.write_text(target.name)
+    staged.replace(pointer)
+
+    for old in sorted(root.glob('model-*'))[:-KEEP_MODELS]:
+        shutil.rmtree(old, ignore_errors=True)
+    return len(user_ids), len(property_ids), n_components
+
+
+class FactorModel:
+    """Per-process view of the current factor arrays, memory-mapped read-only"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._model = None  # (arrays, user positions), swapped atomically
+        self._available = (None, None)  # (listing version, item mask)
+
+    def _load(self, name):
+        if name is None:
+            return None
+        path = model_dir() / name
+        try:
+            arrays = {name: np.load(path / f'{name}.npy', mmap_mode='r') for name in ARRAYS}
+        except FileNotFoundError:
+            return None
+        positions = {int(pk): row for row, pk in enumerate(arrays['user_ids'])}
+        return arrays, positions
+
+    def _ensure_current(self):
+        version = _current_name()
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                self._model = self._load(version)
+                self._available = (None, None)
+                self._version = version
+
+    def _available_mask(self, property_ids):
+        """Items that can still be recommended, recomputed when a listing changes"""
+        version = get_version('listing')
+        cached_version, mask = self._available
+        if cached_version != version or mask is None:
+            available = Property.objects.filter(
+                verification_status='verified', status='available'
+            ).values_list('id', flat=True)
+            mask = np.isin(property_ids, list(available))
+            self._available = (version, mask)
+        return mask
+
+    def scores(self, user_id, exclude=(), limit=None):
+        """
+        {property_id: score} of the user's best ``limit`` unseen, available
+        properties, or {} when the user is not in the model.
+        """
+        self._ensure_current()
+        model = self._model
+        if model is None or user_id not in model[1]:
+            return {}
+        arrays, positions = model
+
+        scores = arrays['item_factors'] @ arrays['user_factors'][positions[user_id]]
+        property_ids = arrays['property_ids']
+        scores = np.where(self._available_mask(property_ids), scores, -np.inf)
+        if exclude:
+            scores = np.where(np.isin(property_ids, list(exclude)), -np.inf, scores)
+        count = len(scores) if limit is None else min(limit, len(scores))
+        if count == 0:
+            return {}
+        top = np.argpartition(-scores, count - 1)[:count]
+        return {
+            int(property_ids[i]): float(scores[i])
+            for i in top if np.isfinite(scores[i])
+        }
+
+
+factor_model = FactorModel()
@@ -0,0 +1,146 @@
+"""
+Geo search on plain latitude/longitude columns (no PostGIS).
+
+Each Property stores a geohash of its coordinates in an indexed column. A
+radius query:
+
+1. covers the query's bounding box with a handful of geohash cells and
+   prefilters in SQL with indexed ``geohash LIKE 'cell%'`` lookups plus the
+   exact latitude/longitude bounds,
+2. annotates the great-circle distance of the surviving rows as a SQL
+   haversine expression, then drops rows outside the radius and sorts, so
+   the filtered queryset never carries per-row parameters.
+"""
+import math
+
+from django.db.models import FloatField, Q, Value
+from django.db.models.functions import ASin, Cast, Cos, Least, Power, Radians, Sin, Sqrt
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+from .geohash import GEOHASH_PRECISION, cell_size_degrees, encode_geohash
+
+EARTH_RADIUS_KM = 6371.0088
+
+DEFAULT_RADIUS_KM = 5.0
+MAX_RADIUS_KM = 50.0
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """(min_lat, max_lat, min_lng, max_lng) enclosing a circle"""
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    lng_delta = min(math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat)), 180.0)
+    return (
+        max(latitude - lat_delta, -90.0),
+        min(latitude + lat_delta, 90.0),
+        max(longitude - lng_delta, -180.0),
+        min(longitude + lng_delta, 180.0),
+    )
+
+
+def _samples(low, high, step):
+    """Points from low to high spaced ``step`` apart, always including high"""
+    points, value = [], low
+    while value < high:
+        points.append(value)
+        value += step
+    points.append(high)
+    return points
+
+
+def covering_cells(bbox, max_cells=9):
+    """
+    The finest set of geohash prefixes (at most ``max_cells``) whose cells
+    cover the bounding box.
+    """
+    min_lat, max_lat, min_lng, max_lng = bbox
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size_degrees(precision)
+        rows = math.floor(max_lat / height) - math.floor(min_lat / height) + 1
+        cols = math.floor(max_lng / width) - math.floor(min_lng / width) + 1
+        if rows * cols > max_cells:
+            continue
+        # Samples spaced one cell apart hit every cell the box overlaps
+        return sorted({
+            encode_geohash(lat, lng, precision)
+            for lat in _samples(min_lat, max_lat, height)
+            for lng in _samples(min_lng, max_lng, width)
+        })
+    return ['']
+
+
+def bbox_prefilter(queryset, latitude, longitude, radius_km):
+    """Restrict ``queryset`` to rows inside the circle's bounding box, in SQL"""
+    bbox = bounding_box(latitude, longitude, radius_km)
+    cells = covering_cells(bbox)
+    cell_q = Q()
+    for cell in cells:
+        cell_q |= Q(geohash__startswith=cell)
+
+    min_lat, max_lat, min_lng, max_lng = bbox
+    return queryset.filter(
+        cell_q,
+        latitude__gte=min_lat, latitude__lte=max_lat,
+        longitude__gte=min_lng, longitude__lte=max_lng,
+    )
+
+
+def distance_expression(latitude, longitude):
+    """Great-circle distance in km from a point to each row, as a SQL expression"""
+    lat1 = math.radians(latitude)
+    lat2 = Radians(Cast('latitude', FloatField()))
+    lng2 = Radians(Cast('longitude', FloatField()))
+    a = (
+        Power(Sin((lat2 - Value(lat1)) / 2), 2)
+        + Value(math.cos(lat1)) * Cos(lat2) * Power(Sin((lng2 - Value(math.radians(longitude))) / 2), 2)
+    )
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(Least(a, Value(1.0))))
+
+
+def within_radius(queryset, latitude, longitude, radius_km):
+    """``queryset`` rows within ``radius_km``, annotated with ``distance_km``"""
+    return (
+        bbox_prefilter(queryset, latitude, longitude, radius_km)
+        .annotate(distance_km=distance_expression(latitude, longitude))
+        .filter(distance_km__lte=radius_km)
+    )
+
+
+def parse_near(value, radius_value=None):
+    """Parse ``near=lat,lng`` and ``radius_km``; raise ValidationError if malformed"""
+    try:
+        latitude, longitude = (float(part) for part in value.split(','))
+    except ValueError:
+        raise ValidationError({'near': 'Expected "latitude,longitude".'})
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValidationError({'near': 'Coordinates out of range.'})
+
+    try:
+        radius_km = float(radius_value) if radius_value else DEFAULT_RADIUS_KM
+    except ValueError:
+        raise ValidationError({'radius_km': 'Expected a number of kilometres.'})
+    if not 0 < radius_km <= MAX_RADIUS_KM:
+        raise ValidationError({'radius_km': f'Must be between 0 and {MAX_RADIUS_KM:g}.'})
+    return latitude, longitude, radius_km
+
+
+class NearbyFilter(BaseFilterBackend):
+    """
+    ``?near=lat,lng&radius_km=`` radius search.
+
+    Annotates ``distance_km`` and orders nearest first unless the client
+    passed an explicit ``ordering``, so this must run after OrderingFilter
+    and search.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        near = request.query_params.get('near')
+        if not near:
+            return queryset
+
+        latitude, longitude, radius_km = parse_near(near, request.query_params.get('radius_km'))
+        queryset = within_radius(queryset, latitude, longitude, radius_km)
+        if not request.query_params.get(OrderingFilter.ordering_param):
+            queryset = queryset.order_by('distance_km', 'id')
+        return queryset
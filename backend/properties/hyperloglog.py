@@ -0,0 +1,127 @@
+"""
+HyperLogLog sketches of unique property viewers.
+
+Counting distinct viewers over PropertyView means ``COUNT(DISTINCT ...)``
+over an ever-growing table. Instead every (property, day) keeps a
+PropertyViewSketch: 4096 one-byte registers (about 1.6% standard error),
+zlib-compressed so quiet days take a few dozen bytes. Sketches merge by
+taking the register-wise maximum, so 7- or 30-day and multi-property unique
+counts come from the daily rows without touching raw events.
+"""
+import hashlib
+import math
+import zlib
+from collections import defaultdict
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from .models import PropertyViewSketch
+
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+_VALUE_BITS = 64 - PRECISION
+
+
+class HyperLogLog:
+    """Mergeable distinct-count sketch over 64-bit hashes"""
+
+    def __init__(self, registers=None):
+        if registers is None:
+            registers = np.zeros(REGISTERS, dtype=np.uint8)
+        self.registers = registers
+
+    @classmethod
+    def from_bytes(cls, data):
+        if not data:
+            return cls()
+        raw = zlib.decompress(bytes(data))
+        return cls(np.frombuffer(raw, dtype=np.uint8).copy())
+
+    def to_bytes(self):
+        return zlib.compress(self.registers.tobytes())
+
+    def add(self, value):
+        digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+        hashed = int.from_bytes(digest, 'big')
+        index = hashed >> _VALUE_BITS
+        rest = hashed & ((1 << _VALUE_BITS) - 1)
+        rank = _VALUE_BITS - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / REGISTERS)
+        estimate = alpha * REGISTERS ** 2 / np.sum(np.power(2.0, -self.registers.astype(float)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * REGISTERS and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = REGISTERS * math.log(REGISTERS / zeros)
+        return int(round(estimate))
+
+
+def visitor_key(event):
+    """Identity of a viewer: the user when signed in, else the client IP"""
+    if event.user_id:
+        return f'user:{event.user_id}'
+    return f'ip:{event.ip_address or ""}'
+
+
+def record_unique_viewers(events):
+    """
+    Fold PropertyView events into their daily sketches. Must run inside a
+    transaction; rows are locked so concurrent flushes cannot drop registers.
+    """
+    visitors = defaultdict(set)
+    for event in events:
+        day = timezone.localdate(event.viewed_at)
+        visitors[(event.property_id, day)].add(visitor_key(event))
+    if not visitors:
+        return
+
+    PropertyViewSketch.objects.bulk_create(
+        [PropertyViewSketch(property_id=pid, date=day) for pid, day in visitors],
+        ignore_conflicts=True,
+    )
+    sketches = PropertyViewSketch.objects.select_for_update().filter(
+        property_id__in={pid for pid, _ in visitors},
+        date__in={day for _, day in visitors},
+    )
+    changed = []
+    for sketch in sketches:
+        keys = visitors.get((sketch.property_id, sketch.date))
+        if not keys:
+            continue
+        hll = HyperLogLog.from_bytes(sketch.registers)
+        for key in keys:
+            hll.add(key)
+        sketch.registers = hll.to_bytes()
+        changed.append(sketch)
+    PropertyViewSketch.objects.bulk_update(changed, ['registers'])
+
+
+def unique_viewers(property_ids, days, today=None):
+    """
+    Estimated distinct viewers over the last ``days`` days: a dict with one
+    entry per property id plus ``'total'`` across all of them.
+    """
+    today = today or timezone.localdate()
+    since = today - timedelta(days=days - 1)
+    merged = defaultdict(HyperLogLog)
+    total = HyperLogLog()
+    rows = PropertyViewSketch.objects.filter(
+        property_id__in=property_ids, date__gte=since, date__lte=today
+    ).values_list('property_id', 'registers')
+    for property_id, registers in rows.iterator():
+        sketch = HyperLogLog.from_bytes(registers)
+        merged[property_id].merge(sketch)
+        total.merge(sketch)
+
+    counts = {property_id: sketch.count() for property_id, sketch in merged.items()}
+    counts['total'] = total.count()
+    return counts
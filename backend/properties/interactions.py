@@ -0,0 +1,68 @@
+"""
+Implicit-feedback interactions between users and properties.
+
+Views, favorites and bookings are collapsed to one weighted entry per
+(user, property): the strongest signal wins, so viewing a listing twenty
+times does not outweigh booking it. Offline recommendation jobs build their
+sparse user x property matrices from here.
+"""
+import numpy as np
+from scipy import sparse
+
+from bookings.models import Booking
+from .models import PropertyView, Favorite
+
+INTERACTION_WEIGHTS = {'view': 1.0, 'favorite': 3.0, 'booking': 5.0}
+
+# Bookings that never went ahead say little about what the renter wanted
+IGNORED_BOOKING_STATUSES = ['cancelled', 'rejected']
+
+
+def _time_bounded(queryset, field, since, until):
+    if since is not None:
+        queryset = queryset.filter(**{f'{field}__gte': since})
+    if until is not None:
+        queryset = queryset.filter(**{f'{field}__lt': until})
+    return queryset
+
+
+def interaction_sources(since=None, until=None):
+    """{kind: queryset of distinct (user_id, property_id) pairs} within [since, until)"""
+    views = PropertyView.objects.filter(user__isnull=False)
+    bookings = Booking.objects.exclude(status__in=IGNORED_BOOKING_STATUSES)
+    return {
+        'view': _time_bounded(views, 'viewed_at', since, until)
+        .values_list('user_id', 'property_id').distinct().order_by(),
+        'favorite': _time_bounded(Favorite.objects.all(), 'created_at', since, until)
+        .values_list('user_id', 'property_id').distinct().order_by(),
+        'booking': _time_bounded(bookings, 'created_at', since, until)
+        .values_list('renter_id', 'property_id').distinct().order_by(),
+    }
+
+
+def interaction_weights(since=None, until=None):
+    """{(user_id, property_id): weight of the strongest interaction}"""
+    weights = {}
+    for kind, pairs in interaction_sources(since, until).items():
+        weight = INTERACTION_WEIGHTS[kind]
+        for pair in pairs.iterator():
+            if weights.get(pair, 0) < weight:
+                weights[pair] = weight
+    return weights
+
+
+def interaction_matrix(since=None, until=None):
+    """
+    (matrix, user_ids, property_ids): a CSR user x property matrix of
+    interaction weights plus the ids labelling its rows and columns.
+    """
+    weights = interaction_weights(since, until)
+    if not weights:
+        return sparse.csr_matrix((0, 0)), np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+
+    pairs = np.array(list(weights), dtype=np.int64)
+    user_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+    property_ids, cols = np.unique(pairs[:, 1], return_inverse=True)
+    values = np.fromiter(weights.values(), dtype=np.float32, count=len(weights))
+    matrix = sparse.csr_matrix((values, (rows, cols)), shape=(len(user_ids), len(property_ids)))
+    return matrix, user_ids, property_ids
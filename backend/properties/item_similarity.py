@@ -0,0 +1,76 @@
+"""
+Item-item co-interaction neighbours for collaborative recommendations.
+
+``build_property_neighbors`` runs offline: it multiplies the sparse user x
+property interaction matrix by its transpose to get weighted co-interaction
+counts between every pair of properties, normalizes them to cosine
+similarities and stores the top-K neighbours of each property in
+PropertyNeighbor. Online recommendation is then one indexed read of the
+neighbours of the user's seed properties and an in-memory merge.
+"""
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+
+from .interactions import interaction_matrix
+from .models import PropertyNeighbor
+
+DEFAULT_TOP_K = 20
+
+
+def top_k_neighbors(matrix, top_k=DEFAULT_TOP_K):
+    """
+    Yield (item index, neighbour indices, scores) from a user x item matrix,
+    best neighbour first, using cosine similarity of the item columns.
+    """
+    items = matrix.T.tocsr()
+    co_counts = (items @ items.T).tocsr()
+    norms = np.sqrt(co_counts.diagonal())
+    co_counts.setdiag(0)
+    co_counts.eliminate_zeros()
+
+    for item in range(co_counts.shape[0]):
+        start, end = co_counts.indptr[item], co_counts.indptr[item + 1]
+        if start == end:
+            continue
+        neighbors = co_counts.indices[start:end]
+        scores = co_counts.data[start:end] / (norms[item] * norms[neighbors])
+        if len(scores) > top_k:
+            keep = np.argpartition(-scores, top_k - 1)[:top_k]
+            neighbors, scores = neighbors[keep], scores[keep]
+        order = np.argsort(-scores, kind='stable')
+        yield item, neighbors[order], scores[order]
+
+
+def build_property_neighbors(top_k=DEFAULT_TOP_K):
+    """Recompute the PropertyNeighbor table; returns the number of rows written"""
+    matrix, _, property_ids = interaction_matrix()
+    rows = [
+        PropertyNeighbor(
+            property_id=int(property_ids[item]),
+            neighbor_id=int(property_ids[neighbor]),
+            score=float(score),
+        )
+        for item, neighbors, scores in top_k_neighbors(matrix, top_k)
+        for neighbor, score in zip(neighbors, scores)
+    ]
+    with transaction.atomic():
+        PropertyNeighbor.objects.all().delete()
+        PropertyNeighbor.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def neighbor_scores(seed_weights, exclude=()):
+    """
+    Merge the stored neighbours of weighted seed properties into
+    {property_id: score}, in one query.
+    """
+    scores = defaultdict(float)
+    rows = PropertyNeighbor.objects.filter(property_id__in=seed_weights).values_list(
+        'property_id', 'neighbor_id', 'score'
+    )
+    for property_id, neighbor_id, score in rows:
+        if neighbor_id not in exclude:
+            scores[neighbor_id] += seed_weights[property_id] * score
+    return dict(scores)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from properties.segments import build_segments
+
+
+class Command(BaseCommand):
+    help = 'Cluster available listings into segments with ranked lists for cold-start recommendations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clusters', type=int, default=None,
+                            help='Number of segments (default: sqrt(listings / 2), at most 20)')
+
+    def handle(self, *args, **options):
+        clusters = build_segments(n_clusters=options['clusters'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Built {clusters} listing segments'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from properties.item_similarity import build_property_neighbors, DEFAULT_TOP_K
+
+
+class Command(BaseCommand):
+    help = 'Precompute top-K co-interaction neighbours of every property for recommendations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K,
+                            help='Neighbours kept per property')
+
+    def handle(self, *args, **options):
+        count = build_property_neighbors(top_k=options['top_k'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Stored {count} property neighbours'))
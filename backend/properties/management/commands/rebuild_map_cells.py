@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from properties.clusters import rebuild_map_cells
+
+
+class Command(BaseCommand):
+    help = 'Recompute the precomputed map cluster cells from all properties'
+
+    def handle(self, *args, **options):
+        count = rebuild_map_cells()
+        self.stdout.write(self.style.SUCCESS(f'✓ Rebuilt {count} map cells'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from properties.popularity import rebuild_popularity
+
+
+class Command(BaseCommand):
+    help = 'Recompute the time-decayed popularity of every property from stored events'
+
+    def handle(self, *args, **options):
+        count = rebuild_popularity()
+        self.stdout.write(self.style.SUCCESS(f'✓ Rebuilt popularity of {count} properties'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from properties.profiles import rebuild_profiles
+
+
+class Command(BaseCommand):
+    help = 'Recompute renter preference profiles from stored views, favorites and bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Renters rebuilt per transaction')
+
+    def handle(self, *args, **options):
+        count = rebuild_profiles(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Rebuilt {count} renter profiles'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from properties.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute favorite counts (and optionally view counts) and fix drifted properties'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--views', action='store_true',
+                            help='Also reset view_count to the sum of the daily view rollups '
+                                 '(drops views counted before view tracking)')
+
+    def handle(self, *args, **options):
+        corrected = reconcile_counters(include_views=options['views'])
+        for field, count in corrected.items():
+            self.stdout.write(self.style.SUCCESS(f'✓ Corrected {field} on {count} properties'))
@@ -0,0 +1,34 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from properties.rollups import rollup_views, prune_raw_views, retention_days
+
+
+class Command(BaseCommand):
+    help = 'Roll raw property views up into daily totals and prune raw views past retention'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Rebuild rollups from this date (YYYY-MM-DD)')
+        parser.add_argument('--retention-days', type=int, default=None,
+                            help='Keep raw views this many days (default: PROPERTY_VIEW_RETENTION_DAYS)')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Raw views deleted per statement')
+        parser.add_argument('--no-prune', action='store_true', help='Only update the rollups')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('--since must be a date in YYYY-MM-DD format')
+
+        rows = rollup_views(since)
+        self.stdout.write(self.style.SUCCESS(f'✓ Wrote {rows} daily view rollups'))
+
+        if not options['no_prune']:
+            days = options['retention_days'] if options['retention_days'] is not None else retention_days()
+            deleted = prune_raw_views(days, options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ Pruned {deleted} raw views older than {days} days'
+            ))
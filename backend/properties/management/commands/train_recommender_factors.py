@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from properties.factorization import train_factors, DEFAULT_COMPONENTS
+
+
+class Command(BaseCommand):
+    help = 'Factorize the user x property interaction matrix for collaborative recommendations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--components', type=int, default=DEFAULT_COMPONENTS,
+                            help='Latent factors per user and property')
+
+    def handle(self, *args, **options):
+        result = train_factors(n_components=options['components'])
+        if result is None:
+            self.stdout.write(self.style.WARNING('Not enough interactions to train a model'))
+            return
+        users, properties, components = result
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Trained {components} factors for {users} users and {properties} properties'
+        ))
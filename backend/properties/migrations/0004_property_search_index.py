@@ -0,0 +1,40 @@
+from django.db import migrations
+
+# Columns searched by properties.search; keep in sync with SEARCH_FIELDS
+SEARCH_COLUMNS = ['title', 'city', 'area', 'address', 'description']
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        columns = ', '.join(f'`{column}`' for column in SEARCH_COLUMNS)
+        schema_editor.execute(
+            f'CREATE FULLTEXT INDEX properties_property_search_ft ON properties_property ({columns})'
+        )
+    elif vendor == 'postgresql':
+        document = " || ' ' || ".join(
+            f'coalesce("properties_property"."{column}", \'\')' for column in SEARCH_COLUMNS
+        )
+        schema_editor.execute(
+            'CREATE INDEX properties_property_search_gin ON properties_property '
+            f"USING GIN (to_tsvector('simple', {document}))"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute('DROP INDEX properties_property_search_ft ON properties_property')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS properties_property_search_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0003_remove_propertyimage_is_qr_code_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
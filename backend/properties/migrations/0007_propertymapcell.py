@@ -0,0 +1,30 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0006_property_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertyMapCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zoom', models.PositiveSmallIntegerField()),
+                ('cell_x', models.IntegerField()),
+                ('cell_y', models.IntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('rent_sum', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('latitude_sum', models.FloatField(default=0)),
+                ('longitude_sum', models.FloatField(default=0)),
+                ('sample_ids', models.JSONField(default=list)),
+            ],
+            options={
+                'unique_together': {('zoom', 'cell_x', 'cell_y')},
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0008_propertyview_viewed_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertyViewSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('registers', models.BinaryField(default=bytes)),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_sketches', to='properties.property')),
+            ],
+            options={
+                'unique_together': {('property', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0009_propertyviewsketch'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertyViewDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('unique_users', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='propertyview',
+            index=models.Index(fields=['viewed_at'], name='propertyview_viewed_at_idx'),
+        ),
+        migrations.AddField(
+            model_name='propertyviewdaily',
+            name='property',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_views', to='properties.property'),
+        ),
+        migrations.AddIndex(
+            model_name='propertyviewdaily',
+            index=models.Index(fields=['date'], name='propertyviewdaily_date_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='propertyviewdaily',
+            unique_together={('property', 'date')},
+        ),
+    ]
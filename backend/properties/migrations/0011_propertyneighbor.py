@@ -0,0 +1,26 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0010_propertyviewdaily'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertyNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='properties.property')),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='properties.property')),
+            ],
+            options={
+                'unique_together': {('property', 'neighbor')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.1 on 2026-10-17 00:06
+
+from django.db import migrations, models
+
+# 2024-01-01T00:00:00Z, the epoch stored popularity values were written against
+INITIAL_EPOCH = 1704067200.0
+
+
+def create_epoch(apps, schema_editor):
+    PopularityEpoch = apps.get_model('properties', 'PopularityEpoch')
+    PopularityEpoch.objects.get_or_create(pk=1, defaults={'epoch': INITIAL_EPOCH})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0012_property_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularityEpoch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('epoch', models.FloatField()),
+            ],
+        ),
+        migrations.RunPython(create_epoch, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from .geohash import encode_geohash
 
 User = get_user_model()
 
@@ -44,6 +47,8 @@ class Property(models.Model):
     postal_code = models.CharField(max_length=20, blank=True)
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    # Derived from latitude/longitude in save(); indexed prefix lookups back radius search
+    geohash = models.CharField(max_length=12, blank=True, default='', db_index=True, editable=False)
     
     # Pricing
     rent_price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -85,6 +90,8 @@ class Property(models.Model):
     view_count = models.IntegerField(default=0)
     favorite_count = models.IntegerField(default=0)
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
+    # Forward-decayed interaction score, see properties.popularity
+    popularity = models.FloatField(default=0, editable=False)
     
     # Bakong Payment Configuration
     bakong_bank_account = models.CharField(
@@ -118,10 +125,31 @@ class Property(models.Model):
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = 'Properties'
+        # Keyset pagination seeks on (ordering field, id)
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='property_created_id_idx'),
+            models.Index(fields=['rent_price', 'id'], name='property_price_id_idx'),
+            models.Index(fields=['rating', 'id'], name='property_rating_id_idx'),
+            models.Index(fields=['view_count', 'id'], name='property_views_id_idx'),
+            # "Popular now" top-N reads, see properties.popularity
+            models.Index(fields=['popularity', 'id'], name='property_popularity_id_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.city}"
     
+    def save(self, *args, **kwargs):
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+        
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        
+        super().save(*args, **kwargs)
+    
     @property
     def is_verified(self):
         return self.verification_status == 'verified'
@@ -175,15 +203,99 @@ class PropertyView(models.Model):
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True)
-    viewed_at = models.DateTimeField(auto_now_add=True)
+    # Set when the view happens, not when the buffered event is written
+    viewed_at = models.DateTimeField(default=timezone.now)
     
     class Meta:
         ordering = ['-viewed_at']
+        indexes = [
+            models.Index(fields=['viewed_at'], name='propertyview_viewed_at_idx'),
+        ]
     
     def __str__(self):
         return f"View of {self.property.title}"
 
 
+class PropertyViewDaily(models.Model):
+    """Per-day view totals of a property, rolled up from PropertyView"""
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='daily_views')
+    date = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    unique_users = models.PositiveIntegerField(default=0)  # distinct signed-in viewers
+    
+    class Meta:
+        unique_together = ['property', 'date']
+        indexes = [
+            models.Index(fields=['date'], name='propertyviewdaily_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.views} views of property {self.property_id} on {self.date}"
+
+
+class PropertyViewSketch(models.Model):
+    """HyperLogLog sketch of one property's distinct viewers on one day"""
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='view_sketches')
+    date = models.DateField()
+    registers = models.BinaryField(default=bytes)  # zlib-compressed, see properties.hyperloglog
+    
+    class Meta:
+        unique_together = ['property', 'date']
+    
+    def __str__(self):
+        return f"Viewers of property {self.property_id} on {self.date}"
+
+
+class PropertyNeighbor(models.Model):
+    """
+    Precomputed collaborative neighbour: ``neighbor`` is among the top-K
+    properties co-viewed/favorited/booked with ``property``. Rebuilt by
+    properties.item_similarity.
+    """
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    
+    class Meta:
+        unique_together = ['property', 'neighbor']
+    
+    def __str__(self):
+        return f"{self.property_id} -> {self.neighbor_id} ({self.score:.3f})"
+
+
+class PopularityEpoch(models.Model):
+    """
+    Single row holding the reference time, as a Unix timestamp, that every
+    stored Property.popularity is relative to. Moved forward by
+    properties.popularity.rebuild_popularity.
+    """
+    epoch = models.FloatField()
+    
+    def __str__(self):
+        return f"Popularity epoch {self.epoch}"
+
+
+class PropertyMapCell(models.Model):
+    """
+    Precomputed map cluster: aggregates of mappable properties falling in one
+    grid cell at one zoom level. Maintained incrementally by properties.clusters.
+    """
+    zoom = models.PositiveSmallIntegerField()
+    cell_x = models.IntegerField()
+    cell_y = models.IntegerField()
+    count = models.IntegerField(default=0)
+    rent_sum = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    latitude_sum = models.FloatField(default=0)
+    longitude_sum = models.FloatField(default=0)
+    sample_ids = models.JSONField(default=list)  # a few representative property ids
+    
+    class Meta:
+        unique_together = ['zoom', 'cell_x', 'cell_y']
+    
+    def __str__(self):
+        return f"Zoom {self.zoom} cell ({self.cell_x}, {self.cell_y}): {self.count}"
+
+
 class Report(models.Model):
     """Report suspicious or fake listings"""
     
@@ -0,0 +1,113 @@
+"""
+Keyset (cursor) pagination for property listings.
+
+PageNumberPagination runs COUNT(*) over the filtered queryset and pages with
+OFFSET, so deep pages get slower linearly. PropertyCursorPagination instead
+seeks past the last row of the previous page on (ordering field, id), which
+is served by the composite indexes on Property and costs the same for every
+page. It never counts.
+
+Cursor mode is opt-in: request ``?pagination=cursor`` for the first page and
+follow the ``next`` link (which carries ``cursor=``) for the following ones.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from .models import Property
+
+
+class PropertyCursorPagination(BasePagination):
+    """Forward-only keyset pagination with an id tie-breaker"""
+
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    ordering_param = api_settings.ORDERING_PARAM
+    invalid_cursor_message = 'Invalid cursor'
+
+    # Non-nullable fields that may be used as the keyset ordering
+    ordering_fields = ['rent_price', 'created_at', 'rating', 'view_count']
+    default_ordering = '-created_at'
+
+    @classmethod
+    def is_requested(cls, request):
+        params = request.query_params
+        return cls.cursor_query_param in params or params.get(cls.mode_query_param) == 'cursor'
+
+    def get_ordering(self, request):
+        """Return (field, descending) from the first valid ``ordering`` term"""
+        for term in request.query_params.get(self.ordering_param, '').split(','):
+            term = term.strip()
+            if term.lstrip('-') in self.ordering_fields:
+                return term.lstrip('-'), term.startswith('-')
+        return self.default_ordering.lstrip('-'), self.default_ordering.startswith('-')
+
+    def encode_cursor(self, field, descending, instance):
+        value = Property._meta.get_field(field).value_to_string(instance)
+        payload = json.dumps({'o': ('-' if descending else '') + field, 'v': value, 'id': instance.pk})
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, token, field, descending):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+            ordering, value, last_id = payload['o'], payload['v'], int(payload['id'])
+            value = Property._meta.get_field(field).to_python(value)
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        # A cursor is only meaningful for the ordering it was issued under
+        if ordering != ('-' if descending else '') + field:
+            raise NotFound(self.invalid_cursor_message)
+        return value, last_id
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.field, self.descending = self.get_ordering(request)
+        prefix = '-' if self.descending else ''
+        queryset = queryset.order_by(f'{prefix}{self.field}', f'{prefix}id')
+
+        token = request.query_params.get(self.cursor_query_param)
+        if token:
+            value, last_id = self.decode_cursor(token, self.field, self.descending)
+            lookup = 'lt' if self.descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__{lookup}': value})
+                | Q(**{self.field: value, f'id__{lookup}': last_id})
+            )
+
+        # One extra row tells us whether another page exists
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        cursor = self.encode_cursor(self.field, self.descending, self.page[-1])
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,107 @@
+"""
+Time-decayed popularity of listings.
+
+A listing's popularity is the sum of its interaction weights (view 1,
+favorite 3, booking 5), each halved every ``HALF_LIFE_DAYS`` since it
+happened. Decaying every row on a schedule would rewrite the whole table, so
+the column stores the *forward-decayed* form instead: an event at time t adds
+``weight * 2 ** ((t - epoch) / half-life)``. Every stored value shrinks by the
+same factor as time passes, so ordering by the column is ordering by
+current popularity. Events are a single ``F()`` increment and "popular now"
+is an indexed ``ORDER BY popularity DESC`` top-N read. Withdrawn events (an
+unfavorite, a cancelled or rejected booking) subtract the boost they added.
+
+Boosts double every half-life past the epoch and would overflow a float
+about 19 years after it, so the epoch is not a constant: it lives in the
+PopularityEpoch row, and increments read it in the same UPDATE. Run the
+``rebuild_property_popularity`` command on a schedule (daily or weekly):
+it recomputes every listing from stored events against a new epoch of
+"now" and stores the scores and the epoch in one transaction. Events
+recorded while a rebuild is reading may be missed until the next one.
+"""
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import F, FloatField, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest, Power
+from django.utils import timezone
+
+from bookings.models import Booking
+from .interactions import INTERACTION_WEIGHTS, IGNORED_BOOKING_STATUSES
+from .models import PopularityEpoch, Property, PropertyView, Favorite
+
+HALF_LIFE_DAYS = 7
+HALF_LIFE_SECONDS = HALF_LIFE_DAYS * 86400.0
+# Used until the first rebuild stores an epoch
+INITIAL_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc).timestamp()
+
+
+def current_epoch():
+    """Unix timestamp the stored values are relative to"""
+    epoch = PopularityEpoch.objects.filter(pk=1).values_list('epoch', flat=True).first()
+    return INITIAL_EPOCH if epoch is None else epoch
+
+
+def boost(at=None, epoch=None):
+    """Stored-score multiplier of an event at ``at``"""
+    at = at or timezone.now()
+    epoch = current_epoch() if epoch is None else epoch
+    return 2.0 ** ((at.timestamp() - epoch) / HALF_LIFE_SECONDS)
+
+
+def boost_expression(at=None):
+    """``boost(at)`` as a SQL expression, reading the epoch in the same statement"""
+    at = at or timezone.now()
+    epoch = Coalesce(
+        Subquery(PopularityEpoch.objects.filter(pk=1).values('epoch')), Value(INITIAL_EPOCH),
+        output_field=FloatField(),
+    )
+    return Power(Value(2.0), (Value(at.timestamp()) - epoch) / Value(HALF_LIFE_SECONDS))
+
+
+def current_score(stored, now=None):
+    """The decayed popularity a stored value represents at ``now``"""
+    return stored / boost(now)
+
+
+def increment(weight, at=None):
+    """New ``popularity`` value after adding ``weight`` for an event at ``at``; never below 0"""
+    return Greatest(
+        F('popularity') + Value(float(weight)) * boost_expression(at), Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def record(property_id, kind, count=1, at=None):
+    """Add ``count`` events of ``kind`` to a listing's popularity; a negative count withdraws them"""
+    Property.objects.filter(pk=property_id).update(
+        popularity=increment(INTERACTION_WEIGHTS[kind] * count, at)
+    )
+
+
+def rebuild_popularity(batch_size=1000):
+    """
+    Recompute every listing's popularity from stored events against a new
+    epoch of now; returns rows updated
+    """
+    epoch = timezone.now().timestamp()
+    scores = defaultdict(float)
+    sources = [
+        ('view', PropertyView.objects.all(), 'viewed_at'),
+        ('favorite', Favorite.objects.all(), 'created_at'),
+        ('booking', Booking.objects.exclude(status__in=IGNORED_BOOKING_STATUSES), 'created_at'),
+    ]
+    for kind, queryset, time_field in sources:
+        weight = INTERACTION_WEIGHTS[kind]
+        for property_id, at in queryset.values_list('property_id', time_field).iterator():
+            scores[property_id] += weight * boost(at, epoch)
+
+    properties = [
+        Property(pk=pk, popularity=scores.get(pk, 0.0))
+        for pk in Property.objects.values_list('pk', flat=True)
+    ]
+    with transaction.atomic():
+        Property.objects.bulk_update(properties, ['popularity'], batch_size=batch_size)
+        PopularityEpoch.objects.update_or_create(pk=1, defaults={'epoch': epoch})
+    return len(properties)
@@ -0,0 +1,163 @@
+"""
+Incrementally maintained renter preference profiles.
+
+Every view, favorite and booking folds the property's city, type,
+facilities and rent into the renter's RenterProfile:
+
+* city, type and facility affinities are weights that decay exponentially
+  with a half-life of ``PROFILE_HALF_LIFE_DAYS`` before each new event is
+  added with its interaction weight (view 1, favorite 3, booking 5)
+* rent is tracked as a decayed, weighted running mean and variance
+  (West's weighted form of Welford's update)
+* the last ``RECENT_LIMIT`` interacted property ids are kept for exclusion
+
+Personalized recommendations then read one profile row instead of
+re-deriving preferences from raw view history. ``rebuild_profiles`` replays
+the stored interactions for renters whose profile predates the hooks.
+"""
+import math
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from bookings.models import Booking
+from users.models import RenterProfile
+from .interactions import INTERACTION_WEIGHTS, IGNORED_BOOKING_STATUSES
+from .models import Property, PropertyView, Favorite
+
+PROFILE_HALF_LIFE_DAYS = 30
+RECENT_LIMIT = 20
+
+# Affinity entries kept per profile; weaker ones are forgotten
+MAX_AFFINITIES = 25
+MIN_AFFINITY = 0.01
+
+PROFILE_FIELDS = ['city', 'property_type', 'facilities', 'rent_price']
+
+
+def _decay_factor(since, until):
+    elapsed_days = max((until - since).total_seconds(), 0) / 86400
+    return 0.5 ** (elapsed_days / PROFILE_HALF_LIFE_DAYS)
+
+
+def _decay(weights, factor):
+    return {key: value * factor for key, value in weights.items()}
+
+
+def _prune(weights):
+    strongest = sorted(weights.items(), key=lambda item: -item[1])[:MAX_AFFINITIES]
+    return {key: round(value, 4) for key, value in strongest if value >= MIN_AFFINITY}
+
+
+def apply_event(profile, features, weight, at):
+    """Fold one interaction with a property (a dict of PROFILE_FIELDS) into ``profile``"""
+    factor = _decay_factor(profile.decayed_at, at)
+    if factor < 1:
+        profile.city_weights = _decay(profile.city_weights, factor)
+        profile.type_weights = _decay(profile.type_weights, factor)
+        profile.facility_weights = _decay(profile.facility_weights, factor)
+        profile.price_weight *= factor
+        profile.price_m2 *= factor
+        profile.decayed_at = at
+
+    city_weights = defaultdict(float, profile.city_weights)
+    type_weights = defaultdict(float, profile.type_weights)
+    facility_weights = defaultdict(float, profile.facility_weights)
+    if features['city']:
+        city_weights[features['city']] += weight
+    if features['property_type']:
+        type_weights[features['property_type']] += weight
+    for facility in features['facilities'] or []:
+        facility_weights[facility] += weight
+    profile.city_weights = _prune(city_weights)
+    profile.type_weights = _prune(type_weights)
+    profile.facility_weights = _prune(facility_weights)
+
+    if features['rent_price']:
+        price = float(features['rent_price'])
+        total = profile.price_weight + weight
+        delta = price - profile.price_mean
+        profile.price_mean += delta * weight / total
+        profile.price_m2 += weight * delta * (price - profile.price_mean)
+        profile.price_weight = total
+
+
+def price_range(profile):
+    """(low, high) rent band around the profile's mean, or None without price history"""
+    if not profile.price_weight:
+        return None
+    mean = profile.price_mean
+    std = math.sqrt(max(profile.price_m2, 0) / profile.price_weight)
+    # At least +/-15% so a single interaction still leaves choice, at most +/-50%
+    spread = min(max(std, mean * 0.15), mean * 0.5)
+    return mean - spread, mean + spread
+
+
+def _remember(profile, property_id):
+    recent = [pk for pk in profile.recent_property_ids if pk != property_id]
+    profile.recent_property_ids = [property_id] + recent[:RECENT_LIMIT - 1]
+
+
+def record_interactions(events):
+    """
+    Fold (user_id, property_id, kind, at) events into their renters'
+    profiles. Must run inside a transaction; profile rows are locked.
+    """
+    events = sorted((event for event in events if event[0]), key=lambda event: event[3])
+    if not events:
+        return
+    user_ids = {event[0] for event in events}
+    features = {
+        row['id']: row
+        for row in Property.objects.filter(pk__in={event[1] for event in events}).values('id', *PROFILE_FIELDS)
+    }
+
+    RenterProfile.objects.bulk_create(
+        [RenterProfile(user_id=user_id, decayed_at=events[0][3]) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+    profiles = {
+        profile.user_id: profile
+        for profile in RenterProfile.objects.select_for_update().filter(user_id__in=user_ids)
+    }
+    for user_id, property_id, kind, at in events:
+        if property_id in features:
+            apply_event(profiles[user_id], features[property_id], INTERACTION_WEIGHTS[kind], at)
+            _remember(profiles[user_id], property_id)
+
+    now = timezone.now()
+    for profile in profiles.values():
+        profile.updated_at = now
+    RenterProfile.objects.bulk_update(
+        list(profiles.values()),
+        ['city_weights', 'type_weights', 'facility_weights', 'price_weight', 'price_mean',
+         'price_m2', 'recent_property_ids', 'decayed_at', 'updated_at'],
+    )
+
+
+def record_interaction(user_id, property_id, kind, at=None):
+    with transaction.atomic():
+        record_interactions([(user_id, property_id, kind, at or timezone.now())])
+
+
+def rebuild_profiles(batch_size=500):
+    """Recompute every renter profile from stored interactions; returns profiles written"""
+    events = defaultdict(list)
+    sources = [
+        ('view', PropertyView.objects.filter(user__isnull=False), 'user_id', 'viewed_at'),
+        ('favorite', Favorite.objects.all(), 'user_id', 'created_at'),
+        ('booking', Booking.objects.exclude(status__in=IGNORED_BOOKING_STATUSES), 'renter_id', 'created_at'),
+    ]
+    for kind, queryset, user_field, time_field in sources:
+        rows = queryset.values_list(user_field, 'property_id', time_field).iterator()
+        for user_id, property_id, at in rows:
+            events[user_id].append((user_id, property_id, kind, at))
+
+    user_ids = sorted(events)
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        with transaction.atomic():
+            RenterProfile.objects.filter(user_id__in=batch).delete()
+            record_interactions([event for user_id in batch for event in events[user_id]])
+    return len(user_ids)
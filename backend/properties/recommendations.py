@@ -1,9 +1,9 @@
-from django.db.models import Q, Count, Avg, F
-from django.contrib.gis.geos import Point
-from django.contrib.gis.measure import D
-from django.utils import timezone
-from datetime import timedelta
 from .models import Property, PropertyView, Favorite
+from .similar import similar_index
+from .interactions import INTERACTION_WEIGHTS
+from .item_similarity import neighbor_scores
+from .factorization import factor_model
+from .segments import segment_index
 
 class PropertyRecommender:
     def __init__(self, user=None):
@@ -55,74 +55,62 @@ class PropertyRecommender:
             user=self.user
         ).values_list('property_id', flat=True))
         
-        # 4. Create a base queryset with annotations for scoring
-        base_qs = queryset.annotate(
-            popularity_score=Count('views', distinct=True) + Count('favorited_by', distinct=True) * 2,
-            recency_score=Count('id', filter=Q(created_at__gte=timezone.now() - timedelta(days=30)))
-        )
-        
-        # 5. Apply preference filters if available
+        # 4. Apply preference filters if available
         if preferences:
             # Filter by preferred cities/areas
             if preferences.preferred_cities:
-                base_qs = base_qs.filter(city__in=preferences.preferred_cities)
+                queryset = queryset.filter(city__in=preferences.preferred_cities)
             
             # Filter by price range
             if preferences.min_price is not None:
-                base_qs = base_qs.filter(rent_price__gte=preferences.min_price)
+                queryset = queryset.filter(rent_price__gte=preferences.min_price)
             if preferences.max_price is not None:
-                base_qs = base_qs.filter(rent_price__lte=preferences.max_price)
+                queryset = queryset.filter(rent_price__lte=preferences.max_price)
             
             # Filter by property type
             if preferences.property_types:
-                base_qs = base_qs.filter(property_type__in=preferences.property_types)
+                queryset = queryset.filter(property_type__in=preferences.property_types)
             
             # Filter by furnished status
             if preferences.furnished is not None:
-                base_qs = base_qs.filter(is_furnished=preferences.furnished)
+                queryset = queryset.filter(is_furnished=preferences.furnished)
             
             # Filter by required facilities
             if preferences.required_facilities:
                 for facility in preferences.required_facilities:
-                    base_qs = base_qs.filter(facilities__contains=[facility])
+                    queryset = queryset.filter(facilities__contains=[facility])
         
-        # 6. Exclude already viewed properties
+        # 5. Exclude already viewed properties
         if viewed_properties:
-            base_qs = base_qs.exclude(id__in=viewed_properties)
+            queryset = queryset.exclude(id__in=viewed_properties)
         
-        # 7. Get similar properties based on favorites (collaborative filtering)
-        if favorite_properties:
-            # Find users who favorited the same properties
-            similar_users = Favorite.objects.filter(
-                property_id__in=favorite_properties
-            ).exclude(user=self.user).values_list('user_id', flat=True).distinct()
-            
-            if similar_users:
-                # Get properties favorited by similar users
-                similar_properties = Favorite.objects.filter(
-                    user_id__in=similar_users
-                ).exclude(
-                    property_id__in=favorite_properties | viewed_properties
-                ).values('property').annotate(
-                    score=Count('user')
-                ).order_by('-score')[:limit*2]
-                
-                if similar_properties:
-                    property_ids = [p['property'] for p in similar_properties]
-                    recommendations = list(Property.objects.filter(
-                        id__in=property_ids
-                    ).annotate(
-                        score=F('popularity_score') * 0.5 + F('recency_score') * 0.5
-                    ).order_by('-score')[:limit])
+        # 6. Collaborative filtering: score with the nightly matrix-factorization
+        # model; users it has not seen yet get the precomputed co-interaction
+        # neighbours of everything they viewed or favorited
+        seen = favorite_properties | viewed_properties
+        scores = factor_model.scores(self.user.id, exclude=seen, limit=limit * 3)
+        seeds = dict.fromkeys(viewed_properties, INTERACTION_WEIGHTS['view'])
+        seeds.update(dict.fromkeys(favorite_properties, INTERACTION_WEIGHTS['favorite']))
+        if not scores and seeds:
+            scores = neighbor_scores(seeds, exclude=seen)
+        if not scores:
+            # Cold start: rank within the listing segments of the user's first
+            # interactions or stated preferences
+            segment_ids = segment_index.cold_start_ids(
+                limit * 3, preferences=preferences, property_ids=seen, exclude=seen
+            )
+            scores = {pk: -rank for rank, pk in enumerate(segment_ids)}
+        if scores:
+            ranked_ids = sorted(scores, key=scores.get, reverse=True)[:limit * 3]
+            candidates = queryset.in_bulk(ranked_ids)
+            recommendations = [candidates[pk] for pk in ranked_ids if pk in candidates][:limit]
         
-        # 8. If not enough recommendations, add popular properties
+        # 7. If not enough recommendations, add popular properties
         if len(recommendations) < limit:
             remaining = limit - len(recommendations)
-            popular = base_qs.exclude(
-                id__in=[p.id for p in recommendations]
-            ).order_by(
-                '-popularity_score', '-recency_score'
-            )[:remaining]
+            popular = self.get_popular_properties(
+                queryset.exclude(id__in=[p.id for p in recommendations]), remaining
+            )
             
             for prop in popular:
                 if prop not in recommendations:
@@ -132,50 +120,13 @@ class PropertyRecommender:
     
     def get_popular_properties(self, queryset, limit):
         """
-        Get popular properties for anonymous users or when personalization is not possible
+        Get popular properties for anonymous users or when personalization is not possible.
+        Reads the time-decayed popularity column, so this is an indexed top-N.
         """
-        return queryset.annotate(
-            popularity=Count('views', distinct=True) + Count('favorited_by', distinct=True) * 2
-        ).order_by('-popularity', '-created_at')[:limit]
+        return queryset.order_by('-popularity', '-created_at')[:limit]
     
     def get_similar_properties(self, property_id, limit=5):
         """
-        Get properties similar to the given property
+        Get properties similar to the given property (kNN over listing features)
         """
-        try:
-            target = Property.objects.get(id=property_id)
-            
-            # Find similar properties in the same area and price range
-            similar = Property.objects.filter(
-                city=target.city,
-                property_type=target.property_type,
-                rent_price__gte=target.rent_price * 0.7,
-                rent_price__lte=target.rent_price * 1.3,
-                status='available',
-                verification_status='verified'
-            ).exclude(id=property_id)
-            
-            # If we have location data, prioritize nearby properties
-            if target.latitude and target.longitude:
-                point = Point(target.longitude, target.latitude, srid=4326)
-                similar = similar.annotate(
-                    distance=Distance('location', point)
-                ).order_by('distance')
-            
-            # Add some randomness to the results
-            similar = similar.order_by('?')[:limit*2]
-            
-            # Sort by similarity score (simplified)
-            return sorted(
-                similar,
-                key=lambda p: (
-                    p.property_type == target.property_type,
-                    p.bedrooms == target.bedrooms,
-                    p.bathrooms == target.bathrooms,
-                    -p.view_count
-                ),
-                reverse=True
-            )[:limit]
-            
-        except Property.DoesNotExist:
-            return Property.objects.none()
+        return similar_index.similar(property_id, limit)
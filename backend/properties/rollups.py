@@ -0,0 +1,105 @@
+"""
+Daily rollups of PropertyView events.
+
+``rollup_views`` recomputes PropertyViewDaily rows for the days since the
+last rollup (the last rolled day is redone, as it was probably partial)
+with one grouped query over an indexed ``viewed_at`` range. View-trend
+analytics read the rollups, plus raw events for days not yet rolled up, so
+raw events only need to be kept for the retention window; ``prune_raw_views`` deletes older ones in bounded chunks.
+
+Both run from the ``rollup_property_views`` management command.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import PropertyView, PropertyViewDaily
+
+
+def retention_days():
+    return getattr(settings, 'PROPERTY_VIEW_RETENTION_DAYS', 180)
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def rollup_views(since=None):
+    """Rebuild rollups for every day from ``since`` to today; returns rows written"""
+    first = PropertyView.objects.aggregate(first=Min('viewed_at'))['first']
+    if first is None:
+        return 0
+    if since is None:
+        since = PropertyViewDaily.objects.aggregate(last=Max('date'))['last']
+    # Days before the oldest raw event have been pruned; keep their rollups
+    since = max(since or timezone.localdate(first), timezone.localdate(first))
+
+    rows = (
+        PropertyView.objects.filter(viewed_at__gte=_start_of(since))
+        .annotate(date=TruncDate('viewed_at'))
+        .values('property_id', 'date')
+        .annotate(views=Count('id'), unique_users=Count('user', distinct=True))
+        .order_by()
+    )
+    rollups = [PropertyViewDaily(**row) for row in rows]
+
+    with transaction.atomic():
+        PropertyViewDaily.objects.filter(date__gte=since).delete()
+        PropertyViewDaily.objects.bulk_create(rollups, batch_size=1000)
+    return len(rollups)
+
+
+def prune_raw_views(days=None, chunk_size=5000):
+    """
+    Delete raw views older than the retention window, ``chunk_size`` rows per
+    statement so no single delete holds long locks. Returns rows deleted.
+    """
+    days = retention_days() if days is None else days
+    # Never prune days that have not been rolled up yet
+    last_rolled = PropertyViewDaily.objects.aggregate(last=Max('date'))['last']
+    if last_rolled is None:
+        return 0
+    cutoff = min(timezone.localdate() - timedelta(days=days), last_rolled)
+
+    old_views = PropertyView.objects.filter(viewed_at__lt=_start_of(cutoff))
+    deleted = 0
+    while True:
+        ids = list(old_views.order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        deleted += PropertyView.objects.filter(id__in=ids).delete()[0]
+
+
+def views_trend(property_ids, days=30, today=None):
+    """
+    [{'date', 'views'}] for the last ``days`` days, zero-filled. Days up to
+    the last rollup come from the rollups; that day, which was probably
+    partial, and any later ones are counted from the raw events, so today's
+    views show before the next rollup run.
+    """
+    today = today or timezone.localdate()
+    since = today - timedelta(days=days - 1)
+    last_rolled = PropertyViewDaily.objects.aggregate(last=Max('date'))['last']
+    raw_from = max(since, last_rolled) if last_rolled else since
+
+    totals = dict(
+        PropertyViewDaily.objects.filter(
+            property_id__in=property_ids, date__gte=since, date__lt=raw_from
+        ).values('date').annotate(views=Sum('views')).order_by().values_list('date', 'views')
+    )
+    totals.update(
+        PropertyView.objects.filter(
+            property_id__in=property_ids,
+            viewed_at__gte=_start_of(raw_from),
+            viewed_at__lt=_start_of(today + timedelta(days=1)),
+        ).annotate(date=TruncDate('viewed_at')).values('date')
+        .annotate(views=Count('id')).order_by().values_list('date', 'views')
+    )
+    return [
+        {'date': day.strftime('%Y-%m-%d'), 'views': totals.get(day, 0)}
+        for day in (since + timedelta(days=i) for i in range(days))
+    ]
@@ -0,0 +1,386 @@
+"""
+Full-text search backends for property keyword search.
+
+PropertyViewSet used DRF's SearchFilter, which ORs an ``icontains`` clause per
+field and forces a full table scan. The backends here rank matches by
+relevance instead:
+
+* MySQLFullTextBackend  - MATCH ... AGAINST over a FULLTEXT index
+* PostgresSearchBackend - to_tsvector/to_tsquery over a GIN expression index
+* InvertedIndexBackend  - pure-Python TF-IDF index, used on SQLite and in tests
+
+The database backends rely on indexes created in migration 0004, which the
+database keeps current on every write. The in-process index is updated from
+the Property save/delete signals in ``properties/signals.py`` and catches up
+with other processes' writes as described on InvertedIndexBackend.
+"""
+import heapq
+import math
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, Count, When, F, FloatField, Max, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework import filters
+
+from .cache import get_version
+from .models import Property
+
+# Searched fields and their relevance weight
+SEARCH_FIELDS = {
+    'title': 3.0,
+    'city': 2.0,
+    'area': 2.0,
+    'address': 1.0,
+    'description': 1.0,
+}
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens"""
+    return TOKEN_RE.findall((text or '').lower())
+
+
+class BaseSearchBackend:
+    """Interface shared by all property search backends"""
+
+    def search(self, queryset, terms):
+        """
+        Restrict ``queryset`` to properties matching every term and annotate
+        it with a ``search_rank`` (higher is more relevant).
+        """
+        raise NotImplementedError
+
+    def no_results(self, queryset):
+        """Empty result that still carries the search_rank annotation"""
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField())).none()
+
+    def index_property(self, property_obj):
+        """Called after a property is saved. Database backends need nothing."""
+
+    def remove_property(self, property_id):
+        """Called after a property is deleted. Database backends need nothing."""
+
+
+class MySQLFullTextBackend(BaseSearchBackend):
+    """MATCH ... AGAINST in boolean mode over the properties FULLTEXT index"""
+
+    # Characters with special meaning in MySQL boolean full-text syntax
+    OPERATORS_RE = re.compile(r'[+\-><()~*"@]')
+
+    # InnoDB's default full-text stopword list (INFORMATION_SCHEMA.INNODB_FT_DEFAULT_STOPWORD)
+    STOPWORDS = frozenset([
+        'a', 'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en', 'for', 'from',
+        'how', 'i', 'in', 'is', 'it', 'la', 'of', 'on', 'or', 'that', 'the', 'this', 'to',
+        'was', 'what', 'when', 'where', 'who', 'will', 'with', 'und', 'www',
+    ])
+
+    def __init__(self):
+        self._min_token_size = None
+
+    @property
+    def min_token_size(self):
+        """innodb_ft_min_token_size of the server, read once"""
+        if self._min_token_size is None:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT @@innodb_ft_min_token_size')
+                self._min_token_size = int(cursor.fetchone()[0])
+        return self._min_token_size
+
+    def indexed(self, word):
+        """Whether the FULLTEXT index can match ``word``; other required terms match nothing"""
+        return len(word) >= self.min_token_size and word.lower() not in self.STOPWORDS
+
+    def search(self, queryset, terms):
+        words = [self.OPERATORS_RE.sub('', term) for term in terms]
+        words = [word for word in words if word]
+        if not words:
+            return self.no_results(queryset)
+
+        indexed = [word for word in words if self.indexed(word)]
+        if not indexed:
+            # Only short words or stopwords: fall back to substring matching
+            for word in words:
+                queryset = queryset.filter(
+                    Q(*[Q(**{f'{field}__icontains': word}) for field in SEARCH_FIELDS], _connector=Q.OR)
+                )
+            return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+        # Every term is required and may match as a prefix, like icontains did
+        against = ' '.join(f'+{word}*' for word in indexed)
+        table = Property._meta.db_table
+        columns = ', '.join(f'`{table}`.`{field}`' for field in SEARCH_FIELDS)
+        match_sql = f'MATCH ({columns}) AGAINST (%s IN BOOLEAN MODE)'
+
+        return queryset.annotate(
+            search_rank=RawSQL(match_sql, (against,), output_field=FloatField())
+        ).filter(search_rank__gt=0)
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """to_tsquery ranking over the properties GIN expression index"""
+
+    # Must match the expression indexed in migration 0004 for the index to be used
+    CONFIG = 'simple'
+
+    def search(self, queryset, terms):
+        # Needs psycopg, which only PostgreSQL deployments install
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        words = [word for term in terms for word in tokenize(term)]
+        if not words:
+            return self.no_results(queryset)
+
+        # Renders as to_tsvector('simple', coalesce(title, '') || ' ' || ...), the indexed expression
+        vector = SearchVector(*SEARCH_FIELDS, config=self.CONFIG)
+        query = SearchQuery(' & '.join(f'{word}:*' for word in words), config=self.CONFIG, search_type='raw')
+        return queryset.annotate(
+            search_vector=vector,
+            search_rank=SearchRank(F('search_vector'), query),
+        ).filter(search_vector=query)
+
+
+class InvertedIndexBackend(BaseSearchBackend):
+    """
+    Per-process inverted index with weighted TF-IDF ranking.
+
+    Built lazily from the database on first search. Intended for
+    SQLite/development; each worker process holds its own copy. The saving
+    process updates its copy from the Property signals; other processes see
+    the ``listing`` cache version move and, like writes that bypass the
+    signals (checked at most every ``REFRESH_SECONDS``), fold in the rows
+    whose count or latest ``updated_at`` changed. A copy is therefore at
+    most ``REFRESH_SECONDS`` behind the database.
+
+    A search returns at most ``MAX_MATCHES`` listings, the most relevant of
+    those the other filters kept, so the rank annotation stays bounded.
+    """
+    MAX_MATCHES = 200
+    REFRESH_SECONDS = 300
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._version = None
+        self._fingerprint = None
+        self._checked_at = 0.0
+        self._postings = defaultdict(dict)  # token -> {property_id: weighted tf}
+        self._documents = {}  # property_id -> set of tokens
+        self._vocabulary = []  # sorted tokens, for prefix lookups
+
+    def _document_weights(self, values):
+        weights = defaultdict(float)
+        for field, weight in SEARCH_FIELDS.items():
+            for token in tokenize(values.get(field)):
+                weights[token] += weight
+        return weights
+
+    def _add(self, property_id, values):
+        """Index a document; returns the tokens that are new to the index"""
+        weights = self._document_weights(values)
+        added = set()
+        for token, weight in weights.items():
+            if token not in self._postings:
+                added.add(token)
+            self._postings[token][property_id] = weight
+        self._documents[property_id] = set(weights)
+        return added
+
+    def _discard(self, property_id):
+        """Unindex a document; returns the tokens no longer in the index"""
+        removed = set()
+        for token in self._documents.pop(property_id, ()):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(property_id, None)
+                if not postings:
+                    del self._postings[token]
+                    removed.add(token)
+        return removed
+
+    def _update_vocabulary(self, added=(), removed=()):
+        """Keep the sorted vocabulary current without re-sorting it"""
+        for token in removed:
+            position = bisect_left(self._vocabulary, token)
+            if position < len(self._vocabulary) and self._vocabulary[position] == token:
+                del self._vocabulary[position]
+        for token in added:
+            insort(self._vocabulary, token)
+
+    @staticmethod
+    def _listing_fingerprint():
+        return tuple(Property.objects.aggregate(count=Count('id'), updated=Max('updated_at')).values())
+
+    def _build(self):
+        for values in Property.objects.values('id', *SEARCH_FIELDS).iterator():
+            self._add(values['id'], values)
+        self._vocabulary = sorted(self._postings)
+        self._built = True
+
+    def _refresh(self):
+        """Fold in listings written since ``self._fingerprint`` was taken"""
+        present = set(Property.objects.values_list('id', flat=True))
+        removed, added = set(), set()
+        for property_id in set(self._documents) - present:
+            removed |= self._discard(property_id)
+        unseen = present.difference(self._documents)
+        changed = Q(id__in=unseen)
+        if self._fingerprint[1] is not None:
+            changed |= Q(updated_at__gte=self._fingerprint[1])
+        changed = Property.objects.filter(changed).values('id', *SEARCH_FIELDS)
+        for values in changed.iterator():
+            removed |= self._discard(values['id'])
+            added |= self._add(values['id'], values)
+        self._update_vocabulary(added - removed, removed - added)
+
+    def _ensure_current(self):
+        version = get_version('listing')
+        stale = time.monotonic() - self._checked_at >= self.REFRESH_SECONDS
+        if self._built and version == self._version and not stale:
+            return
+        with self._lock:
+            # Taken before reading rows, so a write during the read is refolded next time
+            fingerprint = self._listing_fingerprint()
+            if not self._built:
+                self._build()
+            elif fingerprint != self._fingerprint:
+                self._refresh()
+            self._version = version
+            self._fingerprint = fingerprint
+            self._checked_at = time.monotonic()
+
+    def reset(self):
+        """Drop the index so the next search rebuilds it"""
+        with self._lock:
+            self._built = False
+            self._version = None
+            self._fingerprint = None
+            self._postings.clear()
+            self._documents.clear()
+            self._vocabulary = []
+
+    def index_property(self, property_obj):
+        with self._lock:
+            if not self._built:
+                return
+            removed = self._discard(property_obj.pk)
+            added = self._add(property_obj.pk, {field: getattr(property_obj, field) for field in SEARCH_FIELDS})
+            self._update_vocabulary(added - removed, removed - added)
+
+    def remove_property(self, property_id):
+        with self._lock:
+            if not self._built:
+                return
+            self._update_vocabulary(removed=self._discard(property_id))
+
+    def _expand(self, word):
+        """All indexed tokens starting with ``word``"""
+        position = bisect_left(self._vocabulary, word)
+        while position < len(self._vocabulary) and self._vocabulary[position].startswith(word):
+            yield self._vocabulary[position]
+            position += 1
+
+    def rank(self, terms):
+        """Return {property_id: score} for properties matching every term"""
+        self._ensure_current()
+        words = [word for term in terms for word in tokenize(term)]
+        if not words:
+            return {}
+
+        with self._lock:
+            total = max(len(self._documents), 1)
+            scores = None
+            for word in words:
+                term_scores = defaultdict(float)
+                for token in self._expand(word):
+                    postings = self._postings[token]
+                    idf = math.log(1 + total / len(postings))
+                    for property_id, weight in postings.items():
+                        term_scores[property_id] += weight * idf
+                if scores is None:
+                    scores = dict(term_scores)
+                else:
+                    scores = {
+                        property_id: score + term_scores[property_id]
+                        for property_id, score in scores.items()
+                        if property_id in term_scores
+                    }
+                if not scores:
+                    return {}
+            return scores
+
+    def search(self, queryset, terms):
+        scores = self.rank(terms)
+        if not scores:
+            return self.no_results(queryset)
+
+        # Ranked here rather than in SQL, over the ids the other filters kept
+        candidates = queryset.order_by().prefetch_related(None).values_list('id', flat=True)
+        top = heapq.nlargest(
+            self.MAX_MATCHES,
+            (property_id for property_id in candidates.iterator() if property_id in scores),
+            key=lambda property_id: (scores[property_id], -property_id),
+        )
+        if not top:
+            return self.no_results(queryset)
+        return queryset.filter(id__in=top).annotate(
+            search_rank=Case(
+                *[When(id=property_id, then=Value(scores[property_id])) for property_id in top],
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        )
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend():
+    """
+    Return the process-wide search backend.
+
+    ``PROPERTY_SEARCH_BACKEND`` may name a backend class by dotted path;
+    otherwise it is chosen from the database vendor.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend_path = getattr(settings, 'PROPERTY_SEARCH_BACKEND', None)
+                if backend_path:
+                    _backend = import_string(backend_path)()
+                elif connection.vendor == 'mysql':
+                    _backend = MySQLFullTextBackend()
+                elif connection.vendor == 'postgresql':
+                    _backend = PostgresSearchBackend()
+                else:
+                    _backend = InvertedIndexBackend()
+    return _backend
+
+
+class PropertySearchFilter(filters.SearchFilter):
+    """
+    Drop-in replacement for SearchFilter backed by get_search_backend().
+
+    Results are ordered by relevance unless the client passed an explicit
+    ``ordering`` parameter, so this must run after OrderingFilter.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        queryset = get_search_backend().search(queryset, terms)
+        if not request.query_params.get(filters.OrderingFilter.ordering_param):
+            queryset = queryset.order_by('-search_rank', '-created_at')
+        return queryset
@@ -0,0 +1,214 @@
+"""
+Cold-start recommendations from listing segments.
+
+``build_segments`` runs offline (the ``build_listing_segments`` command): it
+clusters every verified, available listing with scikit-learn k-means over
+the same features as the similar-listings index (rent, type, size,
+facilities, location), precomputes, per cluster, its listings ranked by
+decayed popularity and rating, and pickles the result to
+``segments.pickle`` under ``RECOMMENDER_MODEL_DIR``. Each process holds a
+copy and reloads it when the file is replaced, so a build by any process on
+the host reaches every worker. Nothing is ever fitted on the request path:
+without a published file the index is empty and callers serve popular
+listings instead.
+
+Between builds, at most every ``REFRESH_SECONDS`` a process compares the
+listing count and latest ``updated_at`` with what it last saw; when they
+moved, listings changed since then are assigned to their nearest existing
+centroid and withdrawn ones are dropped, without refitting.
+
+A renter with no history is mapped to segments without any query of its
+own: from the listings of their first interactions (a dict lookup each) or
+from their UserPreference (nearest centroid over a handful of clusters),
+and served the heads of those segments' ranked lists.
+"""
+import itertools
+import math
+import pickle
+import threading
+import time
+
+import numpy as np
+
+from .factorization import model_dir
+from .similar import FEATURE_FIELDS, FeatureEncoder, recommendable, recommendable_fingerprint
+
+MAX_CLUSTERS = 20
+REFRESH_SECONDS = 60
+
+# UserPreference combinations mapped per renter
+MAX_PREFERENCE_PROBES = 9
+
+
+def segments_path():
+    return model_dir() / 'segments.pickle'
+
+
+def _cluster_count(rows):
+    return max(1, min(MAX_CLUSTERS, round(math.sqrt(len(rows) / 2))))
+
+
+def _rank_key(row):
+    return (-row['popularity'], -float(row['rating']), row['id'])
+
+
+def _rankings(labels, keys, n_clusters):
+    rankings = {cluster: [] for cluster in range(n_clusters)}
+    for pk in sorted(labels, key=keys.get):
+        rankings[labels[pk]].append(pk)
+    return rankings
+
+
+def build_segments(n_clusters=None):
+    """Cluster the recommendable listings and publish the segments; returns the cluster count"""
+    from sklearn.cluster import KMeans
+
+    fingerprint = recommendable_fingerprint()
+    rows = list(recommendable().order_by('id').values('id', 'popularity', 'rating', *FEATURE_FIELDS))
+    if not rows:
+        segments = None
+    else:
+        n_clusters = min(n_clusters or _cluster_count(rows), len(rows))
+        encoder = FeatureEncoder().fit(rows)
+        vectors = np.array([encoder.encode(row) for row in rows])
+        kmeans = KMeans(n_clusters=n_clusters, n_init=10, random_state=0).fit(vectors)
+
+        labels = {row['id']: int(label) for row, label in zip(rows, kmeans.labels_)}
+        keys = {row['id']: _rank_key(row) for row in rows}
+        segments = {
+            'encoder': encoder,
+            'centroids': kmeans.cluster_centers_,
+            'labels': labels,
+            'keys': keys,
+            'rankings': _rankings(labels, keys, n_clusters),
+            'fingerprint': fingerprint,
+        }
+
+    # Publish atomically: readers see either the old segments or the new ones
+    path = segments_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    staged = path.with_suffix('.tmp')
+    staged.write_bytes(pickle.dumps(segments))
+    staged.replace(path)
+    return 0 if segments is None else n_clusters
+
+
+class SegmentIndex:
+    """Per-process copy of the published segments"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._segments = None
+        self._checked_at = 0.0
+
+    def _ensure_current(self):
+        path = segments_path()
+        try:
+            stat = path.stat()
+            version = (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            version = None
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._segments = pickle.loads(path.read_bytes()) if version else None
+                    self._version = version
+                    self._checked_at = time.monotonic()
+        elif self._segments is not None and time.monotonic() - self._checked_at >= REFRESH_SECONDS:
+            with self._lock:
+                if time.monotonic() - self._checked_at >= REFRESH_SECONDS:
+                    self._segments = self._refreshed(self._segments)
+                    self._checked_at = time.monotonic()
+
+    @staticmethod
+    def _refreshed(segments):
+        """``segments`` with listing changes since it was built or last refreshed folded in"""
+        fingerprint = recommendable_fingerprint()
+        if fingerprint == segments['fingerprint']:
+            return segments
+        since = segments['fingerprint'][1]
+        available = set(recommendable().values_list('id', flat=True))
+        changed = recommendable().values('id', 'popularity', 'rating', *FEATURE_FIELDS)
+        if since is not None:
+            changed = changed.filter(updated_at__gte=since)
+
+        labels = {pk: label for pk, label in segments['labels'].items() if pk in available}
+        keys = {pk: segments['keys'][pk] for pk in labels}
+        encoder, centroids = segments['encoder'], segments['centroids']
+        for row in changed:
+            distances = np.linalg.norm(centroids - encoder.encode(row), axis=1)
+            labels[row['id']] = int(np.argmin(distances))
+            keys[row['id']] = _rank_key(row)
+        return dict(
+            segments, labels=labels, keys=keys, fingerprint=fingerprint,
+            rankings=_rankings(labels, keys, len(centroids)),
+        )
+
+    def clusters_for_properties(self, property_ids):
+        """Segments of the given listings, in order, without duplicates"""
+        self._ensure_current()
+        segments = self._segments
+        if segments is None:
+            return []
+        clusters = (segments['labels'].get(pk) for pk in property_ids)
+        return list(dict.fromkeys(cluster for cluster in clusters if cluster is not None))
+
+    def clusters_for_preferences(self, preferences):
+        """Nearest segments to the listings a UserPreference describes"""
+        self._ensure_current()
+        segments = self._segments
+        if segments is None or preferences is None:
+            return []
+        described = (
+            preferences.preferred_cities or preferences.property_types or preferences.required_facilities
+            or preferences.min_price is not None or preferences.max_price is not None
+        )
+        if not described:
+            return []
+
+        prices = [float(price) for price in (preferences.min_price, preferences.max_price) if price is not None]
+        probes = itertools.product(
+            preferences.preferred_cities or [None], preferences.property_types or [None]
+        )
+        clusters = []
+        for city, property_type in itertools.islice(probes, MAX_PREFERENCE_PROBES):
+            row = dict.fromkeys(FEATURE_FIELDS)
+            row.update(
+                city=city,
+                property_type=property_type,
+                facilities=preferences.required_facilities,
+                rent_price=sum(prices) / len(prices) if prices else None,
+            )
+            distances = np.linalg.norm(segments['centroids'] - segments['encoder'].encode(row), axis=1)
+            clusters.append(int(np.argmin(distances)))
+        return list(dict.fromkeys(clusters))
+
+    def recommend_ids(self, clusters, limit, exclude=()):
+        """Interleave the ranked lists of ``clusters``, best first"""
+        segments = self._segments
+        if segments is None or not clusters:
+            return []
+        ranked = [
+            [pk for pk in segments['rankings'].get(cluster, ()) if pk not in exclude]
+            for cluster in clusters
+        ]
+        ids = []
+        for round_ids in itertools.zip_longest(*ranked):
+            ids.extend(pk for pk in round_ids if pk is not None and pk not in ids)
+            if len(ids) >= limit:
+                break
+        return ids[:limit]
+
+    def cold_start_ids(self, limit, preferences=None, property_ids=(), exclude=()):
+        """
+        Recommendations for a renter known only by their first interactions
+        and/or preferences; [] when neither maps to a segment or no segments
+        have been built.
+        """
+        clusters = self.clusters_for_properties(property_ids)
+        clusters += [c for c in self.clusters_for_preferences(preferences) if c not in clusters]
+        return self.recommend_ids(clusters, limit, exclude=exclude)
+
+
+segment_index = SegmentIndex()
@@ -1,9 +1,85 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from django.db.models import Prefetch, QuerySet, prefetch_related_objects
 import json
 from .models import Property, PropertyImage, PropertyDocument, Favorite, PropertyView, Report
 from users.serializers import UserSerializer
 
 
+def parse_fieldsets(request):
+    """Return the (fields, omit) name lists from ?fields= and ?omit="""
+    def names(param):
+        return [name.strip() for name in request.query_params.get(param, '').split(',') if name.strip()]
+    
+    if request is None or request.method not in SAFE_METHODS:
+        return [], []
+    return names('fields'), names('omit')
+
+
+def is_field_requested(request, name):
+    """
+    Whether field ``name`` (``parent.child`` for nested fields) survives the
+    request's sparse fieldset
+    """
+    fields, omit = parse_fieldsets(request)
+    parent, _, child = name.partition('.')
+    if parent in omit or name in omit:
+        return False
+    if not fields:
+        return True
+    if parent not in {field.split('.', 1)[0] for field in fields}:
+        return False
+    nested = [field.split('.', 1)[1] for field in fields if field.startswith(parent + '.')]
+    return not child or not nested or child in nested
+
+
+class SparseFieldsetsMixin:
+    """
+    Honour ?fields=a,b and ?omit=c on GET requests.
+    
+    Pruned fields are removed from the serializer before anything is
+    evaluated, so their sources, method fields and nested serializers never
+    run. Dotted names (``property.title``, ``omit=property.images``) are passed
+    on to nested serializers using this mixin, or left in nested_fieldsets
+    for hand-built nested dicts.
+    """
+    nested_fieldsets = {}
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields, omit = parse_fieldsets(self.context.get('request'))
+        if fields or omit:
+            self.prune_fields(fields, omit)
+    
+    def prune_fields(self, fields, omit):
+        nested = {}
+        for index, names in enumerate((fields, omit)):
+            for name in names:
+                if '.' in name:
+                    parent, child = name.split('.', 1)
+                    nested.setdefault(parent, ([], []))[index].append(child)
+        
+        if fields:
+            keep = {name.split('.', 1)[0] for name in fields}
+            for name in list(self.fields):
+                if name not in keep:
+                    self.fields.pop(name)
+        for name in omit:
+            if '.' not in name:
+                self.fields.pop(name, None)
+        
+        self.nested_fieldsets = nested
+        for name, (nested_fields, nested_omit) in nested.items():
+            field = self.fields.get(name)
+            field = getattr(field, 'child', field)
+            if isinstance(field, SparseFieldsetsMixin):
+                field.prune_fields(nested_fields, nested_omit)
+    
+    def is_nested_field_requested(self, parent, name):
+        fields, omit = self.nested_fieldsets.get(parent, ([], []))
+        return name not in omit and (not fields or name in fields)
+
+
 class PropertyImageSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         data = super().to_representation(instance)
@@ -39,13 +115,40 @@ class PropertyDocumentSerializer(serializers.ModelSerializer):
         fields = ['id', 'document', 'document_type', 'description', 'uploaded_at']
 
 
-class PropertyListSerializer(serializers.ModelSerializer):
+def with_list_relations(properties, request=None):
+    """
+    Load the owner and images PropertyListSerializer needs for a whole page
+    up front, so serializing N cards costs the same number of queries as 1.
+    Accepts a queryset (stays lazy) or an already evaluated list. Relations
+    behind fields pruned by the request's sparse fieldset are skipped.
+    """
+    load_owner = any(
+        is_field_requested(request, name) for name in ('owner_name', 'owner_verified', 'owner_phone')
+    )
+    load_images = is_field_requested(request, 'primary_image')
+    images = Prefetch('images', queryset=PropertyImage.objects.all(), to_attr='list_images')
+    
+    if isinstance(properties, QuerySet):
+        if load_owner:
+            properties = properties.select_related('owner')
+        if load_images:
+            properties = properties.prefetch_related(images)
+        return properties
+    
+    properties = list(properties)
+    lookups = (['owner'] if load_owner else []) + ([images] if load_images else [])
+    prefetch_related_objects(properties, *lookups)
+    return properties
+
+
+class PropertyListSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     """Serializer for property list view"""
     owner_name = serializers.CharField(source='owner.full_name', read_only=True)
     owner_verified = serializers.BooleanField(source='owner.is_verified', read_only=True)
     owner_phone = serializers.CharField(source='owner.phone', read_only=True)
     primary_image = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
+    distance_km = serializers.SerializerMethodField()
     
     class Meta:
         model = Property
@@ -53,24 +156,46 @@ class PropertyListSerializer(serializers.ModelSerializer):
             'id', 'title', 'property_type', 'address', 'city', 'area', 'rent_price', 'currency',
             'bedrooms', 'bathrooms', 'area_sqm', 'is_furnished', 'status',
             'verification_status', 'rating', 'view_count', 'primary_image',
-            'owner_name', 'owner_verified', 'owner_phone', 'is_favorited', 'created_at'
+            'owner_name', 'owner_verified', 'owner_phone', 'is_favorited', 'distance_km',
+            'created_at'
         ]
     
     def get_primary_image(self, obj):
-        primary = obj.images.filter(is_primary=True).first()
-        if primary:
-            return self.context['request'].build_absolute_uri(primary.image.url) if primary.image else None
-        first_image = obj.images.first()
-        return self.context['request'].build_absolute_uri(first_image.image.url) if first_image and first_image.image else None
+        # Prefer the list_images prefetch from with_list_relations(); fall back to
+        # the (possibly prefetched) images relation for callers that skipped it
+        images = getattr(obj, 'list_images', None)
+        if images is None:
+            images = list(obj.images.all())
+        if not images:
+            return None
+        
+        primary = next((img for img in images if img.is_primary), images[0])
+        return self.context['request'].build_absolute_uri(primary.image.url) if primary.image else None
     
     def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return Favorite.objects.filter(user=request.user, property=obj).exists()
-        return False
+        return obj.id in self._get_favorite_ids()
+    
+    def get_distance_km(self, obj):
+        # Only annotated by NearbyFilter for ?near= searches
+        distance = getattr(obj, 'distance_km', None)
+        return round(distance, 2) if distance is not None else None
+    
+    def _get_favorite_ids(self):
+        """Favorite property ids of the requesting user, fetched once per serialization"""
+        # self.context is the root serializer's dict, so every row of a
+        # many=True serialization shares this cached set
+        if '_favorite_ids' not in self.context:
+            request = self.context.get('request')
+            if request and request.user.is_authenticated:
+                self.context['_favorite_ids'] = set(
+                    Favorite.objects.filter(user=request.user).values_list('property_id', flat=True)
+                )
+            else:
+                self.context['_favorite_ids'] = set()
+        return self.context['_favorite_ids']
 
 
-class PropertyDetailSerializer(serializers.ModelSerializer):
+class PropertyDetailSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     """Serializer for property detail view"""
     owner = UserSerializer(read_only=True)
     images = PropertyImageSerializer(many=True, read_only=True)
@@ -96,6 +221,9 @@ class PropertyDetailSerializer(serializers.ModelSerializer):
         ]
     
     def get_is_favorited(self, obj):
+        # Set by the detail view, which already looked it up for the ETag
+        if '_is_favorited' in self.context:
+            return self.context['_is_favorited']
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return Favorite.objects.filter(user=request.user, property=obj).exists()
@@ -145,7 +273,7 @@ class PropertyCreateUpdateSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
+class FavoriteSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     property = serializers.SerializerMethodField()
     
     class Meta:
@@ -153,19 +281,20 @@ class FavoriteSerializer(serializers.ModelSerializer):
         fields = ['id', 'property', 'created_at']
     
     def get_property(self, obj):
-        """Get property with images"""
+        """Get property with images, limited to ?fields=property.x / ?omit=property.x"""
         property_obj = obj.property
         images = []
-        for img in property_obj.images.all():
-            images.append({
-                'id': img.id,
-                'image': self.context['request'].build_absolute_uri(img.image.url) if img.image else None,
-                'is_primary': getattr(img, 'is_primary', False),
-                'is_qr_code': getattr(img, 'is_qr_code', False),
-                'order': getattr(img, 'order', 0)
-            })
+        if self.is_nested_field_requested('property', 'images'):
+            for img in property_obj.images.all():
+                images.append({
+                    'id': img.id,
+                    'image': self.context['request'].build_absolute_uri(img.image.url) if img.image else None,
+                    'is_primary': getattr(img, 'is_primary', False),
+                    'is_qr_code': getattr(img, 'is_qr_code', False),
+                    'order': getattr(img, 'order', 0)
+                })
         
-        return {
+        data = {
             'id': property_obj.id,
             'title': property_obj.title,
             'property_type': property_obj.property_type,
@@ -188,6 +317,10 @@ class FavoriteSerializer(serializers.ModelSerializer):
             'images': images,
             'created_at': property_obj.created_at.isoformat(),
         }
+        return {
+            key: value for key, value in data.items()
+            if self.is_nested_field_requested('property', key)
+        }
 
 
 class ReportSerializer(serializers.ModelSerializer):
@@ -0,0 +1,137 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Property, PropertyImage, Favorite
+from .search import get_search_backend
+from .cache import bump_version
+from . import clusters
+from .similar import FEATURE_FIELDS
+from .interactions import IGNORED_BOOKING_STATUSES
+from .profiles import record_interaction
+from . import popularity
+
+
+@receiver(post_save, sender=Property)
+def index_property_for_search(sender, instance, **kwargs):
+    """Keep the in-process search index current when a property is saved"""
+    get_search_backend().index_property(instance)
+
+
+@receiver(post_delete, sender=Property)
+def remove_property_from_search(sender, instance, **kwargs):
+    """Drop a deleted property from the in-process search index"""
+    get_search_backend().remove_property(instance.pk)
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+@receiver(post_save, sender=PropertyImage)
+@receiver(post_delete, sender=PropertyImage)
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender='reviews.Review')
+@receiver(post_delete, sender='reviews.Review')
+def invalidate_listing_cache(sender, instance, **kwargs):
+    """Orphan cached listing data (facets, anonymous responses) built from older rows"""
+    bump_version('listing')
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def invalidate_location_index(sender, instance, update_fields=None, **kwargs):
+    """Make autocomplete rebuild when location names or visibility may have changed"""
+    if update_fields is None or set(update_fields) & {'city', 'district', 'area', 'verification_status'}:
+        bump_version('locations')
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def invalidate_similarity_index(sender, instance, update_fields=None, **kwargs):
+    """Make the similar-listings index rebuild when features or visibility may have changed"""
+    watched = set(FEATURE_FIELDS) | {'status', 'verification_status'}
+    if update_fields is None or set(update_fields) & watched:
+        bump_version('similarity')
+
+
+def _affects_clusters(update_fields):
+    return update_fields is None or bool(set(update_fields) & set(clusters.CLUSTER_FIELDS))
+
+
+@receiver(pre_save, sender=Property)
+def remember_cluster_state(sender, instance, update_fields=None, **kwargs):
+    """Capture the saved cluster state so post_save can move the property"""
+    if _affects_clusters(update_fields):
+        instance._cluster_state_before = clusters.stored_state(instance.pk) if instance.pk else None
+
+
+@receiver(post_save, sender=Property)
+def update_map_cells(sender, instance, update_fields=None, **kwargs):
+    """Incrementally maintain map cluster cells"""
+    if _affects_clusters(update_fields):
+        before = getattr(instance, '_cluster_state_before', None)
+        clusters.move_property(instance.pk, before, clusters.state_of(instance))
+
+
+@receiver(post_delete, sender=Property)
+def remove_from_map_cells(sender, instance, **kwargs):
+    """Drop a deleted property from the map cluster cells"""
+    clusters.move_property(instance.pk, clusters.state_of(instance), None)
+
+
+@receiver(post_save, sender=PropertyImage)
+@receiver(post_delete, sender=PropertyImage)
+def touch_property_on_image_change(sender, instance, **kwargs):
+    """Image changes count as listing changes for conditional GET validators"""
+    Property.objects.filter(pk=instance.property_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Favorite)
+def learn_from_favorite(sender, instance, created, **kwargs):
+    """Fold a new favorite into the renter's profile and the listing's popularity"""
+    if created:
+        record_interaction(instance.user_id, instance.property_id, 'favorite', instance.created_at)
+        popularity.record(instance.property_id, 'favorite', at=instance.created_at)
+
+
+@receiver(post_delete, sender=Favorite)
+def withdraw_favorite_popularity(sender, instance, **kwargs):
+    """An unfavorite takes back the boost the favorite added"""
+    popularity.record(instance.property_id, 'favorite', count=-1, at=instance.created_at)
+
+
+def _counts_for_popularity(status):
+    return status is not None and status not in IGNORED_BOOKING_STATUSES
+
+
+@receiver(pre_save, sender='bookings.Booking')
+def remember_booking_status(sender, instance, update_fields=None, **kwargs):
+    """Capture the saved status so post_save can see cancellations and rejections"""
+    if instance.pk and (update_fields is None or 'status' in update_fields):
+        instance._status_before = (
+            sender.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+        )
+
+
+@receiver(post_save, sender='bookings.Booking')
+def learn_from_booking(sender, instance, created, **kwargs):
+    """Fold a new booking request into the renter's profile and the listing's popularity"""
+    if created:
+        record_interaction(instance.renter_id, instance.property_id, 'booking', instance.created_at)
+        if _counts_for_popularity(instance.status):
+            popularity.record(instance.property_id, 'booking', at=instance.created_at)
+        return
+
+    if not hasattr(instance, '_status_before'):
+        return
+    before = _counts_for_popularity(instance._status_before)
+    after = _counts_for_popularity(instance.status)
+    del instance._status_before
+    if before != after:
+        popularity.record(instance.property_id, 'booking', count=1 if after else -1, at=instance.created_at)
+
+
+@receiver(post_delete, sender='bookings.Booking')
+def withdraw_booking_popularity(sender, instance, **kwargs):
+    """A deleted booking takes back its boost, unless cancellation already did"""
+    if _counts_for_popularity(instance.status):
+        popularity.record(instance.property_id, 'booking', count=-1, at=instance.created_at)
@@ -0,0 +1,208 @@
+"""
+Content-based "similar listings" over an in-memory BallTree.
+
+Every verified, available property is encoded as a feature vector:
+
+* log rent, bedrooms, bathrooms and log floor area, standardized
+* one-hot property type and city
+* multi-hot facilities
+* standardized latitude/longitude (imputed to the mean when missing)
+
+and indexed with scikit-learn ``NearestNeighbors(algorithm='ball_tree')``.
+A lookup is a single kNN query on the tree plus one ``in_bulk`` fetch.
+
+Each process builds the index lazily, with one query, and refreshes it when
+the ``similarity`` cache version moves (Property signals bump it only when a
+field used here, or visibility, changes) or, at most every
+``REFRESH_SECONDS``, when the count or latest ``updated_at`` of recommendable
+listings has moved. A refresh re-encodes only the listings updated since
+the last one, drops withdrawn ones and refits the tree; the encoder is
+refitted, by a full rebuild, only when a listing brings a property type or
+city it has never seen.
+"""
+import threading
+import time
+
+import numpy as np
+from django.db.models import Count, Max, Q
+
+from .cache import get_version
+from .models import Property
+
+# Property fields the feature vectors depend on
+FEATURE_FIELDS = [
+    'rent_price', 'bedrooms', 'bathrooms', 'area_sqm', 'property_type', 'city',
+    'facilities', 'latitude', 'longitude',
+]
+
+# Relative importance of each feature block in the distance
+TYPE_WEIGHT = 1.5
+CITY_WEIGHT = 1.0
+FACILITY_WEIGHT = 0.5
+LOCATION_WEIGHT = 1.0
+
+REFRESH_SECONDS = 300
+
+
+def _positions(values):
+    return {value: position for position, value in enumerate(sorted(set(values)))}
+
+
+def _one_hot(positions, values, weight):
+    vector = np.zeros(len(positions))
+    for value in values:
+        if value in positions:
+            vector[positions[value]] = weight
+    return vector
+
+
+class FeatureEncoder:
+    """Fits vocabularies and scaling on the indexed rows, then encodes any row"""
+
+    def fit(self, rows):
+        self.types = _positions(row['property_type'] for row in rows)
+        self.cities = _positions(row['city'] for row in rows)
+        self.facilities = _positions(f for row in rows for f in (row['facilities'] or []))
+        numeric = np.array([self._numeric(row) for row in rows], dtype=float)
+        # Columns missing on every row (e.g. no coordinates at all) centre on 0
+        present = (~np.isnan(numeric)).sum(axis=0)
+        self.numeric_mean = np.nansum(numeric, axis=0) / np.maximum(present, 1)
+        filled = np.where(np.isnan(numeric), self.numeric_mean, numeric)
+        std = filled.std(axis=0)
+        self.numeric_std = np.where(std > 0, std, 1.0)
+        return self
+
+    @staticmethod
+    def _numeric(row):
+        def value(name, log=False):
+            raw = row[name]
+            if raw is None:
+                return np.nan
+            return np.log1p(float(raw)) if log else float(raw)
+        return [
+            value('rent_price', log=True), value('bedrooms'), value('bathrooms'),
+            value('area_sqm', log=True), value('latitude'), value('longitude'),
+        ]
+
+    def encode(self, row):
+        numeric = np.array(self._numeric(row), dtype=float)
+        numeric = np.where(np.isnan(numeric), self.numeric_mean, numeric)
+        numeric = (numeric - self.numeric_mean) / self.numeric_std
+        numeric[4:] *= LOCATION_WEIGHT
+
+        type_vector = _one_hot(self.types, [row['property_type']], TYPE_WEIGHT)
+        city_vector = _one_hot(self.cities, [row['city']], CITY_WEIGHT)
+        facility_vector = _one_hot(self.facilities, row['facilities'] or [], FACILITY_WEIGHT)
+        return np.concatenate([numeric, type_vector, city_vector, facility_vector])
+
+    def knows(self, row):
+        """Whether ``row``'s type and city are in the fitted vocabularies"""
+        return row['property_type'] in self.types and row['city'] in self.cities
+
+
+def recommendable():
+    """Listings shown to renters: verified and available"""
+    return Property.objects.filter(verification_status='verified', status='available')
+
+
+def recommendable_fingerprint():
+    """(count, latest updated_at) of recommendable listings, to detect changes cheaply"""
+    return tuple(recommendable().aggregate(count=Count('id'), updated=Max('updated_at')).values())
+
+
+def _fit_tree(vectors):
+    from sklearn.neighbors import NearestNeighbors
+    return NearestNeighbors(algorithm='ball_tree').fit(vectors)
+
+
+class SimilarListingsIndex:
+    """kNN index over the feature vectors of recommendable properties"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        self._index = None  # (ids, encoder, model, vectors, positions, fingerprint), swapped atomically
+
+    def _build(self):
+        fingerprint = recommendable_fingerprint()
+        rows = list(recommendable().order_by('id').values('id', *FEATURE_FIELDS))
+        if not rows:
+            return None
+        encoder = FeatureEncoder().fit(rows)
+        vectors = np.array([encoder.encode(row) for row in rows])
+        ids = np.array([row['id'] for row in rows], dtype=np.int64)
+        return self._assemble(ids, encoder, vectors, fingerprint)
+
+    @staticmethod
+    def _assemble(ids, encoder, vectors, fingerprint):
+        positions = {int(pk): position for position, pk in enumerate(ids)}
+        return ids, encoder, _fit_tree(vectors), vectors, positions, fingerprint
+
+    def _refreshed(self, index):
+        """``index`` with listing changes since it was built or last refreshed folded in"""
+        if index is None:
+            return self._build()
+        ids, encoder, _, vectors, _, fingerprint = index
+        current = recommendable_fingerprint()
+        if current == fingerprint:
+            return index
+
+        # Updated listings, plus ones made available by writes that kept updated_at
+        available = set(recommendable().values_list('id', flat=True))
+        unseen = available.difference(int(pk) for pk in ids)
+        changed = list(
+            recommendable().filter(Q(updated_at__gte=fingerprint[1]) | Q(id__in=unseen))
+            .order_by('id').values('id', *FEATURE_FIELDS)
+        )
+        if not all(encoder.knows(row) for row in changed):
+            return self._build()
+        changed_ids = {row['id'] for row in changed}
+        keep = np.array([int(pk) in available and int(pk) not in changed_ids for pk in ids], dtype=bool)
+
+        ids = np.concatenate([ids[keep], np.array([row['id'] for row in changed], dtype=np.int64)])
+        if not len(ids):
+            return None
+        vectors = np.vstack([vectors[keep]] + [encoder.encode(row) for row in changed])
+        return self._assemble(ids, encoder, vectors, current)
+
+    def _ensure_current(self):
+        version = get_version('similarity')
+        stale = time.monotonic() - self._checked_at >= REFRESH_SECONDS
+        if version == self._version and not stale:
+            return
+        with self._lock:
+            if version != self._version or time.monotonic() - self._checked_at >= REFRESH_SECONDS:
+                self._index = self._refreshed(self._index)
+                self._version = version
+                self._checked_at = time.monotonic()
+
+    def similar_ids(self, property_id, limit=5):
+        """Ids of the ``limit`` nearest listings to ``property_id``, nearest first"""
+        self._ensure_current()
+        index = self._index
+        if index is None:
+            return []
+        ids, encoder, model, vectors, positions, _ = index
+
+        if property_id in positions:
+            vector = vectors[positions[property_id]]
+        else:
+            # Listings that are not recommendable themselves can still have neighbours
+            row = Property.objects.filter(pk=property_id).values('id', *FEATURE_FIELDS).first()
+            if row is None:
+                return []
+            vector = encoder.encode(row)
+
+        count = min(limit + 1, len(ids))
+        _, neighbors = model.kneighbors(vector.reshape(1, -1), n_neighbors=count)
+        return [int(ids[n]) for n in neighbors[0] if ids[n] != property_id][:limit]
+
+    def similar(self, property_id, limit=5):
+        """The similar listings themselves, in similarity order"""
+        similar_ids = self.similar_ids(property_id, limit)
+        properties = Property.objects.in_bulk(similar_ids)
+        return [properties[pk] for pk in similar_ids if pk in properties]
+
+
+similar_index = SimilarListingsIndex()
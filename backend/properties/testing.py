@@ -0,0 +1,74 @@
+"""
+Shared fixtures for the property and analytics test suites.
+"""
+import shutil
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from .models import Property
+from .view_tracking import view_buffer
+
+User = get_user_model()
+
+
+def create_property(owner, **kwargs):
+    """Create a verified, available property with sensible defaults"""
+    defaults = {
+        'title': 'Test Property',
+        'description': 'A test property',
+        'property_type': 'apartment',
+        'address': '123 Street',
+        'city': 'Phnom Penh',
+        'rent_price': Decimal('500.00'),
+        'status': 'available',
+        'verification_status': 'verified',
+    }
+    defaults.update(kwargs)
+    return Property.objects.create(owner=owner, **defaults)
+
+
+class PropertyAPITestCase(APITestCase):
+    """
+    Starts every test with an empty cache and view buffer, an ``owner`` and
+    a ``renter``, and provides helpers for listings and query counts.
+    """
+
+    def setUp(self):
+        cache.clear()
+        view_buffer.clear()
+        self.addCleanup(view_buffer.clear)
+        self.owner = User.objects.create_user(username='owner', password='pass', role='owner')
+        self.renter = User.objects.create_user(username='renter', password='pass', role='renter')
+
+    def create_properties(self, count, **kwargs):
+        """``count`` properties of the owner, titled "Property <i>" """
+        return [create_property(self.owner, title=f'Property {i}', **kwargs) for i in range(count)]
+
+    def create_renters(self, count):
+        return [
+            User.objects.create_user(username=f'renter{i}', password='pass', role='renter')
+            for i in range(count)
+        ]
+
+    def count_queries(self, url, params=None):
+        """(number of queries, response) of a successful GET"""
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def use_temp_model_dir(self):
+        """Point RECOMMENDER_MODEL_DIR at a directory removed after the test"""
+        model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, model_dir, True)
+        settings_override = override_settings(RECOMMENDER_MODEL_DIR=model_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        return model_dir
@@ -0,0 +1,1297 @@
+import multiprocessing
+import threading
+import warnings
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+import numpy as np
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from analytics.recommendation import get_popular_properties, get_user_search_based_properties
+from users.models import RenterProfile, UserPreference
+
+from .cache import (
+    STATS_FLUSH_EVERY, bump_version, get_cached_response, reset_response_cache_stats, response_cache_stats,
+)
+from .counters import reconcile_counters
+from .hyperloglog import HyperLogLog, unique_viewers
+from .factorization import factor_model, train_factors
+from .item_similarity import build_property_neighbors
+from .popularity import boost, current_epoch, current_score
+from .profiles import apply_event, price_range
+from .recommendations import PropertyRecommender
+from .rollups import rollup_views, prune_raw_views
+from .segments import build_segments, segment_index, segments_path
+from .similar import FEATURE_FIELDS, FeatureEncoder, similar_index
+from .testing import PropertyAPITestCase, create_property
+from .view_tracking import ViewBuffer, view_buffer
+from .models import (
+    Property, PropertyImage, Favorite, PropertyView, PropertyViewDaily, PropertyViewSketch,
+    PropertyNeighbor,
+)
+
+User = get_user_model()
+
+
+class PropertyListQueryCountTests(PropertyAPITestCase):
+    """The property list pipeline must not issue per-row queries"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(
+            username='admin', password='pass', role='admin', is_staff=True
+        )
+
+    def add_properties(self, count, **kwargs):
+        for i in range(count):
+            prop = create_property(self.owner, title=f'Property {i}', **kwargs)
+            PropertyImage.objects.create(property=prop, image=f'properties/{i}_a.jpg', order=0)
+            PropertyImage.objects.create(
+                property=prop, image=f'properties/{i}_b.jpg', order=1, is_primary=True
+            )
+            if i % 2 == 0:
+                Favorite.objects.create(user=self.renter, property=prop)
+
+    def assertConstantQueries(self, url, **kwargs):
+        self.add_properties(2, **kwargs)
+        small, _ = self.count_queries(url)
+        self.add_properties(10, **kwargs)
+        large, response = self.count_queries(url)
+        self.assertEqual(small, large, f'{url} issues per-row queries ({small} -> {large})')
+        return large, response
+
+    def test_anonymous_list(self):
+        queries, response = self.assertConstantQueries('/api/properties/')
+        # validator aggregate + count + page + images
+        self.assertLessEqual(queries, 4)
+        self.assertEqual(len(response.data['results']), 12)
+
+    def test_authenticated_list(self):
+        self.client.force_authenticate(self.renter)
+        queries, response = self.assertConstantQueries('/api/properties/')
+        # favorite ids + validator aggregate + count + page + images
+        self.assertLessEqual(queries, 5)
+        favorited = [item['is_favorited'] for item in response.data['results']]
+        self.assertIn(True, favorited)
+        self.assertIn(False, favorited)
+
+    def test_my_properties(self):
+        self.client.force_authenticate(self.owner)
+        self.assertConstantQueries('/api/properties/my_properties/')
+
+    def test_pending_verifications(self):
+        self.client.force_authenticate(self.admin)
+        self.assertConstantQueries(
+            '/api/properties/pending_verifications/', verification_status='pending'
+        )
+
+    def test_recommended(self):
+        self.client.force_authenticate(self.renter)
+        self.assertConstantQueries('/api/properties/recommended/')
+
+    def test_primary_image_prefers_is_primary(self):
+        self.add_properties(1)
+        response = self.client.get('/api/properties/')
+        self.assertTrue(response.data['results'][0]['primary_image'].endswith('0_b.jpg'))
+
+
+class InvertedIndexSearchTests(PropertyAPITestCase):
+    """Keyword search through the pure-Python fallback backend"""
+
+    def setUp(self):
+        super().setUp()
+        from .search import get_search_backend
+        self.backend = get_search_backend()
+        self.backend.reset()
+        self.title_match = create_property(self.owner, title='Riverside studio', description='Quiet')
+        self.description_match = create_property(
+            self.owner, title='Modern flat', description='Near the riverside market'
+        )
+        self.other = create_property(self.owner, title='Garden house', city='Siem Reap')
+
+    def search(self, term, **params):
+        response = self.client.get('/api/properties/', {'search': term, **params})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_ranks_title_above_description(self):
+        self.assertEqual(self.search('riverside'), [self.title_match.id, self.description_match.id])
+
+    def test_prefix_and_all_terms_required(self):
+        self.assertEqual(self.search('river mark'), [self.description_match.id])
+        self.assertEqual(self.search('siem'), [self.other.id])
+        self.assertEqual(self.search('nowhere'), [])
+
+    def test_explicit_ordering_overrides_relevance(self):
+        ids = self.search('riverside', ordering='created_at')
+        self.assertEqual(ids, [self.title_match.id, self.description_match.id])
+        ids = self.search('riverside', ordering='-created_at')
+        self.assertEqual(ids, [self.description_match.id, self.title_match.id])
+
+    def test_index_follows_save_and_delete(self):
+        self.search('riverside')  # build the index
+        self.other.title = 'Riverside garden house'
+        self.other.save()
+        self.assertIn(self.other.id, self.search('riverside'))
+
+        self.title_match.delete()
+        self.assertNotIn(self.title_match.id, self.search('riverside'))
+        # Maintained incrementally, never re-sorted
+        self.assertEqual(self.backend._vocabulary, sorted(self.backend._postings))
+        self.assertNotIn('studio', self.backend._vocabulary)
+
+    def test_catches_up_with_other_processes(self):
+        from .search import InvertedIndexBackend
+        # Signals only reach the global backend, as in the process that saved
+        other_process = InvertedIndexBackend()
+        riverside = lambda: set(other_process.rank(['riverside']))
+        self.assertEqual(riverside(), {self.title_match.id, self.description_match.id})
+
+        self.other.title = 'Riverside garden house'
+        self.other.save()
+        self.title_match.delete()
+        self.assertEqual(riverside(), {self.description_match.id, self.other.id})
+
+        # Writes that bypass the signals are caught on the periodic check
+        Property.objects.filter(pk=self.other.pk).update(title='Garden house', updated_at=timezone.now())
+        self.assertIn(self.other.id, riverside())
+        other_process._checked_at -= other_process.REFRESH_SECONDS
+        self.assertEqual(riverside(), {self.description_match.id})
+        self.assertEqual(other_process._vocabulary, sorted(other_process._postings))
+
+    def test_matches_are_capped(self):
+        self.backend.MAX_MATCHES = 1
+        self.addCleanup(delattr, self.backend, 'MAX_MATCHES')
+        self.assertEqual(self.search('riverside'), [self.title_match.id])
+        # The cap applies after the other filters
+        Property.objects.filter(pk=self.title_match.pk).update(rent_price=Decimal('9999'))
+        self.assertEqual(self.search('riverside', max_price=5000), [self.description_match.id])
+
+    def test_mysql_drops_terms_the_fulltext_index_cannot_match(self):
+        from .search import MySQLFullTextBackend
+        backend = MySQLFullTextBackend()
+        backend._min_token_size = 3
+        self.assertTrue(backend.indexed('bkk'))
+        self.assertFalse(backend.indexed('a1'))
+        self.assertFalse(backend.indexed('The'))
+        # Nothing indexable left: substring matching instead of MATCH ... AGAINST
+        results = backend.search(Property.objects.all(), ['ga'])
+        self.assertEqual([prop.id for prop in results], [self.other.id])
+
+
+class CursorPaginationTests(PropertyAPITestCase):
+    """Opt-in keyset pagination on the property list"""
+
+    def setUp(self):
+        super().setUp()
+        # Duplicate prices force the id tie-breaker to do its job
+        self.properties = [
+            create_property(self.owner, title=f'Property {i}', rent_price=Decimal(100 + (i % 5) * 50))
+            for i in range(30)
+        ]
+
+    def walk(self, params):
+        ids, url, pages = [], '/api/properties/', 0
+        response = self.client.get(url, {'pagination': 'cursor', **params})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids.extend(item['id'] for item in response.data['results'])
+            pages += 1
+            if not response.data['next']:
+                return ids, pages
+            response = self.client.get(response.data['next'])
+
+    def test_walks_every_row_once_in_order(self):
+        ids, pages = self.walk({'ordering': '-rent_price'})
+        self.assertEqual(pages, 3)
+        expected = sorted(self.properties, key=lambda p: (p.rent_price, p.id), reverse=True)
+        self.assertEqual(ids, [p.id for p in expected])
+
+    def test_default_ordering_is_newest_first(self):
+        ids, _ = self.walk({})
+        expected = sorted(self.properties, key=lambda p: (p.created_at, p.id), reverse=True)
+        self.assertEqual(ids, [p.id for p in expected])
+
+    def test_page_fetch_skips_count_query(self):
+        response = self.client.get('/api/properties/', {'pagination': 'cursor'})
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(response.data['next'])
+        self.assertFalse(any('COUNT(' in q['sql'].upper() for q in ctx.captured_queries))
+
+    def test_cursor_bound_to_ordering(self):
+        response = self.client.get('/api/properties/', {'pagination': 'cursor', 'ordering': 'rating'})
+        cursor = response.data['next'].split('cursor=')[1].split('&')[0]
+        response = self.client.get('/api/properties/', {'cursor': cursor, 'ordering': 'view_count'})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get('/api/properties/', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_number_pagination_is_default(self):
+        response = self.client.get('/api/properties/')
+        self.assertEqual(response.data['count'], 30)
+
+
+class FacetTests(PropertyAPITestCase):
+    """Facet counts endpoint"""
+
+    def setUp(self):
+        super().setUp()
+        create_property(self.owner, city='Phnom Penh', bedrooms=1, rent_price=Decimal('150'),
+                        is_furnished=True)
+        create_property(self.owner, city='Phnom Penh', bedrooms=2, rent_price=Decimal('450'),
+                        pets_allowed=True, property_type='house')
+        create_property(self.owner, city='Siem Reap', bedrooms=2, rent_price=Decimal('1200'),
+                        title='Riverside villa')
+        create_property(self.owner, city='Kampot', verification_status='pending')
+
+    def test_counts(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/properties/facets/')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(ctx.captured_queries), 4)
+        data = response.data
+        self.assertEqual(data['total'], 3)
+        self.assertEqual(data['city'][0], {'value': 'Phnom Penh', 'count': 2})
+        self.assertEqual({row['value']: row['count'] for row in data['bedrooms']}, {1: 1, 2: 2})
+        self.assertEqual(data['is_furnished'], {'true': 1, 'false': 2})
+        self.assertEqual(data['pets_allowed'], {'true': 1, 'false': 2})
+        self.assertEqual([b['count'] for b in data['price']], [1, 0, 1, 0, 1])
+
+    def test_accepts_list_filters_and_search(self):
+        response = self.client.get('/api/properties/facets/', {'city': 'phnom penh', 'min_bedrooms': 2})
+        self.assertEqual(response.data['total'], 1)
+        response = self.client.get('/api/properties/facets/', {'search': 'riverside'})
+        self.assertEqual(response.data['city'], [{'value': 'Siem Reap', 'count': 1}])
+
+    def test_anonymous_results_cached_until_properties_change(self):
+        self.client.get('/api/properties/facets/', {'city': 'Siem Reap'})
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/properties/facets/', {'city': 'Siem Reap'})
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        create_property(self.owner, city='Siem Reap')
+        response = self.client.get('/api/properties/facets/', {'city': 'Siem Reap'})
+        self.assertEqual(response.data['total'], 2)
+
+
+class NearbySearchTests(PropertyAPITestCase):
+    """?near=lat,lng&radius_km= radius search"""
+
+    # Independence Monument, Phnom Penh
+    CENTER = (11.5564, 104.9282)
+
+    def setUp(self):
+        super().setUp()
+        self.close = create_property(self.owner, title='Close', latitude=Decimal('11.560000'),
+                                     longitude=Decimal('104.930000'))
+        self.medium = create_property(self.owner, title='Medium', latitude=Decimal('11.580000'),
+                                      longitude=Decimal('104.900000'))
+        self.far = create_property(self.owner, title='Siem Reap', latitude=Decimal('13.361800'),
+                                   longitude=Decimal('103.860500'))
+        self.unlocated = create_property(self.owner, title='No coordinates')
+
+    def near(self, **params):
+        return self.client.get('/api/properties/', {'near': '%s,%s' % self.CENTER, **params})
+
+    def test_geohash_maintained_on_save(self):
+        from .geohash import encode_geohash
+        self.assertEqual(self.close.geohash, encode_geohash(11.56, 104.93))
+        self.assertEqual(self.unlocated.geohash, '')
+        self.far.latitude, self.far.longitude = Decimal('11.5'), Decimal('104.9')
+        self.far.save(update_fields=['latitude', 'longitude'])
+        self.far.refresh_from_db()
+        self.assertEqual(self.far.geohash, encode_geohash(11.5, 104.9))
+
+    def test_radius_filters_and_sorts_by_distance(self):
+        response = self.near(radius_km=10)
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([r['id'] for r in results], [self.close.id, self.medium.id])
+        self.assertLess(results[0]['distance_km'], 1)
+        self.assertLess(results[1]['distance_km'], 5)
+
+        response = self.near(radius_km=1)
+        self.assertEqual([r['id'] for r in response.data['results']], [self.close.id])
+
+    def test_explicit_ordering_wins(self):
+        response = self.near(radius_km=10, ordering='-created_at')
+        self.assertEqual([r['id'] for r in response.data['results']], [self.medium.id, self.close.id])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/properties/', {'near': 'abc'}).status_code, 400)
+        self.assertEqual(self.near(radius_km=500).status_code, 400)
+
+    def test_distance_matches_known_distance(self):
+        from .geo import distance_expression
+        # Phnom Penh to Siem Reap is roughly 230 km as the crow flies
+        distance = Property.objects.annotate(d=distance_expression(*self.CENTER)).get(pk=self.far.pk).d
+        self.assertAlmostEqual(distance, 231, delta=5)
+
+    def test_covering_cells_cover_bbox_corners(self):
+        from .geo import bounding_box, covering_cells
+        from .geohash import encode_geohash
+        bbox = bounding_box(*self.CENTER, 3)
+        cells = covering_cells(bbox)
+        self.assertLessEqual(len(cells), 9)
+        for lat in bbox[:2]:
+            for lng in bbox[2:]:
+                self.assertTrue(any(encode_geohash(lat, lng).startswith(c) for c in cells))
+
+
+class MapClusterTests(PropertyAPITestCase):
+    """Precomputed map cluster cells and the map-clusters endpoint"""
+
+    BBOX = '104.80,11.45,105.05,11.65'  # Phnom Penh
+
+    def setUp(self):
+        super().setUp()
+        self.a = create_property(self.owner, latitude=Decimal('11.560000'), longitude=Decimal('104.920000'),
+                                 rent_price=Decimal('300'))
+        self.b = create_property(self.owner, latitude=Decimal('11.561000'), longitude=Decimal('104.921000'),
+                                 rent_price=Decimal('500'))
+        self.c = create_property(self.owner, latitude=Decimal('11.600000'), longitude=Decimal('104.990000'),
+                                 rent_price=Decimal('800'))
+
+    def clusters(self, zoom, bbox=None):
+        response = self.client.get('/api/properties/map-clusters/', {'bbox': bbox or self.BBOX, 'zoom': zoom})
+        self.assertEqual(response.status_code, 200)
+        return response.data['clusters']
+
+    def assertMatchesRebuild(self):
+        from .clusters import rebuild_map_cells
+        from .models import PropertyMapCell
+        fields = ('zoom', 'cell_x', 'cell_y', 'count')
+        incremental = sorted(PropertyMapCell.objects.values_list(*fields))
+        rebuild_map_cells()
+        self.assertEqual(incremental, sorted(PropertyMapCell.objects.values_list(*fields)))
+
+    def test_low_zoom_merges_and_high_zoom_splits(self):
+        clusters = self.clusters(5)
+        self.assertEqual(len(clusters), 1)
+        self.assertEqual(clusters[0]['count'], 3)
+        self.assertAlmostEqual(clusters[0]['avg_rent'], 1600 / 3)
+
+        clusters = sorted(self.clusters(12), key=lambda c: c['count'])
+        self.assertEqual([c['count'] for c in clusters], [1, 2])
+        self.assertEqual(sorted(clusters[1]['property_ids']), sorted([self.a.id, self.b.id]))
+        self.assertEqual(clusters[1]['avg_rent'], 400)
+
+    def test_cells_follow_coordinate_and_status_changes(self):
+        self.c.latitude, self.c.longitude = Decimal('13.361800'), Decimal('103.860500')
+        self.c.save()
+        self.assertEqual(sum(c['count'] for c in self.clusters(10)), 2)
+
+        self.a.status = 'rented'
+        self.a.save()
+        self.assertEqual(sum(c['count'] for c in self.clusters(10)), 1)
+
+        self.b.delete()
+        self.assertEqual(self.clusters(10), [])
+        self.assertMatchesRebuild()
+
+    def test_unrelated_saves_skip_cluster_work(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.a.view_count = 10
+            self.a.save(update_fields=['view_count'])
+        self.assertFalse(any('propertymapcell' in q['sql'] for q in ctx.captured_queries))
+        self.assertMatchesRebuild()
+
+    def test_invalid_bbox(self):
+        response = self.client.get('/api/properties/map-clusters/', {'bbox': '1,2,3'})
+        self.assertEqual(response.status_code, 400)
+        for bbox in ['nan,11.45,105.05,11.65', '104.80,-inf,105.05,inf']:
+            response = self.client.get('/api/properties/map-clusters/', {'bbox': bbox})
+            self.assertEqual(response.status_code, 400)
+
+    def test_zoom_is_clamped(self):
+        response = self.client.get('/api/properties/map-clusters/', {'bbox': self.BBOX, 'zoom': 99})
+        self.assertEqual(response.data['zoom'], 16)
+        self.assertEqual(sum(c['count'] for c in response.data['clusters']), 3)
+
+
+class LocationAutocompleteTests(PropertyAPITestCase):
+    """In-memory location autocomplete"""
+
+    def setUp(self):
+        super().setUp()
+        create_property(self.owner, city='Phnom Penh', district='Chamkar Mon', area='BKK1')
+        create_property(self.owner, city='Phnom Penh', district='Daun Penh', area='Riverside')
+        create_property(self.owner, city='Siem Reap', district='Svay Dangkum')
+        create_property(self.owner, city='Pursat', verification_status='pending')
+
+    def suggest(self, q, **params):
+        response = self.client.get('/api/properties/autocomplete/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(s['type'], s['name'], s['count']) for s in response.data]
+
+    def test_prefix_matches_any_word_weighted_by_listings(self):
+        self.assertEqual(self.suggest('p'), [('city', 'Phnom Penh', 2), ('district', 'Daun Penh', 1)])
+        self.assertEqual(self.suggest('PENH'), [('city', 'Phnom Penh', 2), ('district', 'Daun Penh', 1)])
+        self.assertEqual(self.suggest('reap'), [('city', 'Siem Reap', 1)])
+        self.assertEqual(self.suggest('bk'), [('area', 'BKK1', 1)])
+        self.assertEqual(self.suggest('p', limit=1), [('city', 'Phnom Penh', 2)])
+        self.assertEqual(self.suggest('p', limit=-1), [('city', 'Phnom Penh', 2)])
+
+    def test_no_queries_per_keystroke_until_properties_change(self):
+        self.suggest('ph')
+        with CaptureQueriesContext(connection) as ctx:
+            for q in ['s', 'si', 'sie', 'siem']:
+                self.suggest(q)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        create_property(self.owner, city='Sihanoukville')
+        self.assertIn(('city', 'Sihanoukville', 1), self.suggest('si'))
+
+    def test_metric_saves_keep_index(self):
+        from .autocomplete import location_index
+        self.suggest('ph')
+        version = location_index._version
+        prop = Property.objects.first()
+        prop.view_count = 5
+        prop.save(update_fields=['view_count'])
+        self.suggest('ph')
+        self.assertEqual(location_index._version, version)
+
+    def test_writes_bypassing_signals_are_picked_up(self):
+        from .autocomplete import location_index
+        self.suggest('pur')
+        Property.objects.filter(city='Pursat').update(verification_status='verified', updated_at=timezone.now())
+        self.assertEqual(self.suggest('pur'), [])
+        location_index._checked_at = 0.0
+        self.assertEqual(self.suggest('pur'), [('city', 'Pursat', 1)])
+
+
+class SparseFieldsetTests(PropertyAPITestCase):
+    """?fields= / ?omit= on property, favorite and booking endpoints"""
+
+    def setUp(self):
+        super().setUp()
+        for i in range(3):
+            prop = create_property(self.owner, title=f'Property {i}')
+            PropertyImage.objects.create(property=prop, image=f'properties/{i}.jpg', is_primary=True)
+            Favorite.objects.create(user=self.renter, property=prop)
+        self.client.force_authenticate(self.renter)
+
+    def test_fields_prunes_list_and_skips_queries(self):
+        full, response = self.count_queries('/api/properties/')
+        sparse, response = self.count_queries('/api/properties/', {'fields': 'id,title,rent_price'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title', 'rent_price'})
+        # No image prefetch and no favorite lookup
+        self.assertEqual(sparse, full - 2)
+
+    def test_omit(self):
+        _, response = self.count_queries('/api/properties/', {'omit': 'owner_phone,primary_image'})
+        item = response.data['results'][0]
+        self.assertNotIn('owner_phone', item)
+        self.assertNotIn('primary_image', item)
+        self.assertIn('owner_name', item)
+
+    def test_detail(self):
+        prop = Property.objects.first()
+        _, response = self.count_queries(f'/api/properties/{prop.id}/', {'fields': 'id,title'})
+        self.assertEqual(set(response.data), {'id', 'title'})
+
+    def test_favorites_nested_fields(self):
+        with_images, response = self.count_queries('/api/properties/favorites/')
+        self.assertEqual(len(response.data['results'][0]['property']['images']), 1)
+
+        without_images, response = self.count_queries(
+            '/api/properties/favorites/', {'fields': 'id,property.id,property.title'}
+        )
+        item = response.data['results'][0]
+        self.assertEqual(set(item), {'id', 'property'})
+        self.assertEqual(set(item['property']), {'id', 'title'})
+        self.assertLess(without_images, with_images)
+
+    def test_bookings(self):
+        from datetime import date
+        from bookings.models import Booking
+        for prop in Property.objects.all():
+            Booking.objects.create(property=prop, renter=self.renter, booking_type='visit',
+                                   start_date=date.today())
+        full, response = self.count_queries('/api/bookings/')
+        self.assertIn('property_details', response.data['results'][0])
+
+        sparse, response = self.count_queries('/api/bookings/', {'fields': 'id,status,property_details.title'})
+        item = response.data['results'][0]
+        self.assertEqual(set(item), {'id', 'status', 'property_details'})
+        self.assertEqual(set(item['property_details']), {'title'})
+        self.assertLess(sparse, full)
+
+    def test_writes_ignore_fieldsets(self):
+        self.client.force_authenticate(self.owner)
+        response = self.client.post('/api/properties/?fields=id', {
+            'title': 'New', 'description': 'New', 'property_type': 'room', 'address': 'A',
+            'city': 'Kampot', 'rent_price': '100.00',
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('title', response.data)
+
+
+class BatchFetchTests(PropertyAPITestCase):
+    """/api/properties/batch/?ids="""
+
+    def setUp(self):
+        super().setUp()
+        self.props = self.create_properties(5)
+        self.hidden = create_property(self.owner, verification_status='pending')
+
+    def batch(self, ids):
+        return self.client.get('/api/properties/batch/', {'ids': ','.join(str(i) for i in ids)})
+
+    def test_requested_order_and_visibility(self):
+        wanted = [self.props[3].id, self.hidden.id, self.props[0].id, 999999, self.props[3].id]
+        response = self.batch(wanted)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data], [self.props[3].id, self.props[0].id])
+
+        # Owners see unverified listings, as in list
+        self.client.force_authenticate(self.owner)
+        response = self.batch([self.hidden.id])
+        self.assertEqual([item['id'] for item in response.data], [self.hidden.id])
+
+    def test_constant_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.batch([self.props[0].id])
+        one = len(ctx.captured_queries)
+        with CaptureQueriesContext(connection) as ctx:
+            self.batch([p.id for p in self.props])
+        self.assertEqual(len(ctx.captured_queries), one)
+
+    def test_validation(self):
+        self.assertEqual(self.client.get('/api/properties/batch/', {'ids': '1,x'}).status_code, 400)
+        self.assertEqual(self.batch(range(1, 102)).status_code, 400)
+        self.assertEqual(self.batch([]).data, [])
+
+
+class ConditionalGetTests(PropertyAPITestCase):
+    """ETag / Last-Modified revalidation of property list and detail"""
+
+    def setUp(self):
+        super().setUp()
+        self.prop = create_property(self.owner)
+        self.detail_url = f'/api/properties/{self.prop.id}/'
+
+    def revalidate(self, url, etag, **params):
+        return self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+
+    def test_detail_not_modified_until_property_changes(self):
+        first = self.client.get(self.detail_url)
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+        self.assertTrue(first.has_header('Last-Modified'))
+
+        response = self.revalidate(self.detail_url, etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        PropertyImage.objects.create(property=self.prop, image='properties/new.jpg')
+        self.assertEqual(self.revalidate(self.detail_url, etag).status_code, 200)
+
+    def test_detail_varies_by_user_favorite(self):
+        self.client.force_authenticate(self.renter)
+        etag = self.client.get(self.detail_url)['ETag']
+        Favorite.objects.create(user=self.renter, property=self.prop)
+        self.assertEqual(self.revalidate(self.detail_url, etag).status_code, 200)
+
+    def test_detail_reads_documents_and_favorite_once(self):
+        self.client.force_authenticate(self.renter)
+        Favorite.objects.create(user=self.renter, property=self.prop)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.detail_url)
+        self.assertTrue(response.data['is_favorited'])
+        sql = [q['sql'] for q in ctx.captured_queries]
+        self.assertEqual(sum('FROM "properties_propertydocument"' in q for q in sql), 1)
+        self.assertEqual(sum('FROM "properties_favorite"' in q for q in sql), 1)
+
+    def test_list_not_modified_skips_serialization(self):
+        etag = self.client.get('/api/properties/')['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.revalidate('/api/properties/', etag)
+        self.assertEqual(response.status_code, 304)
+        # Only the fingerprint aggregate, or nothing when the response cache answers
+        self.assertLessEqual(len(ctx.captured_queries), 1)
+
+        # Different filters are different representations
+        self.assertEqual(self.revalidate('/api/properties/', etag, city='Kampot').status_code, 200)
+
+        self.prop.rent_price = Decimal('450.00')
+        self.prop.save()
+        self.assertEqual(self.revalidate('/api/properties/', etag).status_code, 200)
+
+    def test_list_etag_sees_removals_and_favorites(self):
+        other = create_property(self.owner, title='Other')
+        # Signed in, so the anonymous response cache stays out of the way
+        self.client.force_authenticate(self.renter)
+        first = self.client.get('/api/properties/')
+        self.assertFalse(first.has_header('Last-Modified'))
+
+        Favorite.objects.create(user=self.owner, property=other)
+        Property.objects.filter(pk=other.pk).update(favorite_count=1)
+        etag = self.client.get('/api/properties/')['ETag']
+        self.assertNotEqual(etag, first['ETag'])
+
+        Property.objects.filter(pk=other.pk).update(verification_status='pending')
+        self.assertEqual(self.revalidate('/api/properties/', etag).status_code, 200)
+
+
+class AnonymousResponseCacheTests(PropertyAPITestCase):
+    """Versioned response cache for anonymous list/detail requests"""
+
+    def setUp(self):
+        super().setUp()
+        reset_response_cache_stats()
+        self.prop = create_property(self.owner)
+        self.detail_url = f'/api/properties/{self.prop.id}/'
+
+    def assertServedFromCache(self, url):
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        return response
+
+    def test_list_hit_and_invalidation(self):
+        self.assertServedFromCache('/api/properties/')
+        self.assertEqual(response_cache_stats()['hits'], 1)
+
+        PropertyImage.objects.create(property=self.prop, image='properties/new.jpg')
+        response = self.client.get('/api/properties/')
+        self.assertTrue(response.data['results'][0]['primary_image'].endswith('new.jpg'))
+
+    def test_query_params_are_normalized(self):
+        self.client.get('/api/properties/', {'city': 'Phnom Penh', 'bedrooms': ''})
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/properties/', {'city': 'Phnom Penh'})
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_detail_hit_still_tracks_views(self):
+        self.client.get(self.detail_url)
+        self.client.get(self.detail_url)
+        view_buffer.flush()
+        self.prop.refresh_from_db()
+        self.assertEqual(self.prop.view_count, 2)
+        self.assertEqual(PropertyView.objects.filter(property=self.prop).count(), 2)
+        self.assertEqual(response_cache_stats()['hits'], 1)
+
+    def test_favorite_invalidates(self):
+        self.client.get(self.detail_url)
+        self.client.force_authenticate(self.renter)
+        self.client.post(f'{self.detail_url}toggle_favorite/')
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.detail_url).data['favorite_count'], 1)
+
+    def test_authenticated_requests_bypass_cache(self):
+        self.client.force_authenticate(self.owner)
+        self.client.get('/api/properties/')
+        self.client.get('/api/properties/')
+        self.assertEqual(response_cache_stats()['hits'], 0)
+
+    def test_lookups_are_counted_in_batches(self):
+        with mock.patch('properties.cache._add') as add:
+            for _ in range(STATS_FLUSH_EVERY - 1):
+                get_cached_response('properties:missing')
+            add.assert_not_called()
+            get_cached_response('properties:missing')
+            add.assert_called_once_with('properties:response_cache_misses', STATS_FLUSH_EVERY)
+
+    def test_stats_endpoint_is_admin_only(self):
+        self.client.force_authenticate(self.owner)
+        self.assertEqual(self.client.get('/api/properties/cache-stats/').status_code, 403)
+
+        admin = User.objects.create_user(username='admin', password='pass', role='admin', is_staff=True)
+        self.client.force_authenticate(admin)
+        response = self.client.get('/api/properties/cache-stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data), {'hits', 'misses', 'hit_ratio'})
+
+
+@override_settings(PROPERTY_VIEW_BUFFER_SIZE=3, PROPERTY_VIEW_FLUSH_INTERVAL=3600)
+class ViewTrackingTests(PropertyAPITestCase):
+    """Detail views are buffered and written in bulk"""
+
+    def setUp(self):
+        super().setUp()
+        self.props = self.create_properties(2)
+
+    def test_views_are_buffered_until_flush(self):
+        self.client.force_authenticate(self.renter)
+        self.client.get(f'/api/properties/{self.props[0].id}/')
+        self.client.get(f'/api/properties/{self.props[1].id}/')
+        self.assertEqual(PropertyView.objects.count(), 0)
+        self.assertEqual(len(view_buffer), 2)
+
+        self.assertEqual(view_buffer.flush(), 2)
+        self.props[0].refresh_from_db()
+        self.assertEqual(self.props[0].view_count, 1)
+        self.assertEqual(PropertyView.objects.get(property=self.props[0]).user, self.renter)
+
+    def test_flush_issues_one_update_per_property(self):
+        for _ in range(3):
+            view_buffer.record(self.props[0].id)
+        with CaptureQueriesContext(connection) as ctx:
+            view_buffer.flush()
+        self.assertEqual(len(view_buffer), 0)
+        updates = [
+            q for q in ctx.captured_queries
+            if q['sql'].startswith('UPDATE') and '"view_count"' in q['sql']
+        ]
+        self.assertEqual(len(updates), 1)
+        self.props[0].refresh_from_db()
+        self.assertEqual(self.props[0].view_count, 3)
+        self.assertEqual(PropertyView.objects.count(), 3)
+
+    def test_record_never_writes(self):
+        with CaptureQueriesContext(connection) as ctx:
+            for _ in range(5):
+                view_buffer.record(self.props[0].id)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(len(view_buffer), 5)
+
+    def test_views_of_deleted_properties_are_dropped(self):
+        view_buffer.record(self.props[0].id)
+        view_buffer.record(self.props[1].id)
+        self.props[1].delete()
+        self.assertEqual(view_buffer.flush(), 1)
+
+    def flusher(self):
+        """A fresh buffer whose flusher thread signals each flush instead of writing"""
+        buffer, flushed = ViewBuffer(), threading.Event()
+        self.addCleanup(buffer.stop, timeout=1)
+        patcher = mock.patch.object(buffer, 'flush', side_effect=lambda: flushed.set() or buffer.clear())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return buffer, flushed
+
+    @override_settings(PROPERTY_VIEW_FLUSH_THREAD=True)
+    def test_full_buffer_wakes_the_flusher(self):
+        buffer, flushed = self.flusher()
+        for _ in range(3):
+            buffer.record(self.props[0].id)
+        self.assertTrue(flushed.wait(5))
+
+    @override_settings(PROPERTY_VIEW_FLUSH_THREAD=True, PROPERTY_VIEW_FLUSH_INTERVAL=0.05)
+    def test_idle_worker_flushes_on_interval(self):
+        buffer, flushed = self.flusher()
+        buffer.record(self.props[0].id)
+        self.assertTrue(flushed.wait(5))
+
+
+
+class UniqueViewerSketchTests(PropertyAPITestCase):
+    """HyperLogLog unique-viewer sketches per property and day"""
+
+    def setUp(self):
+        super().setUp()
+        self.props = self.create_properties(2)
+
+    def test_estimate_merge_and_size(self):
+        first, second = HyperLogLog(), HyperLogLog()
+        for i in range(20000):
+            first.add(f'visitor-{i}')
+        for i in range(10000, 30000):
+            second.add(f'visitor-{i}')
+        self.assertAlmostEqual(first.count(), 20000, delta=20000 * 0.05)
+
+        restored = HyperLogLog.from_bytes(first.to_bytes())
+        self.assertAlmostEqual(restored.merge(second).count(), 30000, delta=30000 * 0.05)
+        self.assertLessEqual(len(first.to_bytes()), 4096 + 64)
+
+        small = HyperLogLog()
+        for i in range(10):
+            small.add(i)
+            small.add(i)
+        self.assertEqual(small.count(), 10)
+        self.assertLess(len(small.to_bytes()), 200)
+
+    def test_flush_updates_daily_sketches(self):
+        for ip in ['10.0.0.1', '10.0.0.2', '10.0.0.1']:
+            view_buffer.record(self.props[0].id, ip_address=ip)
+        view_buffer.record(self.props[1].id, ip_address='10.0.0.1')
+        view_buffer.flush()
+        view_buffer.record(self.props[0].id, ip_address='10.0.0.3')
+        view_buffer.flush()
+
+        self.assertEqual(PropertyViewSketch.objects.count(), 2)
+        counts = unique_viewers([p.id for p in self.props], days=7)
+        self.assertEqual(counts[self.props[0].id], 3)
+        self.assertEqual(counts[self.props[1].id], 1)
+        self.assertEqual(counts['total'], 3)
+
+    def test_owner_analytics_reports_unique_viewers(self):
+        view_buffer.record(self.props[0].id, ip_address='10.0.0.1')
+        view_buffer.record(self.props[1].id, ip_address='10.0.0.2')
+        view_buffer.flush()
+
+        self.client.force_authenticate(self.owner)
+        response = self.client.get('/api/analytics/owner-analytics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['overview']['unique_viewers_7d'], 2)
+        self.assertEqual(response.data['overview']['unique_viewers_30d'], 2)
+
+
+class ViewRollupTests(PropertyAPITestCase):
+    """PropertyViewDaily rollups and raw view retention"""
+
+    def setUp(self):
+        super().setUp()
+        self.prop = create_property(self.owner)
+        self.today = timezone.localdate()
+
+    def add_views(self, days_ago, count, user=None):
+        viewed_at = timezone.now() - timedelta(days=days_ago)
+        PropertyView.objects.bulk_create(
+            [PropertyView(property=self.prop, user=user, viewed_at=viewed_at) for _ in range(count)]
+        )
+
+    def test_rollup_is_incremental_and_idempotent(self):
+        self.add_views(3, 2, user=self.renter)
+        self.add_views(0, 1)
+        self.assertEqual(rollup_views(), 2)
+
+        self.add_views(0, 2, user=self.renter)
+        rollup_views()
+        rollup_views()
+        today = PropertyViewDaily.objects.get(date=self.today)
+        self.assertEqual((today.views, today.unique_users), (3, 1))
+        earlier = PropertyViewDaily.objects.get(date=self.today - timedelta(days=3))
+        self.assertEqual((earlier.views, earlier.unique_users), (2, 1))
+
+    def test_prune_keeps_rollups_and_recent_views(self):
+        self.add_views(40, 3)
+        self.add_views(1, 2)
+        self.assertEqual(prune_raw_views(days=30), 0)  # nothing rolled up yet
+
+        rollup_views()
+        self.assertEqual(prune_raw_views(days=30, chunk_size=2), 3)
+        self.assertEqual(PropertyView.objects.count(), 2)
+
+        # Re-rolling after the prune leaves the older rollup alone
+        call_command('rollup_property_views', '--since', '2000-01-01', stdout=StringIO())
+        self.assertEqual(PropertyViewDaily.objects.get(date=self.today - timedelta(days=40)).views, 3)
+
+    def test_owner_views_trend_combines_rollups_and_recent_views(self):
+        self.add_views(5, 4)
+        self.add_views(2, 1)
+        rollup_views()
+        # After the last rollup run: counted from the raw events
+        self.add_views(2, 2)
+        self.add_views(0, 3)
+        self.client.force_authenticate(self.owner)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/analytics/owner-analytics/')
+        trend = response.data['views_trend']
+        self.assertEqual(len(trend), 30)
+        self.assertEqual(trend[-6], {'date': str(self.today - timedelta(days=5)), 'views': 4})
+        self.assertEqual(trend[-3], {'date': str(self.today - timedelta(days=2)), 'views': 3})
+        self.assertEqual(trend[-1], {'date': str(self.today), 'views': 3})
+        # Raw events are only read from the last rolled-up day on
+        raw = [q['sql'] for q in ctx.captured_queries if 'FROM "properties_propertyview"' in q['sql']]
+        self.assertEqual(len(raw), 1)
+        self.assertIn('"viewed_at" >=', raw[0])
+
+
+class FavoriteCounterTests(PropertyAPITestCase):
+    """Atomic favorite toggles and counter reconciliation"""
+
+    def setUp(self):
+        super().setUp()
+        self.props = self.create_properties(3)
+
+    def toggle(self, prop):
+        return self.client.post(f'/api/properties/{prop.id}/toggle_favorite/')
+
+    def test_toggle_uses_f_updates(self):
+        self.client.force_authenticate(self.renter)
+        prop = self.props[0]
+        Property.objects.filter(pk=prop.pk).update(favorite_count=5)  # other users' favorites
+
+        self.assertTrue(self.toggle(prop).data['is_favorited'])
+        prop.refresh_from_db()
+        self.assertEqual(prop.favorite_count, 6)
+
+        self.assertFalse(self.toggle(prop).data['is_favorited'])
+        prop.refresh_from_db()
+        self.assertEqual(prop.favorite_count, 5)
+        self.assertFalse(Favorite.objects.filter(user=self.renter, property=prop).exists())
+
+    def test_reconcile_fixes_only_drifted_rows(self):
+        Favorite.objects.create(user=self.renter, property=self.props[0])
+        Property.objects.filter(pk=self.props[0].pk).update(favorite_count=1)
+        Property.objects.filter(pk=self.props[1].pk).update(favorite_count=7)
+        PropertyViewDaily.objects.create(property=self.props[2], date=timezone.localdate(), views=4)
+
+        with CaptureQueriesContext(connection) as ctx:
+            corrected = reconcile_counters()
+        self.assertEqual(corrected, {'favorite_count': 1})
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        # Conditioned on the value read, so concurrent increments are not overwritten
+        self.assertIn('"favorite_count" = 7', updates[0]['sql'].split('WHERE')[1])
+        self.assertEqual(Property.objects.get(pk=self.props[1].pk).favorite_count, 0)
+
+        out = StringIO()
+        call_command('reconcile_property_counters', '--views', stdout=out)
+        self.assertIn('Corrected view_count on 1 properties', out.getvalue())
+        self.assertEqual(Property.objects.get(pk=self.props[2].pk).view_count, 4)
+
+
+class PropertyNeighborTests(PropertyAPITestCase):
+    """Offline item-item neighbours and their use by PropertyRecommender"""
+
+    def setUp(self):
+        super().setUp()
+        self.users = self.create_renters(4)
+        self.props = self.create_properties(5)
+
+    def favorite(self, user, *indexes):
+        for i in indexes:
+            Favorite.objects.create(user=user, property=self.props[i])
+
+    def test_build_keeps_top_k_by_cosine(self):
+        self.favorite(self.users[0], 0, 1)
+        self.favorite(self.users[1], 0, 1, 2)
+        self.favorite(self.users[2], 0, 3)
+        call_command('build_property_neighbors', '--top-k', '2', stdout=StringIO())
+
+        neighbors = list(
+            PropertyNeighbor.objects.filter(property=self.props[0])
+            .order_by('-score').values_list('neighbor_id', flat=True)
+        )
+        self.assertEqual(neighbors[0], self.props[1].id)
+        self.assertEqual(len(neighbors), 2)
+        self.assertFalse(PropertyNeighbor.objects.filter(property=self.props[4]).exists())
+
+    def test_personalized_recommendations_use_neighbors(self):
+        self.favorite(self.users[0], 0, 1)
+        self.favorite(self.users[1], 0, 1)
+        self.favorite(self.users[2], 3, 4)
+        build_property_neighbors()
+
+        renter = self.users[3]
+        self.favorite(renter, 0)
+        recommendations = PropertyRecommender(renter).get_recommendations(limit=3)
+        self.assertEqual(recommendations[0].id, self.props[1].id)
+        self.assertEqual(len(recommendations), 3)
+
+
+class SimilarListingsTests(PropertyAPITestCase):
+    """kNN similar-listings index"""
+
+    def setUp(self):
+        super().setUp()
+        self.target = create_property(
+            self.owner, property_type='apartment', rent_price=Decimal('500'), bedrooms=2,
+            facilities=['wifi', 'ac'], latitude=Decimal('11.5564'), longitude=Decimal('104.9282'),
+        )
+        self.close = create_property(
+            self.owner, property_type='apartment', rent_price=Decimal('520'), bedrooms=2,
+            facilities=['wifi', 'ac'], latitude=Decimal('11.5600'), longitude=Decimal('104.9300'),
+        )
+        self.far = create_property(
+            self.owner, property_type='house', city='Siem Reap', rent_price=Decimal('2000'),
+            bedrooms=5, facilities=['pool'], latitude=Decimal('13.3633'), longitude=Decimal('103.8564'),
+        )
+
+    def test_nearest_listing_first(self):
+        self.assertEqual(similar_index.similar_ids(self.target.id, limit=2), [self.close.id, self.far.id])
+
+    def test_index_refreshes_on_feature_change(self):
+        similar_index.similar_ids(self.target.id)
+        self.far.property_type = 'apartment'
+        self.far.city = 'Phnom Penh'
+        self.far.rent_price = Decimal('505')
+        self.far.bedrooms = 2
+        self.far.facilities = ['wifi', 'ac']
+        self.far.latitude, self.far.longitude = self.target.latitude, self.target.longitude
+        self.far.save()
+        self.assertEqual(similar_index.similar_ids(self.target.id, limit=1), [self.far.id])
+
+    def test_similar_endpoint(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(f'/api/properties/{self.target.id}/similar/')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/properties/{self.target.id}/similar/', {'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data], [self.close.id])
+        # visibility check + similar rows + images + owners; the index itself is in memory
+        self.assertLessEqual(len(ctx.captured_queries), 4)
+
+    def test_similar_endpoint_clamps_limit(self):
+        for limit, count in [(-3, 1), ('abc', 2), (50, 2)]:
+            response = self.client.get(f'/api/properties/{self.target.id}/similar/', {'limit': limit})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data), count)
+
+    def test_writes_bypassing_signals_are_picked_up(self):
+        similar_index.similar_ids(self.target.id)
+        Property.objects.filter(pk=self.far.pk).update(status='rented', updated_at=timezone.now())
+        self.assertIn(self.far.id, similar_index.similar_ids(self.target.id))
+        similar_index._checked_at = 0.0
+        self.assertEqual(similar_index.similar_ids(self.target.id), [self.close.id])
+
+    def test_listings_without_coordinates(self):
+        Property.objects.update(latitude=None, longitude=None)
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            encoder = FeatureEncoder().fit(list(Property.objects.values('id', *FEATURE_FIELDS)))
+        self.assertEqual(list(encoder.numeric_mean[4:]), [0.0, 0.0])
+
+
+class RenterProfileTests(PropertyAPITestCase):
+    """Incrementally learned renter preference profiles"""
+
+    def setUp(self):
+        super().setUp()
+        self.kampot = create_property(
+            self.owner, city='Kampot', property_type='house', rent_price=Decimal('300'), facilities=['wifi'],
+        )
+        self.other_kampot = create_property(
+            self.owner, city='Kampot', property_type='house', rent_price=Decimal('320'), facilities=['wifi'],
+        )
+        self.phnom_penh = create_property(self.owner, property_type='apartment', rent_price=Decimal('900'))
+
+    def test_events_update_profile(self):
+        from datetime import date
+        from bookings.models import Booking
+        Favorite.objects.create(user=self.renter, property=self.kampot)
+        Booking.objects.create(property=self.phnom_penh, renter=self.renter, booking_type='visit',
+                               start_date=date.today())
+        self.client.force_authenticate(self.renter)
+        self.client.get(f'/api/properties/{self.kampot.id}/')
+        view_buffer.flush()
+
+        profile = RenterProfile.objects.get(user=self.renter)
+        self.assertAlmostEqual(profile.city_weights['Kampot'], 4, places=2)
+        self.assertAlmostEqual(profile.city_weights['Phnom Penh'], 5, places=2)
+        self.assertAlmostEqual(profile.facility_weights['wifi'], 4, places=2)
+        self.assertAlmostEqual(profile.price_mean, (300 * 4 + 900 * 5) / 9, places=2)
+        self.assertEqual(profile.recent_property_ids, [self.kampot.id, self.phnom_penh.id])
+
+    def test_old_interest_decays(self):
+        profile = RenterProfile(user=self.renter, decayed_at=timezone.now() - timedelta(days=60))
+        features = {'city': 'Kampot', 'property_type': 'house', 'facilities': [], 'rent_price': Decimal('300')}
+        apply_event(profile, features, 4, profile.decayed_at)
+        features = {'city': 'Siem Reap', 'property_type': 'house', 'facilities': [], 'rent_price': Decimal('300')}
+        apply_event(profile, features, 1, timezone.now())
+        self.assertAlmostEqual(profile.city_weights['Kampot'], 1, places=2)
+        low, high = price_range(profile)
+        self.assertLess(low, 300)
+        self.assertGreater(high, 300)
+
+    def test_recommendations_read_profile(self):
+        Favorite.objects.create(user=self.renter, property=self.kampot)
+        with CaptureQueriesContext(connection) as ctx:
+            properties = get_user_search_based_properties(self.renter, limit=3)
+        self.assertEqual([prop.id for prop in properties], [self.other_kampot.id])
+        # profile + ranked candidates + cards
+        self.assertEqual(len(ctx.captured_queries), 3)
+
+    def test_rebuild_command(self):
+        Favorite.objects.create(user=self.renter, property=self.kampot)
+        RenterProfile.objects.all().delete()
+        call_command('rebuild_renter_profiles', stdout=StringIO())
+        profile = RenterProfile.objects.get(user=self.renter)
+        self.assertAlmostEqual(profile.type_weights['house'], 3, places=2)
+
+
+class PopularityTests(PropertyAPITestCase):
+    """Forward-decayed popularity column"""
+
+    def setUp(self):
+        super().setUp()
+        self.props = self.create_properties(3)
+
+    def popularity(self, prop):
+        return Property.objects.get(pk=prop.pk).popularity
+
+    def test_events_raise_popularity(self):
+        Favorite.objects.create(user=self.renter, property=self.props[1])
+        self.client.get(f'/api/properties/{self.props[2].id}/')
+        view_buffer.flush()
+        self.assertAlmostEqual(current_score(self.popularity(self.props[1])), 3, places=3)
+        self.assertAlmostEqual(current_score(self.popularity(self.props[2])), 1, places=3)
+
+    def test_old_events_weigh_less(self):
+        Property.objects.filter(pk=self.props[0].pk).update(
+            popularity=10 * boost(timezone.now() - timedelta(days=21))
+        )
+        Property.objects.filter(pk=self.props[1].pk).update(popularity=2 * boost())
+        self.assertAlmostEqual(current_score(self.popularity(self.props[0])), 1.25, places=3)
+
+        recommended = PropertyRecommender().get_popular_properties(Property.objects.all(), 2)
+        self.assertEqual([prop.id for prop in recommended], [self.props[1].id, self.props[0].id])
+
+    def test_popular_read_has_no_joins(self):
+        with CaptureQueriesContext(connection) as ctx:
+            list(PropertyRecommender().get_popular_properties(Property.objects.all(), 2))
+        self.assertNotIn('JOIN', ctx.captured_queries[0]['sql'])
+
+    def test_rebuild_matches_incremental_and_rebases_the_epoch(self):
+        Favorite.objects.create(user=self.renter, property=self.props[0])
+        incremental = current_score(self.popularity(self.props[0]))
+        Property.objects.update(popularity=0)
+        call_command('rebuild_property_popularity', stdout=StringIO())
+        self.assertAlmostEqual(current_epoch(), timezone.now().timestamp(), delta=60)
+        self.assertAlmostEqual(current_score(self.popularity(self.props[0])) / incremental, 1, places=6)
+
+        # Increments after the rebase are relative to the new epoch
+        Favorite.objects.create(user=self.renter, property=self.props[1])
+        self.assertAlmostEqual(self.popularity(self.props[1]), 3, places=3)
+
+    def test_withdrawn_events_subtract_their_boost(self):
+        from datetime import date
+        from bookings.models import Booking
+        favorite = Favorite.objects.create(user=self.renter, property=self.props[0])
+        booking = Booking.objects.create(property=self.props[0], renter=self.renter, booking_type='visit',
+                                         start_date=date.today())
+        self.assertAlmostEqual(current_score(self.popularity(self.props[0])), 8, places=3)
+
+        favorite.delete()
+        self.assertAlmostEqual(current_score(self.popularity(self.props[0])), 5, places=3)
+        booking.status = 'cancelled'
+        booking.save()
+        self.assertAlmostEqual(self.popularity(self.props[0]), 0, places=6)
+        # Deleting an already cancelled booking takes nothing more
+        booking.delete()
+        self.assertEqual(self.popularity(self.props[0]), 0)
+
+
+class FactorModelTests(PropertyAPITestCase):
+    """TruncatedSVD factors, persisted as memory-mapped .npy arrays"""
+
+    def setUp(self):
+        super().setUp()
+        self.use_temp_model_dir()
+        self.users = self.create_renters(5)
+        self.props = self.create_properties(6)
+        # Two taste groups: properties 0-2 and 3-5
+        for user in self.users[:3]:
+            for prop in self.props[:3]:
+                Favorite.objects.create(user=user, property=prop)
+        for user in self.users[3:]:
+            for prop in self.props[3:]:
+                Favorite.objects.create(user=user, property=prop)
+        Favorite.objects.filter(user=self.users[0], property=self.props[2]).delete()
+
+    def test_train_publishes_memory_mapped_model(self):
+        call_command('train_recommender_factors', '--components', '2', stdout=StringIO())
+        scores = factor_model.scores(self.users[0].id, exclude={self.props[0].id, self.props[1].id})
+        self.assertIsInstance(factor_model._model[0]['item_factors'], np.memmap)
+        best = max(scores, key=scores.get)
+        self.assertEqual(best, self.props[2].id)
+        self.assertNotIn(self.props[0].id, scores)
+        self.assertEqual(factor_model.scores(self.owner.id), {})
+
+    def test_recommender_uses_factors(self):
+        train_factors(n_components=2)
+        recommendations = PropertyRecommender(self.users[0]).get_recommendations(limit=1)
+        self.assertEqual(recommendations[0].id, self.props[2].id)
+
+    def test_model_trained_in_another_process_is_picked_up(self):
+        self.assertEqual(factor_model.scores(self.users[0].id), {})
+        trainer = multiprocessing.get_context('fork').Process(target=train_factors, args=(2,))
+        trainer.start()
+        trainer.join()
+        self.assertEqual(trainer.exitcode, 0)
+        scores = factor_model.scores(self.users[0].id, exclude={self.props[0].id, self.props[1].id})
+        self.assertEqual(max(scores, key=scores.get), self.props[2].id)
+
+    def test_unavailable_properties_are_not_scored(self):
+        train_factors(n_components=2)
+        Property.objects.filter(pk=self.props[2].pk).update(status='rented')
+        bump_version('listing')
+        scores = factor_model.scores(self.users[0].id)
+        self.assertNotIn(self.props[2].id, scores)
+        self.assertIn(self.props[0].id, scores)
+
+    def test_too_few_interactions(self):
+        Favorite.objects.all().delete()
+        self.assertIsNone(train_factors())
+
+
+class ListingSegmentTests(PropertyAPITestCase):
+    """k-means listing segments for cold-start renters"""
+
+    def setUp(self):
+        super().setUp()
+        self.use_temp_model_dir()
+        self.cheap = [
+            create_property(self.owner, title=f'Room {i}', property_type='room', city='Kampot',
+                            rent_price=Decimal(100 + i), facilities=['wifi'])
+            for i in range(4)
+        ]
+        self.houses = [
+            create_property(self.owner, title=f'House {i}', property_type='house',
+                            rent_price=Decimal(3000 + i * 100), facilities=['pool'])
+            for i in range(4)
+        ]
+        Property.objects.filter(pk=self.houses[2].pk).update(popularity=50)
+        call_command('build_listing_segments', '--clusters', '2', stdout=StringIO())
+
+    def test_segment_of_first_interaction(self):
+        ids = segment_index.cold_start_ids(3, property_ids=[self.houses[0].id], exclude={self.houses[0].id})
+        self.assertEqual(ids[0], self.houses[2].id)
+        self.assertEqual(set(ids), {v.id for v in self.houses[1:]})
+
+    def test_preferences_map_without_queries(self):
+        preferences = UserPreference(user=self.renter, preferred_cities=['Kampot'], property_types=['room'],
+                                     max_price=Decimal('150'))
+        segment_index.cold_start_ids(1)
+        with CaptureQueriesContext(connection) as ctx:
+            ids = segment_index.cold_start_ids(4, preferences=preferences)
+        self.assertEqual(set(ids), {room.id for room in self.cheap})
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_cold_renter_gets_segment_recommendations(self):
+        UserPreference.objects.create(user=self.renter, property_types=['house'], min_price=Decimal('3000'))
+        properties = get_user_search_based_properties(self.renter, limit=2)
+        self.assertEqual(properties[0].id, self.houses[2].id)
+        self.assertTrue(all(prop.property_type == 'house' for prop in properties))
+
+        recommended = PropertyRecommender(self.renter).get_recommendations(limit=2)
+        self.assertTrue(all(prop.property_type == 'house' for prop in recommended))
+
+    def test_empty_catalogue(self):
+        Property.objects.all().delete()
+        self.assertEqual(build_segments(), 0)
+        self.assertEqual(segment_index.cold_start_ids(3, property_ids=[self.cheap[0].id]), [])
+
+    def test_missing_segments_fall_back_to_popular(self):
+        segments_path().unlink()
+        UserPreference.objects.create(user=self.renter, property_types=['room'])
+        self.assertEqual(segment_index.cold_start_ids(3, property_ids=[self.cheap[0].id]), [])
+        properties = get_user_search_based_properties(self.renter, limit=2)
+        self.assertEqual(properties, get_popular_properties(2))
+
+    def test_segments_built_in_another_process_are_picked_up(self):
+        segments_path().unlink()
+        self.assertEqual(segment_index.cold_start_ids(3, property_ids=[self.houses[0].id]), [])
+        builder = multiprocessing.get_context('fork').Process(target=build_segments, args=(2,))
+        builder.start()
+        builder.join()
+        self.assertEqual(builder.exitcode, 0)
+        ids = segment_index.cold_start_ids(3, property_ids=[self.houses[0].id], exclude={self.houses[0].id})
+        self.assertEqual(ids[0], self.houses[2].id)
+
+    def test_listing_changes_are_assigned_without_refitting(self):
+        segment_index.cold_start_ids(1)
+        mansion = create_property(self.owner, title='Mansion', property_type='house',
+                                  rent_price=Decimal(3100), facilities=['pool'])
+        Property.objects.filter(pk=mansion.pk).update(popularity=100)
+        self.houses[2].status = 'rented'
+        self.houses[2].save()
+        segment_index._checked_at = 0.0
+        ids = segment_index.cold_start_ids(3, property_ids=[self.houses[0].id], exclude={self.houses[0].id})
+        self.assertEqual(ids[0], mansion.id)
+        self.assertNotIn(self.houses[2].id, ids)
@@ -0,0 +1,170 @@
+"""
+Write-behind tracking of property detail views.
+
+``retrieve`` used to insert a PropertyView row and save the property on
+every page load. Views are now appended to a bounded in-process buffer and
+written in bulk, in one transaction: a ``bulk_create`` of the events, an
+``F()`` update per property that adds the new views to ``view_count`` and to
+the listing's decayed popularity, and updates to the daily unique-viewer
+sketches and to signed-in viewers' preference profiles.
+
+Requests never write: ``record`` only appends to the buffer. A daemon
+flusher thread, started in each worker process on its first view, drains
+the buffer every flush interval and as soon as the buffer fills, so an
+idle worker still writes its last views within one interval. At
+interpreter shutdown the flusher is stopped and drains what is left. Views
+still buffered when a worker is killed outright (SIGKILL, a gunicorn
+timeout) are lost; that is at most one interval's worth. A failed flush is
+logged and its events are dropped.
+
+Settings:
+
+* ``PROPERTY_VIEW_BUFFER_SIZE``    - events that wake the flusher early (500)
+* ``PROPERTY_VIEW_FLUSH_INTERVAL`` - seconds between flushes (10)
+* ``PROPERTY_VIEW_FLUSH_THREAD``   - run the background flusher (True); the
+  test runner turns it off and tests call ``flush()`` themselves
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .hyperloglog import record_unique_viewers
+from .interactions import INTERACTION_WEIGHTS
+from .models import Property, PropertyView
+from .popularity import increment
+from .profiles import record_interactions
+
+logger = logging.getLogger(__name__)
+
+
+class ViewBuffer:
+    """Thread-safe buffer of unsaved PropertyView events, drained by a background thread"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = []
+        self._wake = threading.Event()
+        self._stopping = False
+        self._flusher = None
+        self._flusher_pid = None
+
+    @property
+    def max_size(self):
+        return getattr(settings, 'PROPERTY_VIEW_BUFFER_SIZE', 500)
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'PROPERTY_VIEW_FLUSH_INTERVAL', 10)
+
+    def __len__(self):
+        return len(self._events)
+
+    def record(self, property_id, user_id=None, ip_address=None, user_agent=''):
+        """Buffer one view; the flusher thread writes it"""
+        event = PropertyView(
+            property_id=property_id,
+            user_id=user_id,
+            ip_address=ip_address,
+            user_agent=user_agent,
+            viewed_at=timezone.now(),
+        )
+        with self._lock:
+            self._events.append(event)
+            full = len(self._events) >= self.max_size
+        if getattr(settings, 'PROPERTY_VIEW_FLUSH_THREAD', True):
+            self._ensure_flusher()
+            if full:
+                self._wake.set()
+
+    def clear(self):
+        """Discard buffered views without writing them"""
+        self._drain()
+
+    def _running(self):
+        return (
+            self._flusher is not None
+            and self._flusher_pid == os.getpid()
+            and self._flusher.is_alive()
+        )
+
+    def _ensure_flusher(self):
+        # Threads do not survive fork(), so each worker starts its own
+        if self._running():
+            return
+        with self._lock:
+            if self._running() or self._stopping:
+                return
+            self._wake = threading.Event()
+            self._flusher = threading.Thread(
+                target=self._run, name='property-view-flusher', daemon=True
+            )
+            self._flusher_pid = os.getpid()
+            self._flusher.start()
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._flush_logged()
+
+    def _flush_logged(self):
+        pending = len(self)
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Could not flush %d buffered property views', pending)
+        finally:
+            # The flusher thread holds its own connection; honour CONN_MAX_AGE
+            close_old_connections()
+
+    def stop(self, timeout=30):
+        """Stop this process's flusher after a final drain; no-op if it never started"""
+        if not self._running():
+            return
+        self._stopping = True
+        self._wake.set()
+        self._flusher.join(timeout)
+
+    def _drain(self):
+        with self._lock:
+            events, self._events, self._oldest = self._events, [], None
+        return events
+
+    def flush(self):
+        """Write buffered views; returns the number of events written"""
+        events = self._drain()
+        if not events:
+            return 0
+
+        counts = Counter(event.property_id for event in events)
+        # Properties deleted while their views sat in the buffer are dropped
+        existing = set(Property.objects.filter(pk__in=counts).values_list('pk', flat=True))
+        events = [event for event in events if event.property_id in existing]
+
+        with transaction.atomic():
+            PropertyView.objects.bulk_create(events, batch_size=500)
+            record_unique_viewers(events)
+            record_interactions(
+                (event.user_id, event.property_id, 'view', event.viewed_at) for event in events
+            )
+            for property_id in existing:
+                Property.objects.filter(pk=property_id).update(
+                    view_count=F('view_count') + counts[property_id],
+                    popularity=increment(INTERACTION_WEIGHTS['view'] * counts[property_id]),
+                )
+        return len(events)
+
+
+view_buffer = ViewBuffer()
+
+
+@atexit.register
+def _stop_on_shutdown():
+    view_buffer.stop()
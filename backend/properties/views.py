@@ -1,33 +1,71 @@
+import math
+
 from rest_framework import viewsets, status, permissions, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from django.shortcuts import get_object_or_404
+from django.conf import settings
 from django.utils import timezone
-from django.db.models import Q, Avg
-from .models import Property, PropertyImage, Favorite, PropertyView, Report
+from django.db import transaction
+from django.db.models import Q, Avg, F
+from .models import Property, PropertyImage, Favorite, Report
 from .serializers import (
     PropertyListSerializer, PropertyDetailSerializer, PropertyCreateUpdateSerializer,
-    PropertyImageSerializer, FavoriteSerializer, ReportSerializer, PropertyVerificationSerializer
+    PropertyImageSerializer, FavoriteSerializer, ReportSerializer, PropertyVerificationSerializer,
+    with_list_relations, is_field_requested
 )
 from .filters import PropertyFilter
+from .search import PropertySearchFilter
+from .geo import NearbyFilter
+from .pagination import PropertyCursorPagination
+from .facets import compute_facets
+from .clusters import get_clusters, MIN_ZOOM, MAX_ZOOM
+from .autocomplete import location_index, DEFAULT_LIMIT, MAX_LIMIT
+from .cache import make_params_key, get_cached_response, set_cached_response, response_cache_stats
+from .view_tracking import view_buffer
+from .similar import similar_index
+from .conditional import listing_validators, property_validators, not_modified, set_validators
+
+
+# Actions serialized with PropertyListSerializer
+LIST_ACTIONS = ['list', 'my_properties', 'pending_verifications', 'recommended', 'batch']
+
+# Maximum number of ids accepted by the batch action
+BATCH_MAX_IDS = 100
+
+# Lifetime of cached anonymous list/detail responses; signals orphan them sooner
+RESPONSE_CACHE_TIMEOUT = getattr(settings, 'PROPERTY_RESPONSE_CACHE_TIMEOUT', 60)
 
 
 class PropertyViewSet(viewsets.ModelViewSet):
     """ViewSet for property management"""
     queryset = Property.objects.select_related('owner').prefetch_related('images')
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # Search and radius filters run last so they can order by relevance/distance
+    # when no ordering is requested
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, PropertySearchFilter, NearbyFilter]
     filterset_class = PropertyFilter
     search_fields = ['title', 'description', 'city', 'area', 'address']
     ordering_fields = ['rent_price', 'created_at', 'rating', 'view_count']
     ordering = ['-created_at']
     
+    @property
+    def paginator(self):
+        """Use keyset pagination for list when the client opts in to cursor mode"""
+        if (not hasattr(self, '_paginator') and self.action == 'list'
+                and PropertyCursorPagination.is_requested(self.request)):
+            self._paginator = PropertyCursorPagination()
+        return super().paginator
+    
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'facets', 'map_clusters', 'autocomplete', 'batch', 'similar']:
             return [permissions.AllowAny()]
+        if self.action == 'cache_stats':
+            return [permissions.IsAdminUser()]
         return [permissions.IsAuthenticated()]
     
     def get_serializer_class(self):
-        if self.action == 'list':
+        if self.action in ['list', 'batch']:
             return PropertyListSerializer
         elif self.action in ['create', 'update', 'partial_update']:
             return PropertyCreateUpdateSerializer
@@ -36,6 +74,15 @@ class PropertyViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         queryset = super().get_queryset()
         
+        # List cards only need the primary image, loaded via with_list_relations
+        if self.action in LIST_ACTIONS:
+            queryset = with_list_relations(
+                queryset.select_related(None).prefetch_related(None), self.request
+            )
+        elif self.action == 'retrieve':
+            # Read by both the ETag and the serializer
+            queryset = queryset.prefetch_related('documents')
+        
         # Filter by owner for 'my_properties' action
         if self.action == 'my_properties':
             return queryset.filter(owner=self.request.user)
@@ -46,24 +93,102 @@ class PropertyViewSet(viewsets.ModelViewSet):
         
         return queryset
     
+    def get_response_cache_key(self, prefix):
+        """Versioned response cache key for anonymous requests, None otherwise"""
+        if self.request.user.is_authenticated:
+            return None
+        # Absolute URLs in the body (images, next links) depend on the host
+        return make_params_key(f'{prefix}:{self.request.get_host()}', self.request.query_params)
+    
+    def cached_response(self, request, data, etag=None, last_modified=None):
+        """Response for cached data, revalidated against the stored validators"""
+        if etag is None:
+            return Response(data)
+        not_modified_response = not_modified(request, etag, last_modified)
+        if not_modified_response is not None:
+            return not_modified_response
+        return set_validators(Response(data), etag, last_modified)
+    
+    def list(self, request, *args, **kwargs):
+        """List properties; answers 304 when the filtered listing is unchanged"""
+        cache_key = self.get_response_cache_key('property_list')
+        if cache_key:
+            entry = get_cached_response(cache_key)
+            if entry is not None:
+                return self.cached_response(request, *entry)
+        
+        # Cursor pages are fetched once by infinite scroll and never counted,
+        # so they skip the fingerprint aggregate
+        if PropertyCursorPagination.is_requested(request):
+            response = super().list(request, *args, **kwargs)
+            etag = None
+        else:
+            queryset = self.filter_queryset(self.get_queryset())
+            
+            # Fetched here so the fingerprint and is_favorited share one query
+            context = self.get_serializer_context()
+            if request.user.is_authenticated and is_field_requested(request, 'is_favorited'):
+                context['_favorite_ids'] = set(
+                    Favorite.objects.filter(user=request.user).values_list('property_id', flat=True)
+                )
+            etag = listing_validators(request, queryset, context.get('_favorite_ids', ()))
+            cached = not_modified(request, etag)
+            if cached is not None:
+                return cached
+            
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                serializer = self.get_serializer(page, many=True, context=context)
+                response = self.get_paginated_response(serializer.data)
+            else:
+                serializer = self.get_serializer(queryset, many=True, context=context)
+                response = Response(serializer.data)
+            set_validators(response, etag)
+        
+        if cache_key:
+            set_cached_response(cache_key, (response.data, etag, None), RESPONSE_CACHE_TIMEOUT)
+        return response
+    
     def retrieve(self, request, *args, **kwargs):
         """Get property detail and track view"""
+        property_id = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        cache_key = self.get_response_cache_key(f'property_detail:{property_id}')
+        if cache_key:
+            entry = get_cached_response(cache_key)
+            if entry is not None:
+                self.track_view(request, property_id)
+                return self.cached_response(request, *entry)
+        
         instance = self.get_object()
         
-        # Track view
-        PropertyView.objects.create(
-            property=instance,
-            user=request.user if request.user.is_authenticated else None,
-            ip_address=self.get_client_ip(request),
-            user_agent=request.META.get('HTTP_USER_AGENT', '')
+        # Fetched here so the validators and is_favorited share one query
+        context = self.get_serializer_context()
+        context['_is_favorited'] = (
+            request.user.is_authenticated
+            and Favorite.objects.filter(user=request.user, property=instance).exists()
         )
+        etag, last_modified = property_validators(request, instance, context['_is_favorited'])
         
-        # Increment view count
+        self.track_view(request, instance.pk)
         instance.view_count += 1
-        instance.save(update_fields=['view_count'])
         
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        cached = not_modified(request, etag, last_modified)
+        if cached is not None:
+            return cached
+        
+        serializer = self.get_serializer(instance, context=context)
+        if cache_key:
+            set_cached_response(cache_key, (serializer.data, etag, last_modified), RESPONSE_CACHE_TIMEOUT)
+        return set_validators(Response(serializer.data), etag, last_modified)
+    
+    def track_view(self, request, property_id):
+        """Buffer a detail view; it is written later in bulk"""
+        view_buffer.record(
+            int(property_id),
+            user_id=request.user.pk if request.user.is_authenticated else None,
+            ip_address=self.get_client_ip(request),
+            user_agent=request.META.get('HTTP_USER_AGENT', '')
+        )
     
     def create(self, request, *args, **kwargs):
         """Create property with images"""
@@ -108,6 +233,112 @@ class PropertyViewSet(viewsets.ModelViewSet):
             ip = request.META.get('REMOTE_ADDR')
         return ip
     
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """Facet counts for the same filters and search accepted by list"""
+        # Anonymous visitors all see the same verified listings
+        cache_key = self.get_response_cache_key('property_facets')
+        if cache_key:
+            data = get_cached_response(cache_key)
+            if data is not None:
+                return Response(data)
+        
+        data = compute_facets(self.filter_queryset(self.get_queryset()))
+        
+        if cache_key:
+            set_cached_response(
+                cache_key, data, getattr(settings, 'PROPERTY_FACETS_CACHE_TIMEOUT', 300)
+            )
+        return Response(data)
+    
+    @action(detail=False, methods=['get'], url_path='cache-stats',
+            permission_classes=[permissions.IsAdminUser])
+    def cache_stats(self, request):
+        """Approximate hit/miss counters of the anonymous response cache, across workers"""
+        return Response(response_cache_stats())
+    
+    @action(detail=False, methods=['get'], url_path='map-clusters')
+    def map_clusters(self, request):
+        """Grid-aggregated map markers for a viewport: ?bbox=min_lng,min_lat,max_lng,max_lat&zoom="""
+        try:
+            min_lng, min_lat, max_lng, max_lat = (
+                float(value) for value in request.query_params.get('bbox', '').split(',')
+            )
+            zoom = int(request.query_params.get('zoom', 12))
+        except ValueError:
+            return Response(
+                {'error': 'bbox must be min_lng,min_lat,max_lng,max_lat and zoom an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if not all(math.isfinite(value) for value in (min_lng, min_lat, max_lng, max_lat)):
+            return Response(
+                {'error': 'bbox coordinates must be finite numbers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if min_lat > max_lat:
+            return Response(
+                {'error': 'bbox min_lat must not exceed max_lat'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        zoom = max(MIN_ZOOM, min(zoom, MAX_ZOOM))
+        return Response({
+            'zoom': zoom,
+            'clusters': get_clusters(min_lng, min_lat, max_lng, max_lat, zoom)
+        })
+    
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """Location name suggestions for ?q=, served from the in-memory index"""
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', DEFAULT_LIMIT)), MAX_LIMIT))
+        except ValueError:
+            limit = DEFAULT_LIMIT
+        
+        return Response(location_index.lookup(request.query_params.get('q', ''), limit))
+    
+    @action(detail=False, methods=['get'])
+    def batch(self, request):
+        """List-serialized properties for ?ids=1,2,3 in the requested order"""
+        try:
+            ids = [int(value) for value in request.query_params.get('ids', '').split(',') if value.strip()]
+        except ValueError:
+            return Response(
+                {'error': 'ids must be a comma-separated list of integers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        ids = list(dict.fromkeys(ids))
+        if len(ids) > BATCH_MAX_IDS:
+            return Response(
+                {'error': f'At most {BATCH_MAX_IDS} ids can be requested at once'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # get_queryset applies the same visibility rules as list; ids the user
+        # may not see are silently left out
+        properties = self.get_queryset().filter(id__in=ids).in_bulk() if ids else {}
+        ordered = [properties[pk] for pk in ids if pk in properties]
+        
+        serializer = self.get_serializer(ordered, many=True)
+        return Response(serializer.data)
+    
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Listings most similar to this one, from the in-memory kNN index"""
+        # Only visibility matters here, so skip get_object's image prefetch
+        property_obj = get_object_or_404(self.get_queryset().prefetch_related(None), pk=pk)
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 6)), 20))
+        except (TypeError, ValueError):
+            limit = 6
+        
+        properties = with_list_relations(similar_index.similar(property_obj.id, limit), request)
+        serializer = PropertyListSerializer(properties, many=True, context={'request': request})
+        return Response(serializer.data)
+    
     @action(detail=False, methods=['get'])
     def my_properties(self, request):
         """Get current user's properties"""
@@ -220,25 +451,27 @@ class PropertyViewSet(viewsets.ModelViewSet):
     def toggle_favorite(self, request, pk=None):
         """Add or remove property from favorites"""
         property_obj = self.get_object()
-        favorite, created = Favorite.objects.get_or_create(
-            user=request.user,
-            property=property_obj
-        )
-        
-        if not created:
-            favorite.delete()
-            property_obj.favorite_count = max(0, property_obj.favorite_count - 1)
-            property_obj.save(update_fields=['favorite_count'])
-            return Response({'message': 'Removed from favorites', 'is_favorited': False})
-        
-        property_obj.favorite_count += 1
-        property_obj.save(update_fields=['favorite_count'])
+        counter = Property.objects.filter(pk=property_obj.pk)
+        
+        # Deciding by the delete's row count keeps concurrent toggles consistent;
+        # the counter moves with F() in the same transaction
+        with transaction.atomic():
+            removed, _ = Favorite.objects.filter(user=request.user, property=property_obj).delete()
+            if removed:
+                counter.filter(favorite_count__gt=0).update(favorite_count=F('favorite_count') - 1)
+                return Response({'message': 'Removed from favorites', 'is_favorited': False})
+            
+            _, created = Favorite.objects.get_or_create(user=request.user, property=property_obj)
+            if created:
+                counter.update(favorite_count=F('favorite_count') + 1)
         return Response({'message': 'Added to favorites', 'is_favorited': True})
     
     @action(detail=False, methods=['get'])
     def favorites(self, request):
         """Get user's favorite properties"""
         favorites = Favorite.objects.filter(user=request.user).select_related('property')
+        if is_field_requested(request, 'property.images'):
+            favorites = favorites.prefetch_related('property__images')
         page = self.paginate_queryset(favorites)
         
         if page is not None:
@@ -272,7 +505,9 @@ class PropertyViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
     def pending_verifications(self, request):
         """Get all properties pending verification"""
-        properties = Property.objects.filter(verification_status='pending')
+        properties = with_list_relations(
+            Property.objects.filter(verification_status='pending'), request
+        )
         page = self.paginate_queryset(properties)
         
         if page is not None:
@@ -287,14 +522,18 @@ class PropertyViewSet(viewsets.ModelViewSet):
         """Get recommended properties for user"""
         if not request.user.is_authenticated:
             # Return popular properties for anonymous users
-            properties = Property.objects.filter(
+            properties = with_list_relations(Property.objects.filter(
                 verification_status='verified',
                 status='available'
-            ).order_by('-rating', '-view_count')[:12]
+            ), request).order_by('-rating', '-view_count')[:12]
         else:
             # Get recommendations based on user preferences
+            # Precomputed by the batch job, falling back to a live run for uncovered users
+            from analytics.precompute import stored_recommendations
             from analytics.recommendation import get_recommendations
-            properties = get_recommendations(request.user)
+            properties = with_list_relations(
+                stored_recommendations(request.user) or get_recommendations(request.user), request
+            )
         
         serializer = PropertyListSerializer(properties, many=True, context={'request': request})
         return Response(serializer.data)
@@ -61,4 +61,4 @@ class Review(models.Model):
         
         if avg_rating:
             self.property.rating = round(avg_rating, 2)
-            self.property.save(update_fields=['rating'])
+            self.property.save(update_fields=['rating', 'updated_at'])
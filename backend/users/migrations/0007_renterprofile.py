@@ -0,0 +1,32 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:09
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_passwordresetotp_delete_passwordresettoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenterProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city_weights', models.JSONField(default=dict)),
+                ('type_weights', models.JSONField(default=dict)),
+                ('facility_weights', models.JSONField(default=dict)),
+                ('price_weight', models.FloatField(default=0)),
+                ('price_mean', models.FloatField(default=0)),
+                ('price_m2', models.FloatField(default=0)),
+                ('recent_property_ids', models.JSONField(default=list)),
+                ('decayed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='renter_profile', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
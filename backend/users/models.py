@@ -95,6 +95,30 @@ class UserPreference(models.Model):
         return f"Preferences for {self.user.username}"
 
 
+class RenterProfile(models.Model):
+    """Preferences learned from a renter's views, favorites and bookings"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='renter_profile')
+    
+    # Exponentially decayed affinities: {value: weight}
+    city_weights = models.JSONField(default=dict)
+    type_weights = models.JSONField(default=dict)
+    facility_weights = models.JSONField(default=dict)
+    
+    # Decayed running statistics of interacted rent prices
+    price_weight = models.FloatField(default=0)
+    price_mean = models.FloatField(default=0)
+    price_m2 = models.FloatField(default=0)
+    
+    # Most recent interacted properties, newest first
+    recent_property_ids = models.JSONField(default=list)
+    
+    decayed_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Learned profile for {self.user.username}"
+
+
 class PasswordResetOTP(models.Model):
     """Model for password reset OTP codes"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='password_reset_otps')
@@ -6,11 +6,32 @@ export const propertyService = {
     return response.data;
   },
 
+  // Keyset pagination for infinite scroll: pass the previous page's `next` URL
+  // to fetch the following page. Responses are { next, results } with no count.
+  async getPropertiesPage(params = {}, nextUrl = null) {
+    const response = nextUrl
+      ? await api.get(nextUrl)
+      : await api.get('/properties/', { params: { ...params, pagination: 'cursor' } });
+    return response.data;
+  },
+
+  // Fetch up to 100 property cards in one request, returned in the order given
+  async getPropertiesBatch(ids = []) {
+    if (!ids.length) return [];
+    const response = await api.get('/properties/batch/', { params: { ids: ids.join(',') } });
+    return response.data;
+  },
+
   async getProperty(id) {
     const response = await api.get(`/properties/${id}/`);
     return response.data;
   },
 
+  async getSimilarProperties(id, limit = 6) {
+    const response = await api.get(`/properties/${id}/similar/`, { params: { limit } });
+    return response.data;
+  },
+
   async createProperty(data) {
     const response = await api.post('/properties/', data);
     return response.data;